@@ -1,3 +1,65 @@
-from django.contrib import admin
+from django.contrib import admin, messages
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.urls import path
+
+from . import admin_jobs
+from .models import AdminJob
 
 # Register your models here.
+
+
+@admin.register(AdminJob)
+class AdminJobAdmin(admin.ModelAdmin):
+    list_display = [
+        'description', 'status', 'progress_display', 'created_by', 'created_at', 'finished_at'
+    ]
+    list_filter = ['status']
+    list_select_related = ['created_by']
+    readonly_fields = [
+        'description', 'action', 'model', 'status', 'progress_display', 'processed', 'total',
+        'cancel_requested', 'error', 'result', 'created_by', 'created_at', 'started_at', 'finished_at'
+    ]
+    exclude = ['object_ids']
+    actions = ['cancel_jobs']
+
+    @admin.display(description='Progress')
+    def progress_display(self, obj):
+        return f"{obj.progress}% ({obj.processed}/{obj.total})"
+
+    @admin.action(description='Cancel selected jobs')
+    def cancel_jobs(self, request, queryset):
+        admin_jobs.cancel(queryset)
+        self.message_user(request, "Running jobs stop before their next chunk.", messages.SUCCESS)
+
+    def get_urls(self):
+        return [
+            path(
+                '<path:object_id>/progress/',
+                self.admin_site.admin_view(self.progress_view),
+                name='common_adminjob_progress',
+            ),
+        ] + super().get_urls()
+
+    def progress_view(self, request, object_id):
+        """JSON state of a job, polled while it runs"""
+        job = get_object_or_404(AdminJob.objects.only(
+            'status', 'processed', 'total', 'cancel_requested', 'error', 'result'
+        ), pk=object_id)
+        if not self.has_view_permission(request, job):
+            return JsonResponse({'detail': 'Permission denied.'}, status=403)
+        return JsonResponse({
+            'status': job.status,
+            'processed': job.processed,
+            'total': job.total,
+            'progress': job.progress,
+            'cancel_requested': job.cancel_requested,
+            'error': job.error,
+            'result': job.result.url if job.result else None,
+        })
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
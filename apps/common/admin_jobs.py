@@ -0,0 +1,163 @@
+"""
+Bulk admin actions that run in a Celery worker.
+
+An admin action on a large selection used to do its work inside the HTTP
+request and time out behind nginx. A BackgroundAction instead stores the
+selected primary keys in an AdminJob and hands it to the run_admin_job task
+(queue "bulk"), and the admin returns at once with a link to the job.
+
+The worker processes the selection in chunks of ADMIN_JOBS['CHUNK_SIZE'],
+each in its own transaction that also advances ``AdminJob.processed``, so
+the progress the admin polls (``admin/common/adminjob/<id>/progress/``)
+always matches what was committed. Cancelling a job stops it before its next
+chunk; chunks already committed stay done. A job redelivered after a worker
+died resumes after its last committed chunk, unless the action can't resume
+(``resumable = False``) and starts over.
+
+    class DeactivateIncidents(BackgroundAction):
+        description = "Deactivate selected incidents"
+
+        def process(self, job, queryset):
+            queryset.update(is_active=False)
+
+    class IncidentAdmin(admin.ModelAdmin):
+        actions = [background_action(DeactivateIncidents)]
+"""
+import logging
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib import admin, messages
+from django.db import transaction
+from django.db.models import F
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import format_html
+from django.utils.module_loading import import_string
+
+from .models import AdminJob
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundAction:
+    """
+    Work on a selection, one chunk at a time. process() runs inside the
+    chunk's transaction; start() and finish() run once around the chunks
+    (finish() only when every chunk was processed).
+    """
+    description = None
+    # Admin permissions the action requires, as for @admin.action
+    permissions = None
+    chunk_size = None
+    # Whether a redelivered job can carry on from its last committed chunk
+    resumable = True
+
+    def start(self, job):
+        pass
+
+    def process(self, job, queryset):
+        raise NotImplementedError
+
+    def finish(self, job):
+        pass
+
+    def abort(self, job):
+        """Called instead of finish() when the job is cancelled or fails"""
+        pass
+
+
+def action_path(action_class):
+    return f'{action_class.__module__}.{action_class.__qualname__}'
+
+
+def enqueue(action_class, queryset, user=None):
+    """Create the AdminJob of a selection and start it once the transaction commits"""
+    from .tasks import run_admin_job
+
+    ids = [str(pk) for pk in queryset.order_by('pk').values_list('pk', flat=True)]
+    job = AdminJob.objects.create(
+        action=action_path(action_class),
+        description=action_class.description,
+        model=queryset.model._meta.label_lower,
+        object_ids=ids,
+        total=len(ids),
+        created_by=user if user is not None and user.is_authenticated else None,
+    )
+    job_id = str(job.pk)
+
+    def start():
+        try:
+            run_admin_job.delay(job_id)
+        except Exception as e:
+            logger.exception("Could not queue admin job %s", job_id)
+            _finish(job, AdminJob.FAILED, error=f'Could not queue the job: {e}')
+
+    transaction.on_commit(start)
+    return job
+
+
+def background_action(action_class):
+    """Admin action (for ModelAdmin.actions) that runs action_class in the background"""
+
+    @admin.action(description=action_class.description, permissions=action_class.permissions)
+    def run_in_background(modeladmin, request, queryset):
+        job = enqueue(action_class, queryset, request.user)
+        modeladmin.message_user(
+            request,
+            format_html(
+                '"{}" started on {} objects in the background. <a href="{}">Follow its progress</a>.',
+                job.description, job.total, reverse('admin:common_adminjob_change', args=[job.pk])
+            ),
+            messages.SUCCESS,
+        )
+
+    run_in_background.__name__ = action_class.__name__
+    return run_in_background
+
+
+def cancel(queryset):
+    """Cancel jobs: queued ones right away, running ones before their next chunk"""
+    AdminJob.objects.filter(pk__in=queryset, status=AdminJob.QUEUED).update(
+        status=AdminJob.CANCELLED, cancel_requested=True, finished_at=timezone.now()
+    )
+    return AdminJob.objects.filter(pk__in=queryset, status=AdminJob.RUNNING).update(cancel_requested=True)
+
+
+def _finish(job, status, **fields):
+    AdminJob.objects.filter(pk=job.pk).update(status=status, finished_at=timezone.now(), **fields)
+
+
+def run(job_id):
+    """Process a job's selection chunk by chunk (the body of tasks.run_admin_job)"""
+    job = AdminJob.objects.filter(pk=job_id).first()
+    if job is None or job.status in AdminJob.FINISHED:
+        return
+    action = import_string(job.action)()
+    model = apps.get_model(job.model)
+    chunk_size = action.chunk_size or settings.ADMIN_JOBS['CHUNK_SIZE']
+
+    if job.status == AdminJob.RUNNING and not action.resumable:
+        job.processed = 0
+    AdminJob.objects.filter(pk=job.pk).update(
+        status=AdminJob.RUNNING, processed=job.processed, started_at=job.started_at or timezone.now()
+    )
+    try:
+        action.start(job)
+        for offset in range(job.processed, job.total, chunk_size):
+            if AdminJob.objects.filter(pk=job.pk, cancel_requested=True).exists():
+                action.abort(job)
+                _finish(job, AdminJob.CANCELLED)
+                return
+            ids = job.object_ids[offset:offset + chunk_size]
+            with transaction.atomic():
+                action.process(job, model._default_manager.filter(pk__in=ids))
+                AdminJob.objects.filter(pk=job.pk).update(processed=F('processed') + len(ids))
+            job.processed = offset + len(ids)
+        action.finish(job)
+    except Exception as e:
+        logger.exception("Admin job %s (%s) failed", job.pk, job.description)
+        action.abort(job)
+        _finish(job, AdminJob.FAILED, error=f'{type(e).__name__}: {e}')
+        return
+    _finish(job, AdminJob.DONE, **({'result': job.result.name} if job.result else {}))
@@ -0,0 +1,201 @@
+"""
+Idempotency-Key support for write endpoints.
+
+Clients that retry on timeout (IoT gateways, the mobile app) send an
+``Idempotency-Key`` header. The first request with a key runs normally and
+its response is stored for IDEMPOTENCY['TTL_SECONDS']; a repeat of the key
+gets the stored response back (with ``Idempotent-Replayed: true``) without
+running the view again. While the first request is still running, a
+duplicate waits on the key's lock for up to WAIT_SECONDS and then replays
+the result, instead of executing concurrently.
+
+* Keys are scoped to method and path, so one key can't collide across
+  endpoints.
+* Reusing a key with a different payload is a client bug: 422.
+* Only responses the view returns with a status below 500 are stored. 5xx
+  responses and exceptions - including 4xx raised as APIException, e.g.
+  ValidationError from is_valid(raise_exception=True) - are not, so the
+  retry runs the view again.
+
+Records live in Redis when REDIS_URL is set, otherwise in the
+IdempotencyRecord table (expired rows are purged by
+tasks.purge_idempotency_records).
+"""
+import hashlib
+import json
+import time
+import uuid
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.utils.encoders import JSONEncoder
+
+from .models import IdempotencyRecord
+from .redis_client import get_redis
+
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+
+def _payload(value):
+    # Uploaded files are identified by name and size, not read again
+    if hasattr(value, 'size') and hasattr(value, 'name'):
+        return [value.name, value.size]
+    return value
+
+
+def request_fingerprint(request):
+    data = request.data
+    if hasattr(data, 'lists'):  # QueryDict from form / multipart bodies
+        data = sorted((field, [_payload(value) for value in values]) for field, values in data.lists())
+    body = json.dumps(data, cls=JSONEncoder, sort_keys=True, default=str)
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+class RedisStore:
+    prefix = 'idempotency:'
+    # Only delete the lock if this request still owns it
+    release_script = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('del', KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.tokens = {}
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return json.loads(value) if value else None
+
+    def acquire(self, key, fingerprint):
+        token = uuid.uuid4().hex
+        timeout = settings.IDEMPOTENCY['LOCK_TIMEOUT_SECONDS']
+        if self.client.set(f'{self.prefix}{key}:lock', token, nx=True, ex=timeout):
+            self.tokens[key] = token
+            return True
+        return False
+
+    def save(self, key, record):
+        self.client.set(
+            self.prefix + key, json.dumps(record), ex=settings.IDEMPOTENCY['TTL_SECONDS']
+        )
+
+    def release(self, key):
+        token = self.tokens.pop(key, None)
+        if token:
+            self.client.eval(self.release_script, 1, f'{self.prefix}{key}:lock', token)
+
+
+class DatabaseStore:
+    def get(self, key):
+        record = IdempotencyRecord.objects.filter(
+            key=key, status_code__isnull=False, expires_at__gt=timezone.now()
+        ).values('fingerprint', 'status_code', 'response').first()
+        if record is None:
+            return None
+        return {'fingerprint': record['fingerprint'], 'status': record['status_code'], 'data': record['response']}
+
+    def acquire(self, key, fingerprint):
+        now = timezone.now()
+        # A lock left by a crashed request, or a response past its TTL
+        IdempotencyRecord.objects.filter(key=key, expires_at__lte=now).delete()
+        try:
+            with transaction.atomic():
+                IdempotencyRecord.objects.create(
+                    key=key, fingerprint=fingerprint,
+                    expires_at=now + timedelta(seconds=settings.IDEMPOTENCY['LOCK_TIMEOUT_SECONDS'])
+                )
+        except IntegrityError:
+            return False
+        return True
+
+    def save(self, key, record):
+        IdempotencyRecord.objects.filter(key=key).update(
+            status_code=record['status'],
+            response=record['data'],
+            expires_at=timezone.now() + timedelta(seconds=settings.IDEMPOTENCY['TTL_SECONDS']),
+        )
+
+    def release(self, key):
+        IdempotencyRecord.objects.filter(key=key, status_code__isnull=True).delete()
+
+
+def get_store():
+    client = get_redis()
+    return RedisStore(client) if client is not None else DatabaseStore()
+
+
+def purge_expired():
+    """Delete expired database records. Returns the number deleted."""
+    return IdempotencyRecord.objects.filter(expires_at__lte=timezone.now()).delete()[0]
+
+
+def _replay(record, fingerprint):
+    if record['fingerprint'] != fingerprint:
+        return Response(
+            {'detail': f'{HEADER} was already used with a different request body.'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+    return Response(record['data'], status=record['status'], headers={REPLAYED_HEADER: 'true'})
+
+
+def idempotent(view):
+    """Honour the Idempotency-Key header on a DRF view / viewset method"""
+
+    @wraps(view)
+    def wrapper(self, request, *args, **kwargs):
+        value = request.headers.get(HEADER)
+        if not value:
+            return view(self, request, *args, **kwargs)
+        if len(value) > MAX_KEY_LENGTH:
+            return Response(
+                {'detail': f'{HEADER} must be at most {MAX_KEY_LENGTH} characters.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        key = hashlib.sha256(f'{request.method} {request.path} {value}'.encode()).hexdigest()
+        fingerprint = request_fingerprint(request)
+        store = get_store()
+        options = settings.IDEMPOTENCY
+        deadline = time.monotonic() + options['WAIT_SECONDS']
+        while True:
+            record = store.get(key)
+            if record is not None:
+                return _replay(record, fingerprint)
+            if store.acquire(key, fingerprint):
+                break
+            if time.monotonic() >= deadline:
+                return Response(
+                    {'detail': f'A request with this {HEADER} is still being processed.'},
+                    status=status.HTTP_409_CONFLICT
+                )
+            time.sleep(options['POLL_INTERVAL_SECONDS'])
+
+        try:
+            # The original may have finished between get() and acquire()
+            record = store.get(key)
+            if record is not None:
+                return _replay(record, fingerprint)
+
+            response = view(self, request, *args, **kwargs)
+            if response.status_code < 500:
+                store.save(key, {
+                    'fingerprint': fingerprint,
+                    'status': response.status_code,
+                    'data': json.loads(json.dumps(response.data, cls=JSONEncoder)),
+                })
+            return response
+        finally:
+            store.release(key)
+
+    return wrapper
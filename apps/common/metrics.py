@@ -0,0 +1,182 @@
+"""
+Per-request performance metrics, exported in Prometheus text format.
+
+RequestMetricsMiddleware (apps.common.middleware) opens a RequestStats for
+every request; database time is collected through a connection
+execute_wrapper and serializer time through TimedRepresentationMixin. At the
+end of the request everything is folded into the histograms below, labelled
+by DRF route name (e.g. ``incident-list``), viewset action and method.
+
+Under gunicorn, ``gunicorn.conf.py`` sets PROMETHEUS_MULTIPROC_DIR so every
+worker writes its samples to shared files and ``/metrics`` aggregates them.
+The API itself is public, so ``/metrics`` only answers clients in
+METRICS['ALLOWED_NETWORKS'] (by default loopback and private networks,
+where the scraper runs).
+"""
+import ipaddress
+import os
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+
+LABELS = ('route', 'action', 'method')
+
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds',
+    'Wall time spent handling a request',
+    LABELS,
+)
+REQUEST_DB_QUERIES = Histogram(
+    'http_request_db_queries',
+    'Number of database queries issued by a request',
+    LABELS,
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 500, 1000),
+)
+REQUEST_DB_DURATION = Histogram(
+    'http_request_db_duration_seconds',
+    'Time spent executing database queries during a request',
+    LABELS,
+)
+REQUEST_SERIALIZER_DURATION = Histogram(
+    'http_request_serializer_duration_seconds',
+    'Time spent in serializer to_representation during a request',
+    LABELS,
+)
+RESPONSE_SIZE = Histogram(
+    'http_response_size_bytes',
+    'Size of the response body',
+    LABELS,
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216),
+)
+RESPONSES = Counter(
+    'http_responses_total',
+    'Responses by status code class',
+    LABELS + ('status',),
+)
+
+# Two-tier caches (apps.common.tiered_cache)
+CACHE_REQUESTS = Counter(
+    'tiered_cache_requests',
+    'Cache lookups by tier and result',
+    ('cache', 'tier', 'result'),
+)
+CACHE_ENTRIES = Gauge(
+    'tiered_cache_entries',
+    'Entries held in the in-process LRU tier',
+    ('cache',),
+    multiprocess_mode='livesum',
+)
+CACHE_BYTES = Gauge(
+    'tiered_cache_bytes',
+    'Size of the payloads held in the in-process LRU tier',
+    ('cache',),
+    multiprocess_mode='livesum',
+)
+
+
+class RequestStats:
+    __slots__ = ('started', 'queries', 'db_time', 'serializer_time', 'serializer_depth')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+
+    def execute_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+
+
+current_request_stats = ContextVar('current_request_stats', default=None)
+
+
+class TimedRepresentationMixin:
+    """
+    Adds the time spent in to_representation to the current request's
+    serializer time. Nested serializers are only counted once.
+    """
+
+    def to_representation(self, instance):
+        stats = current_request_stats.get()
+        if stats is None or stats.serializer_depth:
+            return super().to_representation(instance)
+
+        stats.serializer_depth += 1
+        started = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            stats.serializer_time += time.perf_counter() - started
+            stats.serializer_depth -= 1
+
+
+def request_labels(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unmatched', '', request.method
+    actions = getattr(match.func, 'actions', None) or {}
+    return (
+        match.view_name or 'unnamed',
+        actions.get(request.method.lower(), ''),
+        request.method,
+    )
+
+
+def observe_request(request, response, stats):
+    labels = request_labels(request)
+    REQUEST_DURATION.labels(*labels).observe(time.perf_counter() - stats.started)
+    REQUEST_DB_QUERIES.labels(*labels).observe(stats.queries)
+    REQUEST_DB_DURATION.labels(*labels).observe(stats.db_time)
+    REQUEST_SERIALIZER_DURATION.labels(*labels).observe(stats.serializer_time)
+    if not response.streaming:
+        RESPONSE_SIZE.labels(*labels).observe(len(response.content))
+    RESPONSES.labels(*labels, f'{response.status_code // 100}xx').inc()
+
+
+def scrape_allowed(request):
+    """
+    Whether the connecting peer is in an allowed network. X-Forwarded-For is
+    ignored: anyone reaching the app directly could claim any address there.
+    """
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(
+        address in ipaddress.ip_network(network, strict=False)
+        for network in settings.METRICS['ALLOWED_NETWORKS'] if network
+    )
+
+
+def metrics_view(request):
+    """
+    GET /metrics
+    Prometheus scrape endpoint
+    """
+    if not scrape_allowed(request):
+        return HttpResponseForbidden()
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return HttpResponse(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,92 @@
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+from .metrics import RequestStats, current_request_stats, observe_request
+from .query_inspector import QueryInspector, report_duplicates
+
+
+class RequestMetricsMiddleware:
+    """
+    Records wall time, DB query count and time, serializer time and response
+    size for every request (see apps.common.metrics). Works for both sync and
+    async views so streaming async responses are not forced through a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.excluded_paths = set(settings.METRICS['EXCLUDED_PATHS'])
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def _instrument(self, stack):
+        stats = RequestStats()
+        token = current_request_stats.set(stats)
+        stack.callback(current_request_stats.reset, token)
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(stats.execute_wrapper))
+        return stats
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if request.path in self.excluded_paths:
+            return self.get_response(request)
+
+        with ExitStack() as stack:
+            stats = self._instrument(stack)
+            response = self.get_response(request)
+        observe_request(request, response, stats)
+        return response
+
+    async def __acall__(self, request):
+        if request.path in self.excluded_paths:
+            return await self.get_response(request)
+
+        with ExitStack() as stack:
+            stats = self._instrument(stack)
+            response = await self.get_response(request)
+        observe_request(request, response, stats)
+        return response
+
+
+class DuplicateQueryMiddleware:
+    """
+    Fingerprints the SQL issued by each request and reports repeated query
+    shapes (see apps.common.query_inspector). Does nothing unless
+    settings.QUERY_INSPECTOR["ENABLED"] is set, so it is meant for debug,
+    test and staging deployments.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.QUERY_INSPECTOR["ENABLED"]:
+            return self.get_response(request)
+
+        inspector = QueryInspector()
+        with inspector.installed():
+            response = self.get_response(request)
+        report_duplicates(request, inspector)
+        return response
+
+    async def __acall__(self, request):
+        if not settings.QUERY_INSPECTOR["ENABLED"]:
+            return await self.get_response(request)
+
+        inspector = QueryInspector()
+        with inspector.installed():
+            response = await self.get_response(request)
+        report_duplicates(request, inspector)
+        return response
@@ -1,13 +1,13 @@
 # Create your models here.
 
-import datetime
 # import uuid
-from datetime import datetime
 
+from django.conf import settings
 from django.db import models
 # from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
-from django.utils.crypto import get_random_string
+
+from .ids import uuid7
 # from django.core.validators import RegexValidator
 
 
@@ -24,7 +24,7 @@ from django.utils.crypto import get_random_string
 
 
 class TimeStampModel(models.Model):
-    id = models.CharField(max_length=256, primary_key=True, editable=False)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -32,10 +32,74 @@ class TimeStampModel(models.Model):
         # managed = True
         abstract = True
 
-    def save(self, *args, **kwargs):
-        if not self.id:
-            self.id = datetime.now().strftime("%d%m%Y%H%M%S%f") + get_random_string(
-                length=5, allowed_chars="0123456789"
-            )
-        super(TimeStampModel, self).save(*args, **kwargs)
 
+
+class IdempotencyRecord(models.Model):
+    """
+    Stored outcome of a write sent with an Idempotency-Key, used by
+    apps.common.idempotency when Redis is not configured. A row without a
+    status code is the lock of a request that is still running.
+    """
+    key = models.CharField(max_length=64, unique=True, help_text="SHA-256 of method, path and key")
+    fingerprint = models.CharField(max_length=64, help_text="SHA-256 of the request payload")
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response = models.JSONField(null=True, blank=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name = _("Idempotency Record")
+        verbose_name_plural = _("Idempotency Records")
+
+    def __str__(self):
+        return self.key
+
+
+
+class AdminJob(TimeStampModel):
+    """
+    A bulk admin action running in a Celery worker (apps.common.admin_jobs).
+    The selected primary keys are stored with the job; ``processed`` is
+    advanced in the same transaction as each chunk of work.
+    """
+    QUEUED = 'QUEUED'
+    RUNNING = 'RUNNING'
+    DONE = 'DONE'
+    FAILED = 'FAILED'
+    CANCELLED = 'CANCELLED'
+    STATUS_CHOICES = [
+        (QUEUED, _('Queued')),
+        (RUNNING, _('Running')),
+        (DONE, _('Done')),
+        (FAILED, _('Failed')),
+        (CANCELLED, _('Cancelled')),
+    ]
+    FINISHED = [DONE, FAILED, CANCELLED]
+
+    action = models.CharField(max_length=200, help_text="Dotted path of the BackgroundAction")
+    description = models.CharField(max_length=200)
+    model = models.CharField(max_length=100, help_text="app_label.model_name of the selected objects")
+    object_ids = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    total = models.PositiveIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    cancel_requested = models.BooleanField(default=False)
+    error = models.TextField(blank=True)
+    result = models.FileField(upload_to='admin-jobs/', blank=True)
+    created_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = _("Admin Job")
+        verbose_name_plural = _("Admin Jobs")
+
+    def __str__(self):
+        return f"{self.description} ({self.processed}/{self.total})"
+
+    @property
+    def progress(self):
+        """Percentage of the selection processed"""
+        return round(100 * self.processed / self.total) if self.total else 100
@@ -0,0 +1,120 @@
+"""
+Page number pagination that doesn't count large tables.
+
+PageNumberPagination runs ``SELECT COUNT(*)`` over the filtered queryset on
+every page, which on PostgreSQL scans the whole table. EstimatedCountPagination
+asks the planner instead: pg_class.reltuples (summed over partitions) for an
+unfiltered queryset, the EXPLAIN row estimate for a filtered one. Counts
+estimated below ESTIMATED_COUNT_THRESHOLD are cheap enough to run exactly.
+The response says which one it got in ``count_is_estimate``.
+
+With an estimated count the page number isn't checked against it, and
+``next`` is set when one more row than the page exists, so paging works
+whether the estimate is high or low. Other databases keep exact counts.
+"""
+from django.conf import settings
+from django.core.paginator import EmptyPage, Page, PageNotAnInteger, Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+
+
+def _table_estimate(cursor, table):
+    # Leaf tables only: a partitioned parent has no rows of its own.
+    # reltuples is -1 for a table that was never analyzed.
+    cursor.execute(
+        """
+        SELECT sum(reltuples), bool_or(reltuples < 0)
+        FROM pg_class
+        WHERE relkind = 'r' AND (
+            oid = to_regclass(%s)
+            OR oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = to_regclass(%s))
+        )
+        """,
+        [table, table],
+    )
+    total, unknown = cursor.fetchone()
+    return None if total is None or unknown else int(total)
+
+
+def estimate_count(queryset):
+    """Planner estimate of the number of rows, or None when there isn't one"""
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    query = queryset.query
+    with connection.cursor() as cursor:
+        if not query.where and not query.combinator and not query.distinct:
+            estimate = _table_estimate(cursor, queryset.model._meta.db_table)
+            if estimate is not None:
+                return estimate
+        sql, params = queryset.order_by().query.sql_with_params()
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+class EstimatedPage(Page):
+    has_next_page = None
+
+    def has_next(self):
+        if self.has_next_page is not None:
+            return self.has_next_page
+        return super().has_next()
+
+
+class EstimatedCountPaginator(Paginator):
+    count_is_estimate = False
+
+    @cached_property
+    def count(self):
+        estimate = estimate_count(self.object_list) if hasattr(self.object_list, 'query') else None
+        if estimate is None or estimate < settings.ESTIMATED_COUNT_THRESHOLD:
+            return super().count
+        self.count_is_estimate = True
+        return estimate
+
+    def validate_number(self, number):
+        if not self.count or not self.count_is_estimate:
+            return super().validate_number(number)
+        # Only the rows themselves tell where the last page is
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(_("That page number is not an integer"))
+        if number < 1:
+            raise EmptyPage(_("That page number is less than 1"))
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if not self.count_is_estimate:
+            return super().page(number)
+        bottom = (number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        page = self._get_page(rows[:self.per_page], number, self)
+        page.has_next_page = len(rows) > self.per_page
+        return page
+
+    def _get_page(self, *args, **kwargs):
+        return EstimatedPage(*args, **kwargs)
+
+
+class EstimatedCountPagination(PageNumberPagination):
+    django_paginator_class = EstimatedCountPaginator
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.page.paginator.count,
+            'count_is_estimate': self.page.paginator.count_is_estimate,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        response = super().get_paginated_response_schema(schema)
+        response['properties']['count_is_estimate'] = {'type': 'boolean', 'example': False}
+        return response
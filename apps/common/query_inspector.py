@@ -0,0 +1,160 @@
+"""
+Runtime N+1 / duplicate query detection.
+
+Every SQL statement is reduced to a fingerprint (literals, placeholders and
+IN-lists collapsed) so ``SELECT ... WHERE incident_id = 1`` and ``... = 2``
+count as the same shape. When a shape repeats ``THRESHOLD`` times or more
+within one request (or one ``detect_duplicate_queries`` block) it is reported
+together with the project call sites that issued it.
+
+Use ``detect_duplicate_queries()`` in tests, or enable
+``DuplicateQueryMiddleware`` through settings.QUERY_INSPECTOR:
+
+    QUERY_INSPECTOR = {
+        "ENABLED": True,     # inspect every request
+        "THRESHOLD": 5,      # repeats of one shape before it is reported
+        "RAISE": False,      # True in tests: raise DuplicateQueriesError
+    }
+"""
+import json
+import logging
+import os
+import re
+import sys
+from collections import Counter, defaultdict
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_RE = re.compile(r"%s|\?|%\(\w+\)s")
+_IN_LIST_RE = re.compile(r"\bIN\s*\((?:\s*\?\s*,?)+\)", re.IGNORECASE)
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def fingerprint(sql):
+    """Normalize SQL so queries differing only in their values compare equal"""
+    sql = _STRING_RE.sub("?", sql)
+    sql = _NUMBER_RE.sub("?", sql)
+    sql = _PLACEHOLDER_RE.sub("?", sql)
+    sql = _IN_LIST_RE.sub("IN (...)", sql)
+    return _WHITESPACE_RE.sub(" ", sql).strip()
+
+
+_SKIPPED_PATHS = (
+    os.path.dirname(__file__) + os.sep + "query_inspector.py",
+    os.sep + "site-packages" + os.sep,
+    os.sep + "dist-packages" + os.sep,
+)
+
+
+def _call_site():
+    """Innermost stack frame that belongs to the project itself"""
+    base_dir = str(settings.BASE_DIR)
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(base_dir) and not any(part in filename for part in _SKIPPED_PATHS):
+            return f"{os.path.relpath(filename, base_dir)}:{frame.f_lineno} in {frame.f_code.co_name}"
+        frame = frame.f_back
+    return "<unknown>"
+
+
+class DuplicateQueriesError(AssertionError):
+    """Raised when repeated query shapes are found in strict (test) mode"""
+
+    def __init__(self, duplicates):
+        self.duplicates = duplicates
+        lines = [
+            f"{item['count']}x {item['sql']}\n    from: " + "; ".join(
+                f"{site} ({count}x)" for site, count in item['call_sites'].items()
+            )
+            for item in duplicates
+        ]
+        super().__init__("Repeated queries detected (possible N+1):\n" + "\n".join(lines))
+
+
+class QueryInspector:
+    """Collects query fingerprints while installed on the database connections"""
+
+    def __init__(self, threshold=None):
+        self.threshold = threshold or settings.QUERY_INSPECTOR["THRESHOLD"]
+        self.counts = Counter()
+        self.call_sites = defaultdict(Counter)
+        self.samples = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        key = fingerprint(sql)
+        self.counts[key] += 1
+        self.call_sites[key][_call_site()] += 1
+        self.samples.setdefault(key, sql)
+        return execute(sql, params, many, context)
+
+    @contextmanager
+    def installed(self):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+    @property
+    def total(self):
+        return sum(self.counts.values())
+
+    def duplicates(self):
+        return [
+            {
+                'fingerprint': key,
+                'sql': self.samples[key],
+                'count': count,
+                'call_sites': dict(self.call_sites[key].most_common()),
+            }
+            for key, count in self.counts.most_common()
+            if count >= self.threshold
+        ]
+
+
+@contextmanager
+def detect_duplicate_queries(threshold=None, raise_on_duplicates=True):
+    """
+    Context manager for tests:
+
+        with detect_duplicate_queries():
+            client.get("/api/v1/incident_reporting/incidents/")
+    """
+    inspector = QueryInspector(threshold)
+    with inspector.installed():
+        yield inspector
+    duplicates = inspector.duplicates()
+    if duplicates and raise_on_duplicates:
+        raise DuplicateQueriesError(duplicates)
+
+
+def report_duplicates(request, inspector):
+    duplicates = inspector.duplicates()
+    if not duplicates:
+        return
+    if settings.QUERY_INSPECTOR["RAISE"]:
+        raise DuplicateQueriesError(duplicates)
+
+    event = {
+        'event': 'duplicate_queries',
+        'method': request.method,
+        'path': request.path,
+        'view': getattr(getattr(request, 'resolver_match', None), 'view_name', None),
+        'total_queries': inspector.total,
+        'duplicates': [
+            {
+                'sql': item['fingerprint'],
+                'count': item['count'],
+                'call_sites': item['call_sites'],
+            }
+            for item in duplicates
+        ],
+    }
+    logger.warning(json.dumps(event), extra={'duplicate_queries': event})
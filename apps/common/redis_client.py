@@ -0,0 +1,29 @@
+from functools import lru_cache
+
+from django.conf import settings
+
+
+@lru_cache(maxsize=None)
+def get_redis():
+    """
+    Process-wide Redis client built from settings.REDIS_URL.
+    Returns None when Redis is not configured so callers can fall back
+    to an in-process implementation.
+    """
+    if not settings.REDIS_URL:
+        return None
+
+    import redis
+    return redis.Redis.from_url(settings.REDIS_URL)
+
+
+def get_async_redis():
+    """
+    New asyncio Redis client, or None when Redis is not configured.
+    Async clients are bound to the running event loop, so they are not cached.
+    """
+    if not settings.REDIS_URL:
+        return None
+
+    import redis.asyncio
+    return redis.asyncio.Redis.from_url(settings.REDIS_URL)
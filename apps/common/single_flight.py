@@ -0,0 +1,169 @@
+"""
+Single-flight computation of expensive, shared results.
+
+When dozens of dashboards load at once, every worker thread used to run the
+same aggregate queries side by side. A SingleFlight makes sure only one
+computation per key runs at a time and lets every concurrent caller share
+its result:
+
+* within a process, callers of a key that is being computed wait on the
+  computing thread's Future;
+* across processes, the computing process holds a Redis lock
+  (``SET NX EX``, released only by its owner) while the others poll the
+  shared cache for the result, computing it themselves only if it doesn't
+  show up within WAIT_SECONDS.
+
+Results are stored in the default cache with the time they were computed.
+For FRESH_SECONDS they are returned as they are; for STALE_SECONDS after
+that they are still returned, and the first caller to take the lock
+recomputes them: stale-while-revalidate, so a dashboard never waits while a
+previous value exists. Without Redis the lock is per process.
+
+    flight = SingleFlight('dashboard-stats', 'AGGREGATE_CACHE')
+    payload = flight.get(make_key('dashboard_stats', params), compute)
+"""
+import hashlib
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .redis_client import get_redis
+
+
+def make_key(endpoint, params=None):
+    """Key of an endpoint and its parameters, independent of their order"""
+    normalized = json.dumps(params or {}, sort_keys=True, cls=DjangoJSONEncoder)
+    return f'{endpoint}:{hashlib.sha256(normalized.encode()).hexdigest()[:32]}'
+
+
+class RedisLock:
+    prefix = 'single-flight-lock:'
+    # Only delete the lock if this process still owns it
+    release_script = """
+    if redis.call('get', KEYS[1]) == ARGV[1] then
+        return redis.call('del', KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def acquire(self, key, timeout):
+        token = uuid.uuid4().hex
+        if self.client.set(self.prefix + key, token, nx=True, ex=timeout):
+            return token
+        return None
+
+    def release(self, key, token):
+        self.client.eval(self.release_script, 1, self.prefix + key, token)
+
+
+class LocalLock:
+    """Stand-in without Redis: the in-process Futures already serialize a worker"""
+
+    def acquire(self, key, timeout):
+        return 'local'
+
+    def release(self, key, token):
+        pass
+
+
+def get_lock():
+    client = get_redis()
+    return RedisLock(client) if client is not None else LocalLock()
+
+
+class SingleFlight:
+    # How often processes without the lock look for the result
+    poll_interval = 0.05
+
+    def __init__(self, name, setting):
+        self.name = name
+        # Name of the settings dict with FRESH_SECONDS, STALE_SECONDS,
+        # LOCK_TIMEOUT_SECONDS and WAIT_SECONDS
+        self.setting = setting
+        self.lock = threading.Lock()
+        # key -> Future of the computation running in this process
+        self.flights = {}
+
+    @property
+    def config(self):
+        return getattr(settings, self.setting)
+
+    def cache_key(self, key):
+        return f'single-flight:{self.name}:{key}'
+
+    def _cached(self, key):
+        entry = cache.get(self.cache_key(key))
+        if entry is None:
+            return None, False
+        return entry['value'], time.time() - entry['computed_at'] < self.config['FRESH_SECONDS']
+
+    def get(self, key, compute):
+        """compute()'s result for key, shared with every concurrent caller"""
+        value, fresh = self._cached(key)
+        if fresh:
+            return value
+        stale = value
+
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = Future()
+        if not leader:
+            # Another thread is recomputing: serve the stale value or wait for it
+            return stale if stale is not None else flight.result()
+
+        try:
+            result = self._compute(key, compute, stale)
+        except BaseException as e:
+            flight.set_exception(e)
+            raise
+        else:
+            flight.set_result(result)
+            return result
+        finally:
+            with self.lock:
+                self.flights.pop(key, None)
+
+    def _compute(self, key, compute, stale):
+        lock = get_lock()
+        token = lock.acquire(self.cache_key(key), self.config['LOCK_TIMEOUT_SECONDS'])
+        if token is None:
+            # Another process is computing
+            if stale is not None:
+                return stale
+            deadline = time.monotonic() + self.config['WAIT_SECONDS']
+            while time.monotonic() < deadline:
+                time.sleep(self.poll_interval)
+                value, _ = self._cached(key)
+                if value is not None:
+                    return value
+        else:
+            # The previous holder may have stored a fresh value meanwhile
+            value, fresh = self._cached(key)
+            if fresh:
+                lock.release(self.cache_key(key), token)
+                return value
+        try:
+            return self.refresh(key, compute)
+        finally:
+            if token is not None:
+                lock.release(self.cache_key(key), token)
+
+    def refresh(self, key, compute):
+        value = compute()
+        cache.set(
+            self.cache_key(key),
+            {'value': value, 'computed_at': time.time()},
+            self.config['FRESH_SECONDS'] + self.config['STALE_SECONDS'],
+        )
+        return value
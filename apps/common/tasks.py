@@ -0,0 +1,15 @@
+from celery import shared_task
+
+from . import admin_jobs, idempotency
+
+
+@shared_task(acks_late=True, reject_on_worker_lost=True, ignore_result=True)
+def purge_idempotency_records():
+    """Delete expired Idempotency-Key rows (Redis expires its keys itself)"""
+    return idempotency.purge_expired()
+
+
+@shared_task(acks_late=True, reject_on_worker_lost=True, ignore_result=True)
+def run_admin_job(job_id):
+    """Run a bulk admin action; a redelivered job resumes after its last chunk"""
+    admin_jobs.run(job_id)
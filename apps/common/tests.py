@@ -1,3 +1,315 @@
-from django.test import TestCase
+import threading
+import time
+import uuid
+from unittest import mock
+
+from django.conf import settings
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.http import HttpResponse
+from django.test import TestCase, override_settings
+from django.urls import path
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY
+
+from apps.common import throttling
+from apps.common.ids import uuid7, uuid7_time
+from apps.common.single_flight import SingleFlight, make_key
+from apps.common.query_inspector import (
+    DuplicateQueriesError,
+    detect_duplicate_queries,
+    fingerprint,
+)
+from apps.incident_reporting.models import Incident
 
 # Create your tests here.
+
+
+def repeated_queries_view(request):
+    for _ in range(6):
+        Incident.objects.filter(category='INCIDENT').exists()
+    return HttpResponse("ok")
+
+
+urlpatterns = [
+    path("repeated/", repeated_queries_view),
+]
+
+
+class Uuid7Tests(TestCase):
+    def test_ids_are_version_7_and_strictly_increasing(self):
+        ids = [uuid7() for _ in range(10000)]
+        self.assertEqual({value.version for value in ids}, {7})
+        self.assertEqual({value.variant for value in ids}, {uuid.RFC_4122})
+        self.assertEqual(ids, sorted(ids))
+        self.assertEqual(len(set(ids)), len(ids))
+
+    def test_timestamp_is_embedded(self):
+        self.assertAlmostEqual(uuid7_time(uuid7()), time.time(), delta=1)
+
+
+class QueryFingerprintTests(TestCase):
+    def test_literals_and_in_lists_are_collapsed(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id = 12 AND name = 'x' AND k IN (%s, %s, %s)"),
+            fingerprint("SELECT *  FROM t WHERE id = 7 AND name = 'it''s' AND k IN (%s)"),
+        )
+
+    def test_different_shapes_differ(self):
+        self.assertNotEqual(
+            fingerprint("SELECT * FROM t WHERE id = %s"),
+            fingerprint("SELECT * FROM t WHERE name = %s"),
+        )
+
+
+class DetectDuplicateQueriesTests(TestCase):
+    def test_repeated_shape_raises_with_call_site(self):
+        with self.assertRaises(DuplicateQueriesError) as ctx:
+            with detect_duplicate_queries(threshold=3):
+                for category in ['INCIDENT', 'NEAR_MISS', 'UNSAFE_ACT']:
+                    Incident.objects.filter(category=category).count()
+
+        duplicate = ctx.exception.duplicates[0]
+        self.assertEqual(duplicate['count'], 3)
+        self.assertIn('apps/common/tests.py', next(iter(duplicate['call_sites'])))
+
+    def test_below_threshold_passes(self):
+        with detect_duplicate_queries(threshold=3) as inspector:
+            Incident.objects.count()
+            Incident.objects.filter(category='INCIDENT').count()
+        self.assertEqual(inspector.total, 2)
+
+    def test_only_collects_while_installed(self):
+        with detect_duplicate_queries() as inspector:
+            pass
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1")
+        self.assertEqual(inspector.total, 0)
+
+
+@override_settings(ROOT_URLCONF=__name__)
+class DuplicateQueryMiddlewareTests(TestCase):
+    def test_strict_mode_fails_the_request(self):
+        with self.settings(QUERY_INSPECTOR={"ENABLED": True, "THRESHOLD": 5, "RAISE": True}):
+            with self.assertRaises(DuplicateQueriesError):
+                self.client.get("/repeated/")
+
+    def test_logs_structured_warning(self):
+        with self.settings(QUERY_INSPECTOR={"ENABLED": True, "THRESHOLD": 5, "RAISE": False}):
+            with self.assertLogs('apps.common.query_inspector', level='WARNING') as logs:
+                response = self.client.get("/repeated/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(logs.records[0].duplicate_queries['duplicates'][0]['count'], 6)
+
+
+THROTTLE_RATES = {'read': '5/min', 'write': '2/min', 'upload': '1/min', 'bulk': '1/min'}
+INCIDENTS = '/api/v1/incident_reporting/incidents/'
+
+
+@override_settings(THROTTLE={'ENABLED': True, 'RATES': THROTTLE_RATES})
+class TokenBucketThrottleTests(TestCase):
+    def post(self, path=INCIDENTS, **extra):
+        return self.client.post(path, {}, content_type='application/json', **extra)
+
+    def test_write_budget_runs_out_with_retry_after(self):
+        self.assertEqual(self.post().status_code, 400)
+        self.assertEqual(self.post().status_code, 400)
+        response = self.post()
+        self.assertEqual(response.status_code, 429)
+        # One token every 30 seconds
+        self.assertEqual(response.headers['Retry-After'], '30')
+
+        # Reads, and other clients, have their own buckets
+        self.assertEqual(self.client.get(INCIDENTS).status_code, 200)
+        self.assertEqual(self.post(REMOTE_ADDR='10.0.0.9').status_code, 400)
+
+    def test_forwarded_client_ip_is_ignored_without_a_proxy(self):
+        for address in ['203.0.113.1', '203.0.113.2']:
+            self.assertEqual(self.post(HTTP_X_FORWARDED_FOR=address).status_code, 400)
+        self.assertEqual(self.post(HTTP_X_FORWARDED_FOR='203.0.113.3').status_code, 429)
+
+    @override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1})
+    def test_forwarded_client_ip_is_used_behind_the_proxy(self):
+        for _ in range(2):
+            self.post(HTTP_X_FORWARDED_FOR='203.0.113.7')
+        self.assertEqual(self.post(HTTP_X_FORWARDED_FOR='203.0.113.7').status_code, 429)
+        self.assertEqual(self.post(HTTP_X_FORWARDED_FOR='203.0.113.8').status_code, 400)
+
+    def test_bulk_and_upload_routes_have_their_own_budgets(self):
+        bulk = INCIDENTS + 'bulk/'
+        self.assertEqual(self.client.patch(bulk, {}, content_type='application/json').status_code, 400)
+        self.assertEqual(self.client.patch(bulk, {}, content_type='application/json').status_code, 429)
+        upload = INCIDENTS + f'{uuid7()}/upload_attachment/'
+        self.assertEqual(self.client.post(upload).status_code, 404)
+        self.assertEqual(self.client.post(upload).status_code, 429)
+        self.assertEqual(self.post().status_code, 400)
+
+    def test_async_views_share_the_read_budget(self):
+        async_incidents = '/api/v1/incident_reporting/async/incidents/'
+        for url in [INCIDENTS] * 3 + [async_incidents, async_incidents + 'dashboard_stats/']:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        response = self.client.get(async_incidents)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers['Retry-After'], '12')
+        self.assertEqual(self.client.get(INCIDENTS).status_code, 429)
+
+    def test_redis_buckets(self):
+        client = mock.Mock()
+        client.register_script.return_value.side_effect = [[1, '0'], [0, '12.5']]
+        with mock.patch('apps.common.throttling.get_redis', return_value=client):
+            throttling.get_buckets.cache_clear()
+            self.assertEqual(self.post(REMOTE_ADDR='10.0.0.1').status_code, 400)
+            response = self.post(REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers['Retry-After'], '13')
+        self.assertEqual(
+            client.register_script.return_value.call_args.kwargs,
+            {'keys': ['throttle:write:ip:10.0.0.1'], 'args': [2, 2 / 60]},
+        )
+
+    def test_redis_failure_lets_requests_through(self):
+        client = mock.Mock()
+        client.register_script.return_value.side_effect = ConnectionError('down')
+        with mock.patch('apps.common.throttling.get_redis', return_value=client), \
+                self.assertLogs('apps.common.throttling', 'ERROR'):
+            throttling.get_buckets.cache_clear()
+            for _ in range(3):
+                self.assertEqual(self.post().status_code, 400)
+
+    def test_local_bucket_refills(self):
+        buckets = throttling.LocalBuckets()
+        with mock.patch('apps.common.throttling.time.monotonic', side_effect=[0, 0, 0.2, 0.5]):
+            self.assertEqual(buckets.take('k', 2, 2.0), (True, 0.0))
+            self.assertEqual(buckets.take('k', 2, 2.0), (True, 0.0))
+            allowed, wait = buckets.take('k', 2, 2.0)
+            self.assertFalse(allowed)
+            self.assertAlmostEqual(wait, 0.3)
+            self.assertTrue(buckets.take('k', 2, 2.0)[0])
+
+        # Well under a millisecond per check
+        started = time.perf_counter()
+        for index in range(10000):
+            buckets.take(f'client-{index % 100}', 60, 1.0)
+        self.assertLess((time.perf_counter() - started) / 10000, 0.0001)
+
+
+AGGREGATE_CACHE = {'FRESH_SECONDS': 60, 'STALE_SECONDS': 300, 'LOCK_TIMEOUT_SECONDS': 5, 'WAIT_SECONDS': 1}
+
+
+@override_settings(AGGREGATE_CACHE=AGGREGATE_CACHE)
+class SingleFlightTests(TestCase):
+    def setUp(self):
+        self.flight = SingleFlight('test', 'AGGREGATE_CACHE')
+        self.calls = 0
+        self.release = threading.Event()
+        self.started = threading.Event()
+
+    def slow_compute(self):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(5)
+        return {'calls': self.calls}
+
+    def in_threads(self, count):
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(self.flight.get('key', self.slow_compute)))
+            for _ in range(count)
+        ]
+        for thread in threads:
+            thread.start()
+        return threads, results
+
+    def test_concurrent_callers_share_one_computation(self):
+        threads, results = self.in_threads(8)
+        self.started.wait(5)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, [{'calls': 1}] * 8)
+        # Fresh: served without computing
+        self.assertEqual(self.flight.get('key', self.slow_compute), {'calls': 1})
+        self.assertEqual(self.calls, 1)
+
+    def test_stale_value_is_served_while_recomputing(self):
+        self.release.set()
+        self.flight.get('key', self.slow_compute)
+        self.release.clear()
+        self.started.clear()
+        with override_settings(AGGREGATE_CACHE={**AGGREGATE_CACHE, 'FRESH_SECONDS': 0}):
+            threads, results = self.in_threads(1)
+            self.started.wait(5)
+            # The recomputation is running: the previous value comes back at once
+            self.assertEqual(self.flight.get('key', self.slow_compute), {'calls': 1})
+            self.release.set()
+            threads[0].join()
+        self.assertEqual(results, [{'calls': 2}])
+        self.assertEqual(self.flight.get('key', self.slow_compute), {'calls': 2})
+
+    def test_other_processes_wait_for_the_lock_holder(self):
+        client = mock.Mock()
+        client.set.return_value = False  # locked by another process
+        compute = mock.Mock(return_value='computed here')
+        with mock.patch('apps.common.single_flight.get_redis', return_value=client):
+            other = threading.Timer(0.1, lambda: self.flight.refresh('key', lambda: 'computed there'))
+            other.start()
+            self.assertEqual(self.flight.get('key', compute), 'computed there')
+            compute.assert_not_called()
+
+            # The holder died: compute after WAIT_SECONDS
+            self.assertEqual(self.flight.get('other', compute), 'computed here')
+        client.eval.assert_not_called()
+
+    def test_keys_ignore_parameter_order(self):
+        self.assertEqual(
+            make_key('analytics', {'a': 1, 'b': [2]}), make_key('analytics', {'b': [2], 'a': 1})
+        )
+        self.assertNotEqual(make_key('analytics', {'a': 1}), make_key('analytics', {'a': 2}))
+
+    def test_dashboard_stats_is_computed_once(self):
+        url = '/api/v1/incident_reporting/incidents/dashboard_stats/'
+        first = self.client.get(url)
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(url)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(len(queries), 0)
+
+
+class RequestMetricsTests(TestCase):
+    def detail_sample(self, name, **labels):
+        labels = {'route': 'incident-detail', 'action': 'retrieve', 'method': 'GET', **labels}
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_requests_are_labelled_by_route_not_path(self):
+        duration = self.detail_sample('http_request_duration_seconds_count')
+        not_found = self.detail_sample('http_responses_total', status='4xx')
+        for _ in range(2):
+            self.assertEqual(self.client.get(f'{INCIDENTS}{uuid7()}/').status_code, 404)
+        self.assertEqual(self.detail_sample('http_request_duration_seconds_count') - duration, 2)
+        self.assertEqual(self.detail_sample('http_responses_total', status='4xx') - not_found, 2)
+
+        routes = {
+            sample.labels['route']
+            for metric in REGISTRY.collect() if metric.name == 'http_request_duration_seconds'
+            for sample in metric.samples
+        }
+        self.assertFalse([route for route in routes if route.startswith('/')])
+
+    def test_metrics_endpoint_serves_the_exposition_format(self):
+        self.client.get(INCIDENTS)
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], CONTENT_TYPE_LATEST)
+        self.assertIn(
+            b'http_request_duration_seconds_bucket{action="list",le="0.005",method="GET",route="incident-list"}',
+            response.content
+        )
+
+    def test_metrics_are_only_served_to_allowed_networks(self):
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='10.1.2.3').status_code, 200)
+        self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='203.0.113.5').status_code, 403)
+        # A forwarded address can be spoofed by a direct client, only the peer counts
+        response = self.client.get('/metrics', REMOTE_ADDR='203.0.113.5', HTTP_X_FORWARDED_FOR='127.0.0.1')
+        self.assertEqual(response.status_code, 403)
+        with override_settings(METRICS={**settings.METRICS, 'ALLOWED_NETWORKS': ['203.0.113.0/24']}):
+            self.assertEqual(self.client.get('/metrics', REMOTE_ADDR='203.0.113.5').status_code, 200)
@@ -0,0 +1,152 @@
+"""
+Token-bucket throttling of the API.
+
+The API has no authentication (AllowAny), so a single sensor gateway looping
+on ``create`` could take every gunicorn thread and the database with it.
+Every client gets a bucket per scope:
+
+* ``read``   - GET / HEAD / OPTIONS
+* ``write``  - other methods
+* ``upload`` and ``bulk`` - views name these per action in ``throttle_scopes``
+
+A bucket holds up to N tokens and refills at N per period, from the rates in
+THROTTLE['RATES'] (``"60/min"``): a client can burst N requests, then keeps
+the sustained rate. A request without a token gets 429 with Retry-After set
+to when the next token arrives.
+
+Clients are the authenticated user when there is one, otherwise the client
+IP. X-Forwarded-For is only read when REST_FRAMEWORK['NUM_PROXIES'] says how
+many proxies to look through (0 by default: the connecting address).
+
+With REDIS_URL set the buckets live in Redis and are updated by one Lua
+script (EVALSHA, a single round trip), so the check is atomic across
+workers and uses the Redis clock; otherwise each process keeps its own.
+When Redis fails, requests are let through rather than refused.
+"""
+import logging
+import math
+import threading
+import time
+from functools import lru_cache
+
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+from .redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+READ = 'read'
+WRITE = 'write'
+UPLOAD = 'upload'
+BULK = 'bulk'
+
+PERIODS = {'s': 1, 'sec': 1, 'm': 60, 'min': 60, 'h': 3600, 'hour': 3600, 'd': 86400, 'day': 86400}
+
+
+def parse_rate(rate):
+    """'60/min' -> (capacity 60, refill 1.0 token per second)"""
+    count, period = rate.split('/')
+    return int(count), int(count) / PERIODS[period]
+
+
+class RedisBuckets:
+    prefix = 'throttle:'
+    # Refill, then take one token if there is one. Returns {allowed, wait}
+    # (wait as a string: Lua numbers are truncated to integers on return).
+    script = """
+    local capacity = tonumber(ARGV[1])
+    local refill = tonumber(ARGV[2])
+    local clock = redis.call('TIME')
+    local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'at')
+    local tokens = tonumber(bucket[1]) or capacity
+    local at = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - at) * refill)
+    local allowed, wait = 0, (1 - tokens) / refill
+    if tokens >= 1 then
+        tokens = tokens - 1
+        allowed, wait = 1, 0
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'at', tostring(now))
+    redis.call('EXPIRE', KEYS[1], math.ceil(capacity / refill) + 1)
+    return {allowed, tostring(wait)}
+    """
+
+    def __init__(self, client):
+        self.take_token = client.register_script(self.script)
+
+    def take(self, key, capacity, refill):
+        allowed, wait = self.take_token(keys=[self.prefix + key], args=[capacity, refill])
+        return bool(allowed), float(wait)
+
+
+class LocalBuckets:
+    # Buckets kept before the ones that have filled up again are dropped
+    max_buckets = 10000
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # key -> (tokens, monotonic time of the last update, time it is full again)
+        self.buckets = {}
+
+    def take(self, key, capacity, refill):
+        now = time.monotonic()
+        with self.lock:
+            tokens, at, _ = self.buckets.get(key, (capacity, now, now))
+            tokens = min(capacity, tokens + (now - at) * refill)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self.buckets[key] = (tokens, now, now + (capacity - tokens) / refill)
+            if len(self.buckets) > self.max_buckets:
+                self.buckets = {k: v for k, v in self.buckets.items() if v[2] > now}
+        return allowed, 0.0 if allowed else (1 - tokens) / refill
+
+
+@lru_cache(maxsize=None)
+def get_buckets():
+    client = get_redis()
+    return RedisBuckets(client) if client is not None else LocalBuckets()
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """DRF throttle (REST_FRAMEWORK['DEFAULT_THROTTLE_CLASSES']) over the buckets above"""
+
+    def get_scope(self, request, view):
+        scopes = getattr(view, 'throttle_scopes', {})
+        scope = scopes.get(getattr(view, 'action', None))
+        if scope:
+            return scope
+        return READ if request.method in ('GET', 'HEAD', 'OPTIONS') else WRITE
+
+    def get_client(self, request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return f'user:{user.pk}'
+        return f'ip:{self.get_ident(request)}'
+
+    def allow_request(self, request, view):
+        config = settings.THROTTLE
+        self.wait_seconds = None
+        if not config['ENABLED']:
+            return True
+        scope = self.get_scope(request, view)
+        rate = config['RATES'].get(scope)
+        if not rate:
+            return True
+
+        capacity, refill = parse_rate(rate)
+        try:
+            allowed, wait = get_buckets().take(f'{scope}:{self.get_client(request)}', capacity, refill)
+        except Exception:
+            logger.exception("Token bucket check failed, letting the request through")
+            return True
+        if not allowed:
+            self.wait_seconds = wait
+        return allowed
+
+    def wait(self):
+        # Whole seconds for Retry-After, never 0
+        return max(1, math.ceil(self.wait_seconds)) if self.wait_seconds is not None else None
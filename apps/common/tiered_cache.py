@@ -0,0 +1,118 @@
+"""
+Two-tier cache of versioned payloads: a bounded in-process LRU in front of
+the shared Django cache (Redis when REDIS_URL is set).
+
+Entries are stored under a key with the version they were built from (for
+model payloads, the row's ``updated_at``) and are only returned to a reader
+asking for that same version. A process therefore never serves a payload
+older than the row, even when another process changed it and the local LRU
+still holds the previous copy; ``discard()`` after a write only frees the
+memory early.
+
+Payloads are kept as JSON bytes, so every hit returns a fresh copy that
+the caller may modify, and the LRU's memory use is simply the size of its
+entries. Prometheus gets the hits and misses of each tier (the shared tier
+is only asked on a local miss) and the size of the LRUs:
+
+    tiered_cache_requests_total{cache, tier="local"|"shared", result="hit"|"miss"}
+    tiered_cache_entries{cache}, tiered_cache_bytes{cache}  (summed over workers)
+"""
+import json
+import threading
+from collections import OrderedDict
+
+from django.core.cache import cache as shared_cache
+from rest_framework.utils.encoders import JSONEncoder
+
+from .metrics import CACHE_REQUESTS, CACHE_ENTRIES, CACHE_BYTES
+
+
+LOCAL = 'local'
+SHARED = 'shared'
+
+
+class TieredCache:
+    def __init__(self, name, max_entries, timeout):
+        self.name = name
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        # key -> (version, payload bytes), least recently used first
+        self.entries = OrderedDict()
+        self.size = 0
+
+    def shared_key(self, key):
+        return f'{self.name}:{key}'
+
+    def _count(self, tier, result):
+        CACHE_REQUESTS.labels(self.name, tier, result).inc()
+
+    def _gauges(self):
+        CACHE_ENTRIES.labels(self.name).set(len(self.entries))
+        CACHE_BYTES.labels(self.name).set(self.size)
+
+    def _remember(self, key, version, payload):
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= len(previous[1])
+            self.entries[key] = (version, payload)
+            self.size += len(payload)
+            while len(self.entries) > self.max_entries:
+                _, (_, evicted) = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+            self._gauges()
+
+    def get(self, key, version):
+        """The payload cached for this version of key, or None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] == version:
+                self.entries.move_to_end(key)
+                payload = entry[1]
+            else:
+                payload = None
+        if payload is not None:
+            self._count(LOCAL, 'hit')
+            return json.loads(payload)
+        self._count(LOCAL, 'miss')
+
+        entry = shared_cache.get(self.shared_key(key))
+        if entry is None or entry[0] != version:
+            self._count(SHARED, 'miss')
+            return None
+        self._count(SHARED, 'hit')
+        self._remember(key, version, entry[1])
+        return json.loads(entry[1])
+
+    def set(self, key, version, value):
+        payload = json.dumps(value, cls=JSONEncoder, separators=(',', ':')).encode()
+        shared_cache.set(self.shared_key(key), (version, payload), self.timeout)
+        self._remember(key, version, payload)
+
+    def get_or_set(self, key, version, build):
+        value = self.get(key, version)
+        if value is None:
+            value = build()
+            self.set(key, version, value)
+        return value
+
+    def discard(self, key):
+        """Drop key from both tiers (other processes drop theirs once the version changes)"""
+        shared_cache.delete(self.shared_key(key))
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                self.size -= len(entry[1])
+            self._gauges()
+
+    def clear(self):
+        """Empty this process's LRU"""
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+            self._gauges()
+
+    def stats(self):
+        with self.lock:
+            return {'entries': len(self.entries), 'bytes': self.size, 'max_entries': self.max_entries}
@@ -1,27 +1,84 @@
 from django.contrib import admin
-from .models import Incident, IncidentAttachment
+
+from apps.common.admin_jobs import background_action
+from apps.common.pagination import EstimatedCountPaginator
+from .admin_actions import DeactivateIncidents, DeleteIncidents, ExportIncidents
+from .models import (
+    Incident,
+    IncidentAttachment,
+    ArchivedIncident,
+    Facility,
+    Department,
+    Site,
+    SafetyContact,
+    IncidentNotification,
+    normalize_name
+)
 
 # Register your models here.
 
 
 
+class LocationListFilter(admin.RelatedFieldListFilter):
+    """Facility / department / site filter with the cached option list"""
+    
+    def field_choices(self, field, request, model_admin):
+        return field.related_model.objects.choices()
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """
+    Changelist of a table too large to count on every page load: the
+    paginator uses the planner's estimate (apps.common.pagination) and the
+    "N total" link, another full COUNT(*), is left out.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+
+@admin.register(Facility, Department, Site)
+class LocationAdmin(admin.ModelAdmin):
+    list_display = ['name', 'key']
+    search_fields = ['name']
+    readonly_fields = ['key']
+    
+    def save_model(self, request, obj, form, change):
+        obj.name, obj.key = normalize_name(obj.name)
+        super().save_model(request, obj, form, change)
+
+
 @admin.register(Incident)
-class IncidentAdmin(admin.ModelAdmin):
+class IncidentAdmin(LargeTableAdmin):
     list_display = [
         'incident_number', 'incident_title', 'category', 
         'date_of_incident', 'facility', 'injury_damage_type', 
         'reported_by_name', 'reporting_date'
     ]
+    # facility is nullable, which the default select_related() skips
+    list_select_related = ['facility']
     list_filter = [
         'category', 'sub_category', 'injury_damage_type', 
-        'facility', 'reported_by_type', 'date_of_incident'
+        ('facility', LocationListFilter), 'reported_by_type', 'date_of_incident'
+    ]
+    autocomplete_fields = ['facility', 'department', 'site']
+    # Large selections would time out inside the request
+    actions = [
+        background_action(DeactivateIncidents),
+        background_action(DeleteIncidents),
+        background_action(ExportIncidents),
     ]
     search_fields = [
-        'incident_title', 'description', 'facility', 
-        'department', 'reported_by_name'
+        'incident_number', 'incident_title', 'description', 'facility__name', 
+        'department__name', 'reported_by_name'
     ]
     readonly_fields = ['id', 'created_at', 'updated_at', 'incident_number']
     
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        # Replaced by the background DeleteIncidents
+        actions.pop('delete_selected', None)
+        return actions
+    
     fieldsets = (
         ('Basic Information', {
             'fields': (
@@ -54,12 +111,48 @@ class IncidentAdmin(admin.ModelAdmin):
     )
 
 @admin.register(IncidentAttachment)
-class IncidentAttachmentAdmin(admin.ModelAdmin):
+class IncidentAttachmentAdmin(LargeTableAdmin):
     list_display = [
         'filename', 'incident', 'attachment_type', 
         'file_size', 'uploaded_at'
     ]
+    list_select_related = ['incident']
+    autocomplete_fields = ['incident']
     list_filter = ['attachment_type', 'uploaded_at']
     search_fields = ['filename', 'incident__incident_title', 'description']
     readonly_fields = ['id', 'filename', 'file_size', 'uploaded_at']
 
+
+@admin.register(ArchivedIncident)
+class ArchivedIncidentAdmin(LargeTableAdmin):
+    list_display = [
+        'incident_number', 'incident_title', 'category',
+        'date_of_incident', 'facility', 'attachment_count', 'archived_at'
+    ]
+    list_select_related = ['facility']
+    list_filter = ['category', 'injury_damage_type', 'archived_at']
+    search_fields = ['incident_title', 'facility__name', 'reported_by_name']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(SafetyContact)
+class SafetyContactAdmin(admin.ModelAdmin):
+    list_display = ['name', 'email', 'facility', 'is_active']
+    list_filter = ['is_active']
+    search_fields = ['name', 'email', 'facility__name']
+    autocomplete_fields = ['facility']
+
+
+@admin.register(IncidentNotification)
+class IncidentNotificationAdmin(admin.ModelAdmin):
+    list_display = ['incident', 'queued_at', 'sent_at']
+    list_select_related = ['incident']
+    readonly_fields = ['incident', 'queued_at', 'sent_at']
+    
+    def has_add_permission(self, request):
+        return False
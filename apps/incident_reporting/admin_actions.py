@@ -0,0 +1,76 @@
+"""
+Bulk incident admin actions, run in the background by apps.common.admin_jobs.
+
+Each chunk does in bulk what saving or deleting incidents one by one would
+have done through signals.py: deactivation bumps updated_at for delta sync
+and publishes the live feed updates once the chunk commits; deletion goes
+through the ORM so tombstones, notification rows and attachment files are
+cleaned up as for a single delete.
+"""
+import csv
+import os
+import tempfile
+
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from apps.common.admin_jobs import BackgroundAction
+from .events import INCIDENT_UPDATED
+from .importer import IMPORT_FIELDS
+from .signals import publish_incidents
+
+
+class DeactivateIncidents(BackgroundAction):
+    description = "Deactivate selected incidents"
+    permissions = ['change']
+
+    def process(self, job, queryset):
+        ids = list(queryset.filter(is_active=True).values_list('pk', flat=True))
+        # update() skips auto_now
+        queryset.filter(pk__in=ids).update(is_active=False, updated_at=timezone.now())
+        transaction.on_commit(lambda: publish_incidents(ids, INCIDENT_UPDATED))
+
+
+class DeleteIncidents(BackgroundAction):
+    description = "Delete selected incidents with their attachments"
+    permissions = ['delete']
+
+    def process(self, job, queryset):
+        queryset.delete()
+
+
+class ExportIncidents(BackgroundAction):
+    """
+    CSV of the selection in the import_incidents format. The file is built
+    in the worker and attached to the job when every chunk is written.
+    """
+    description = "Export selected incidents to CSV"
+    permissions = ['view']
+    columns = ['incident_number'] + IMPORT_FIELDS
+    # The partial file lives in the worker that died
+    resumable = False
+
+    def start(self, job):
+        self.file = tempfile.NamedTemporaryFile('w+', newline='', suffix='.csv', delete=False)
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(self.columns)
+
+    def process(self, job, queryset):
+        rows = queryset.select_related('facility', 'department', 'site').order_by('pk')
+        for incident in rows:
+            self.writer.writerow([
+                '' if getattr(incident, column) is None else getattr(incident, column)
+                for column in self.columns
+            ])
+
+    def finish(self, job):
+        self.file.seek(0)
+        job.result.save(f'incidents-{job.pk}.csv', File(self.file), save=False)
+        self.abort(job)
+
+    def abort(self, job):
+        if getattr(self, 'file', None) is not None:
+            self.file.close()
+            os.unlink(self.file.name)
+            self.file = None
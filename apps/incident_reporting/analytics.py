@@ -0,0 +1,104 @@
+"""
+Ad-hoc incident analytics (``GET incidents/analytics/``).
+
+A date range, a bucket size and up to two dimensions compile into a single
+aggregate query:
+
+    SELECT trunc(date_of_incident), <dimensions>, COUNT(*)
+    FROM incident ... WHERE <list filters> AND date_of_incident BETWEEN ...
+    GROUP BY 1, 2, 3 ORDER BY 1, 2, 3
+
+The rows come back as column arrays (one list per column, the same length),
+which chart libraries take directly and which stay compact as JSON.
+Facilities and departments are grouped by name through a join on their
+lookup tables, so names don't cost a second query.
+
+Identical requests arriving together share one computation (``flight``,
+see apps.common.single_flight).
+"""
+from datetime import date, timedelta
+
+from django.db.models import Count, DateField
+from django.db.models.functions import Trunc
+
+from apps.common.single_flight import SingleFlight
+
+
+flight = SingleFlight('analytics', 'AGGREGATE_CACHE')
+
+BUCKETS = ['day', 'week', 'month', 'quarter']
+
+# Query parameter -> grouped column
+DIMENSIONS = {
+    'category': 'category',
+    'sub_category': 'sub_category',
+    'facility': 'facility__name',
+    'department': 'department__name',
+    'injury_damage_type': 'injury_damage_type',
+    'waste_type': 'waste_type',
+    'reported_by_type': 'reported_by_type',
+}
+
+MAX_DIMENSIONS = 2
+MAX_BUCKETS = 1000
+
+
+def bucket_start(day, bucket):
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    if bucket == 'quarter':
+        return date(day.year, (day.month - 1) // 3 * 3 + 1, 1)
+    return day
+
+
+def next_bucket(start, bucket):
+    if bucket == 'day':
+        return start + timedelta(days=1)
+    if bucket == 'week':
+        return start + timedelta(days=7)
+    months = 1 if bucket == 'month' else 3
+    month = start.month - 1 + months
+    return date(start.year + month // 12, month % 12 + 1, 1)
+
+
+def bucket_count(date_from, date_to, bucket):
+    """len(buckets(...)) without building the list, to reject huge ranges cheaply"""
+    first, last = bucket_start(date_from, bucket), bucket_start(date_to, bucket)
+    if bucket == 'day':
+        return (last - first).days + 1
+    if bucket == 'week':
+        return (last - first).days // 7 + 1
+    months = (last.year - first.year) * 12 + last.month - first.month
+    return months // (1 if bucket == 'month' else 3) + 1
+
+
+def buckets(date_from, date_to, bucket):
+    """Start of every bucket overlapping the range, so charts can show empty ones"""
+    starts = []
+    start = bucket_start(date_from, bucket)
+    while start <= date_to:
+        starts.append(start)
+        start = next_bucket(start, bucket)
+    return starts
+
+
+def aggregate(queryset, date_from, date_to, bucket, dimensions):
+    """Incident counts per bucket and dimension values, as column arrays"""
+    columns = [DIMENSIONS[dimension] for dimension in dimensions]
+    rows = (
+        queryset.filter(date_of_incident__gte=date_from, date_of_incident__lte=date_to)
+        .annotate(bucket=Trunc('date_of_incident', bucket, output_field=DateField()))
+        .order_by()
+        .values_list('bucket', *columns)
+        .annotate(count=Count('id'))
+        .order_by('bucket', *columns)
+    )
+    result = {'bucket': [], **{dimension: [] for dimension in dimensions}, 'count': []}
+    for row in rows:
+        result['bucket'].append(row[0])
+        for dimension, value in zip(dimensions, row[1:-1]):
+            result[dimension].append(value)
+        result['count'].append(row[-1])
+    return result
@@ -5,3 +5,6 @@ class IncidentReportingConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.incident_reporting"
     verbose_name = 'Incident Management'
+
+    def ready(self):
+        from . import signals  # noqa: F401
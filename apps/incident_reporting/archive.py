@@ -0,0 +1,104 @@
+"""
+Hot/cold archival of incidents.
+
+Incidents that happened longer ago than INCIDENT_ARCHIVE['AFTER_DAYS'], or
+were deactivated more than INCIDENT_ARCHIVE['INACTIVE_AFTER_DAYS'] ago, are
+moved out of the live table into ArchivedIncident together with their
+attachment metadata, so the live table and its indexes only hold the
+incidents people work with. Each chunk is copied and deleted in its own
+transaction; the job (tasks.archive_incidents) can be stopped at any point
+and picks up where it left off on the next run.
+
+Archived incidents stay readable: ``retrieve`` falls back to the archive and
+the list endpoint merges them in with ``?include_archived=true``.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import duplicates
+from .events import publish_event, INCIDENTS_ARCHIVED
+from .models import (
+    Incident, IncidentAttachment, IncidentNotification, IncidentTombstone, ArchivedIncident
+)
+
+
+SHARED_FIELDS = [field.attname for field in Incident._meta.concrete_fields]
+
+
+def archivable(now=None):
+    """Live incidents that fall outside the retention policy"""
+    now = now or timezone.now()
+    policy = settings.INCIDENT_ARCHIVE
+    return Incident.objects.filter(
+        Q(date_of_incident__lt=(now - timedelta(days=policy['AFTER_DAYS'])).date())
+        | Q(is_active=False, updated_at__lt=now - timedelta(days=policy['INACTIVE_AFTER_DAYS']))
+    )
+
+
+def attachment_metadata(attachment):
+    return {
+        'id': str(attachment.id),
+        'file': attachment.file.name,
+        'filename': attachment.filename,
+        'file_size': attachment.file_size,
+        'attachment_type': attachment.attachment_type,
+        'description': attachment.description,
+        'uploaded_at': attachment.uploaded_at.isoformat(),
+    }
+
+
+def archive_chunk(chunk_size, now=None):
+    """
+    Move one chunk of archivable incidents to the archive in a single
+    transaction. Returns the number of incidents moved.
+    """
+    with transaction.atomic():
+        # skip_locked lets two workers archive side by side without blocking
+        ids = list(
+            archivable(now).order_by().select_for_update(skip_locked=True)
+            .values_list('pk', flat=True)[:chunk_size]
+        )
+        if not ids:
+            return 0
+
+        incidents = Incident.objects.filter(pk__in=ids).order_by().prefetch_related('attachments')
+        archived = []
+        for incident in incidents:
+            attachments = [attachment_metadata(a) for a in incident.attachments.all()]
+            archived.append(ArchivedIncident(
+                **{name: getattr(incident, name) for name in SHARED_FIELDS},
+                attachments=attachments,
+                attachment_count=len(attachments),
+            ))
+        ArchivedIncident.objects.bulk_create(archived)
+
+        # Raw deletes: the rows were copied above, and per-row delete signals
+        # would flood the live feed with one event per archived incident
+        IncidentAttachment.objects.filter(incident_id__in=ids)._raw_delete(IncidentAttachment.objects.db)
+        IncidentNotification.objects.filter(incident_id__in=ids)._raw_delete(IncidentNotification.objects.db)
+        duplicates.remove(ids)
+        Incident.objects.filter(pk__in=ids)._raw_delete(Incident.objects.db)
+        # Archived incidents leave the live list, so sync clients drop them too
+        IncidentTombstone.objects.bulk_create([IncidentTombstone(incident_id=pk) for pk in ids])
+
+        data = {'ids': [str(pk) for pk in ids]}
+        transaction.on_commit(lambda: publish_event(INCIDENTS_ARCHIVED, data))
+    return len(ids)
+
+
+def archive_incidents(chunk_size=None, limit=None, now=None):
+    """Archive everything the policy selects, chunk by chunk. Returns the total moved."""
+    chunk_size = chunk_size or settings.INCIDENT_ARCHIVE['CHUNK_SIZE']
+    now = now or timezone.now()
+    total = 0
+    while limit is None or total < limit:
+        size = chunk_size if limit is None else min(chunk_size, limit - total)
+        moved = archive_chunk(size, now=now)
+        if not moved:
+            break
+        total += moved
+    return total
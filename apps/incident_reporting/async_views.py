@@ -0,0 +1,280 @@
+"""
+Async-native read endpoints for Incidents.
+
+These mirror the read actions of ``IncidentViewSet`` (list, retrieve,
+attachments and dashboard_stats) but talk to the database through Django's
+async ORM, so under an ASGI server (``coreAPI.asgi``) a request waiting on
+the database does not hold a worker thread.
+
+Filtering, search, ordering, pagination and throttling are delegated to
+the viewset's own configuration, so both flavours accept the same query
+parameters, return the same payloads and share the clients' token buckets.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import Throttled
+from rest_framework.request import Request
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .events import broker, STATS
+from .models import Incident, ArchivedIncident, Facility
+from .stats import (
+    trend_months,
+    window_start,
+    facility_counts,
+    total_aggregates,
+    window_aggregates,
+    dashboard_payload
+)
+from .serializers import (
+    IncidentListSerializer,
+    IncidentDetailSerializer,
+    IncidentAttachmentSerializer,
+    ArchivedIncidentDetailSerializer
+)
+from .views import IncidentViewSet
+
+
+def _json(data, status=200):
+    return JsonResponse(data, status=status, encoder=JSONEncoder, safe=False)
+
+
+def _viewset(request, action, **kwargs):
+    """Build an IncidentViewSet instance to reuse its filter/pagination setup"""
+    drf_request = Request(request)
+    view = IncidentViewSet(
+        request=drf_request, action=action, format_kwarg=None, kwargs=kwargs
+    )
+    return view, drf_request
+
+
+async def _throttled(view, drf_request):
+    """
+    The 429 response DRF would give when the viewset's throttles refuse the
+    request (these views don't go through its dispatch), or None
+    """
+    try:
+        await sync_to_async(view.check_throttles)(drf_request)
+    except Throttled as exc:
+        response = _json({'detail': exc.detail}, status=exc.status_code)
+        if exc.wait is not None:
+            response['Retry-After'] = '%d' % exc.wait
+        return response
+    return None
+
+
+async def _get_incident(view, pk):
+    try:
+        return await view.get_queryset().aget(pk=pk)
+    except Incident.DoesNotExist:
+        raise Http404("No Incident matches the given query.")
+
+
+def _page_links(request, paginator, page_number, page_size, count):
+    url = request.build_absolute_uri()
+    param = paginator.page_query_param
+
+    next_link = None
+    if page_number * page_size < count:
+        next_link = replace_query_param(url, param, page_number + 1)
+
+    previous_link = None
+    if page_number > 1:
+        if page_number == 2:
+            previous_link = remove_query_param(url, param)
+        else:
+            previous_link = replace_query_param(url, param, page_number - 1)
+
+    return next_link, previous_link
+
+
+@require_GET
+async def incident_list(request):
+    """
+    GET /api/async/incidents/
+    Async version of IncidentViewSet.list
+    """
+    view, drf_request = _viewset(request, 'list')
+    throttled = await _throttled(view, drf_request)
+    if throttled:
+        return throttled
+    queryset = view.filter_queryset(view.get_queryset())
+    paginator = view.paginator
+    page_size = paginator.get_page_size(drf_request) if paginator else None
+
+    if not page_size:
+        incidents = [incident async for incident in queryset]
+        serializer = IncidentListSerializer(
+            incidents, many=True, context={'request': drf_request}
+        )
+        return _json({'count': len(incidents), 'results': serializer.data})
+
+    try:
+        page_number = int(drf_request.query_params.get(paginator.page_query_param, 1))
+    except (TypeError, ValueError):
+        page_number = 0
+
+    count = await queryset.acount()
+    last_page = max(1, -(-count // page_size))
+    if page_number < 1 or page_number > last_page:
+        return _json({'detail': 'Invalid page.'}, status=404)
+
+    offset = (page_number - 1) * page_size
+    incidents = [incident async for incident in queryset[offset:offset + page_size]]
+    serializer = IncidentListSerializer(
+        incidents, many=True, context={'request': drf_request}
+    )
+    next_link, previous_link = _page_links(
+        drf_request, paginator, page_number, page_size, count
+    )
+    return _json({
+        'count': count,
+        'next': next_link,
+        'previous': previous_link,
+        'results': serializer.data
+    })
+
+
+@require_GET
+async def incident_detail(request, pk):
+    """
+    GET /api/async/incidents/{id}/
+    Async version of IncidentViewSet.retrieve
+    """
+    view, drf_request = _viewset(request, 'retrieve', pk=pk)
+    throttled = await _throttled(view, drf_request)
+    if throttled:
+        return throttled
+    try:
+        incident = await _get_incident(view, pk)
+    except Http404:
+        archived = await ArchivedIncident.objects.select_related(
+            'facility', 'department', 'site'
+        ).filter(pk=pk).afirst()
+        if archived is None:
+            raise
+        serializer = ArchivedIncidentDetailSerializer(archived, context={'request': drf_request})
+        return _json(serializer.data)
+    serializer = IncidentDetailSerializer(incident, context={'request': drf_request})
+    return _json(serializer.data)
+
+
+@require_GET
+async def incident_attachments(request, pk):
+    """
+    GET /api/async/incidents/{id}/attachments/
+    Async version of IncidentViewSet.attachments
+    """
+    view, drf_request = _viewset(request, 'attachments', pk=pk)
+    throttled = await _throttled(view, drf_request)
+    if throttled:
+        return throttled
+    incident = await _get_incident(view, pk)
+    attachments = [attachment async for attachment in incident.attachments.all()]
+    serializer = IncidentAttachmentSerializer(
+        attachments, many=True, context={'request': drf_request}
+    )
+    return _json({
+        'count': len(attachments),
+        'attachments': serializer.data
+    })
+
+
+@require_GET
+async def dashboard_stats(request):
+    """
+    GET /api/async/incidents/dashboard_stats/
+    Async version of IncidentViewSet.dashboard_stats
+
+    """
+    view, drf_request = _viewset(request, 'dashboard_stats')
+    throttled = await _throttled(view, drf_request)
+    if throttled:
+        return throttled
+    today = timezone.now().date()
+    months = trend_months(today)
+    active = Incident.objects.filter(is_active=True)
+
+    counts = await active.order_by().aaggregate(**total_aggregates())
+    counts.update(
+        await active.filter(date_of_incident__gte=window_start(today, months))
+        .order_by().aaggregate(**window_aggregates(today, months))
+    )
+
+    rows = [row async for row in facility_counts(active)]
+    names = {
+        pk: name async for pk, name in
+        Facility.objects.filter(pk__in=[pk for pk, _ in rows]).values_list('id', 'name')
+    }
+    by_facility = {names.get(pk, ''): count for pk, count in rows}
+
+    recent_incidents = [
+        incident async for incident in
+        active.select_related('facility', 'department').prefetch_related('attachments')[:10]
+    ]
+    recent_serializer = IncidentListSerializer(
+        recent_incidents, many=True, context={'request': drf_request}
+    )
+
+    return _json(dashboard_payload(counts, months, by_facility, recent_serializer.data))
+
+
+def _sse(event_type, payload, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event_type}')
+    lines.append(f'data: {payload}')
+    return '\n'.join(lines) + '\n\n'
+
+
+async def _event_stream(subscriber):
+    heartbeat = settings.LIVE_FEED['HEARTBEAT_SECONDS']
+    try:
+        yield _sse(STATS, JSONEncoder().encode(broker.stats))
+        while not subscriber.lagging:
+            try:
+                event_id, (event_type, payload) = await asyncio.wait_for(
+                    subscriber.queue.get(), timeout=heartbeat
+                )
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            yield _sse(event_type, payload, event_id)
+    finally:
+        broker.unsubscribe(subscriber)
+
+
+@require_GET
+async def incident_events(request):
+    """
+    GET /api/async/incidents/events/
+    Server-Sent Events stream replacing dashboard polling.
+
+    Sends a `stats` snapshot on connect, then `incident.created`,
+    `incident.updated`, `incident.deleted` and `stats.delta` events.
+    Needs an ASGI server: a WSGI worker would read the endless stream to
+    its end and never get its thread back, so it refuses the request.
+    Every viewer in a process shares one upstream subscription (see
+    events.EventBroker).
+    """
+    if not isinstance(request, ASGIRequest):
+        return _json({'detail': 'The live feed is only served under ASGI.'}, status=501)
+    view, drf_request = _viewset(request, 'events')
+    throttled = await _throttled(view, drf_request)
+    if throttled:
+        return throttled
+    subscriber = await broker.subscribe()
+    response = StreamingHttpResponse(
+        _event_stream(subscriber), content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'  # don't let nginx buffer the stream
+    return response
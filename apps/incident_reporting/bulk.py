@@ -0,0 +1,149 @@
+"""
+Bulk update and delete of incidents (``PATCH`` / ``DELETE incidents/bulk/``).
+
+A request selects incidents by ``ids`` or by a ``filter`` (the list endpoint's
+query parameters, e.g. ``{"facility": "North Plant", "category": "NEAR_MISS"}``)
+and, for PATCH, gives the ``changes`` once. The changes are validated a
+single time, then applied to INCIDENT_BULK['CHUNK_SIZE'] incidents per
+transaction:
+
+* updates are one ``UPDATE ... WHERE id IN (...)`` per chunk, which also
+  rewrites the date in the stored incident numbers when date_of_incident
+  changes;
+* deletes are raw DELETEs of the chunk's attachments, notifications and
+  incidents, as in archive.py.
+
+QuerySet.update() and raw deletes skip save() and the signals, so what they
+would have done is done here per chunk: updated_at and incident_number are
+set explicitly, changed descriptions are re-indexed for duplicate detection
+(duplicates.py), incidents that become severe are queued for notification,
+deletions leave sync tombstones and attachment files are removed after
+commit, and the live feed gets the changes once the chunk commits.
+"""
+import uuid
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Value
+from django.db.models.functions import Concat, Substr
+from django.utils import timezone
+from rest_framework import serializers
+
+from . import duplicates
+from .events import publish_event, INCIDENT_UPDATED, INCIDENTS_DELETED
+from .filters import IncidentFilter
+from .models import (
+    Department, Facility, Incident, IncidentAttachment, IncidentNotification, IncidentTombstone, Site,
+    format_incident_number
+)
+from .signals import publish_incidents, schedule_file_deletion, schedule_notifications
+
+
+UPDATED = 'updated'
+DELETED = 'deleted'
+NOT_FOUND = 'not_found'
+
+
+def _chunks(values):
+    size = settings.INCIDENT_BULK['CHUNK_SIZE']
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def select(ids=None, filter=None):
+    """
+    Primary keys of the selected incidents. Requested ids are returned as
+    they are: each chunk finds out which of them exist while locking them.
+    Raises ValidationError for an invalid or too broad filter.
+    """
+    limit = settings.INCIDENT_BULK['MAX_OBJECTS']
+    if ids is not None:
+        return list(dict.fromkeys(ids))
+
+    filterset = IncidentFilter(data=filter, queryset=Incident.objects.all())
+    if not filterset.is_valid():
+        raise serializers.ValidationError({'filter': filterset.errors})
+    selected = list(filterset.qs.order_by('pk').values_list('pk', flat=True)[:limit + 1])
+    if len(selected) > limit:
+        raise serializers.ValidationError({
+            'filter': [f"The filter matches more than {limit} incidents, narrow it down."]
+        })
+    return selected
+
+
+def update(ids, changes, now=None):
+    """
+    Apply validated changes (field -> value, locations by name) to the
+    incidents. Returns the ids updated.
+    """
+    now = now or timezone.now()
+    # Validation leaves location names as text, look up (or create) their rows now
+    changes = dict(changes)
+    for field, model in [('facility', Facility), ('department', Department), ('site', Site)]:
+        if field in changes:
+            changes[field] = model.objects.for_name(changes[field])
+    severe_types = settings.INCIDENT_NOTIFICATIONS['SEVERE_INJURY_TYPES']
+    severe = changes.get('injury_damage_type') in severe_types
+    extra = {}
+    if 'date_of_incident' in changes:
+        # Only the date part of INC-YYYYMMDD-XXXXXXXX changes, the id suffix stays
+        prefix = format_incident_number(uuid.UUID(int=0), changes['date_of_incident']).rsplit('-', 1)[0] + '-'
+        extra['incident_number'] = Concat(Value(prefix), Substr('incident_number', len(prefix) + 1))
+    updated = []
+    for chunk in _chunks(ids):
+        with transaction.atomic():
+            rows = list(
+                Incident.objects.select_for_update().filter(pk__in=chunk).order_by()
+                .values_list('pk', 'injury_damage_type')
+            )
+            chunk_ids = [pk for pk, _ in rows]
+            # As for single saves (notifications.became_severe), only incidents
+            # that weren't severe before are e-mailed
+            became_severe = [pk for pk, injury_damage_type in rows if injury_damage_type not in severe_types]
+            Incident.objects.filter(pk__in=chunk_ids).update(**changes, **extra, updated_at=now)
+            if 'description' in changes:
+                duplicates.index_incidents(
+                    Incident.objects.filter(pk__in=chunk_ids).values('id', 'incident_title', 'description')
+                )
+
+            if severe and became_severe:
+                IncidentNotification.objects.bulk_create(
+                    [IncidentNotification(incident_id=pk) for pk in became_severe], ignore_conflicts=True
+                )
+                transaction.on_commit(schedule_notifications)
+            transaction.on_commit(lambda chunk_ids=chunk_ids: publish_incidents(chunk_ids, INCIDENT_UPDATED))
+        updated.extend(chunk_ids)
+    return updated
+
+
+def delete(ids):
+    """Delete the incidents with their attachments. Returns the ids deleted."""
+    deleted = []
+    for chunk in _chunks(ids):
+        with transaction.atomic():
+            chunk_ids = list(
+                Incident.objects.select_for_update().filter(pk__in=chunk).order_by()
+                .values_list('pk', flat=True)
+            )
+            if not chunk_ids:
+                continue
+            attachments = IncidentAttachment.objects.filter(incident_id__in=chunk_ids)
+            names = [name for name in attachments.values_list('file', flat=True) if name]
+            attachments._raw_delete(IncidentAttachment.objects.db)
+            IncidentNotification.objects.filter(incident_id__in=chunk_ids)._raw_delete(IncidentNotification.objects.db)
+            duplicates.remove(chunk_ids)
+            Incident.objects.filter(pk__in=chunk_ids)._raw_delete(Incident.objects.db)
+            IncidentTombstone.objects.bulk_create([IncidentTombstone(incident_id=pk) for pk in chunk_ids])
+
+            data = {'ids': [str(pk) for pk in chunk_ids]}
+            transaction.on_commit(lambda data=data: publish_event(INCIDENTS_DELETED, data))
+            if names:
+                transaction.on_commit(lambda names=names: schedule_file_deletion(names))
+        deleted.extend(chunk_ids)
+    return deleted
+
+
+def outcomes(selected, done, status):
+    """Compact per-id result: {id: status or not_found}, in the order selected"""
+    done = set(done)
+    return {str(pk): status if pk in done else NOT_FOUND for pk in selected}
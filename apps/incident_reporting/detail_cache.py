@@ -0,0 +1,64 @@
+"""
+Cache of the serialized incident detail returned by ``retrieve``.
+
+Incidents are mostly read after their first day, yet every view used to run
+IncidentDetailSerializer with its nested attachments again. The payload is
+now kept in a TieredCache (apps.common.tiered_cache): a per-process LRU of
+INCIDENT_DETAIL_CACHE['MAX_ENTRIES'] in front of Redis, versioned by the
+incident's ``updated_at``, which retrieve reads with a single-row query
+before anything else.
+
+Every write that changes the payload moves ``updated_at``: saves (auto_now),
+bulk updates (bulk.py sets it) and attachment uploads and deletes
+(signals.py bumps it), so no process serves an old payload once the write is
+committed. The signals also discard the cached copies right away.
+
+The payload is cached with relative file URLs, which are made absolute for
+each request, so the same entry serves every host name the API is reached
+under. Renamed facilities, departments and sites show up in cached payloads
+once the incident changes or the entry expires (TIMEOUT).
+"""
+from django.conf import settings
+from django.db import transaction
+
+from apps.common.tiered_cache import TieredCache
+
+
+FILE_FIELDS = ('file', 'file_url')
+
+detail_cache = TieredCache(
+    'incident-detail',
+    max_entries=settings.INCIDENT_DETAIL_CACHE['MAX_ENTRIES'],
+    timeout=settings.INCIDENT_DETAIL_CACHE['TIMEOUT'],
+)
+
+
+def is_enabled():
+    return settings.INCIDENT_DETAIL_CACHE['ENABLED']
+
+
+def version(updated_at):
+    return updated_at.isoformat()
+
+
+def absolute_urls(payload, request):
+    for attachment in payload['attachments']:
+        for field in FILE_FIELDS:
+            if attachment.get(field):
+                attachment[field] = request.build_absolute_uri(attachment[field])
+    return payload
+
+
+def get_detail(incident_id, updated_at, build, request):
+    """
+    The detail payload of this version of the incident, serialized by
+    build() (without a request in its context) on a miss
+    """
+    payload = detail_cache.get_or_set(str(incident_id), version(updated_at), build)
+    return absolute_urls(payload, request)
+
+
+def invalidate(incident_id):
+    """Drop the cached detail of an incident once the current transaction commits"""
+    key = str(incident_id)
+    transaction.on_commit(lambda: detail_cache.discard(key))
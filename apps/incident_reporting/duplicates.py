@@ -0,0 +1,191 @@
+"""
+Near-duplicate incident detection with MinHash and locality-sensitive hashing.
+
+Several people often report the same spill or fire with slightly different
+titles and descriptions. Comparing a new report with every recent incident
+doesn't scale, so each incident's text is reduced to a MinHash signature:
+
+* the normalized title and description are cut into character shingles of
+  INCIDENT_DUPLICATES['SHINGLE_SIZE'];
+* the signature is the minimum of BANDS x ROWS hash functions over the
+  shingles; two incidents agree on a signature value with a probability equal
+  to the Jaccard similarity of their shingle sets;
+* the signature is split into BANDS bands of ROWS values and every band is
+  hashed into a bucket, stored as an IncidentSimilarityBucket row.
+
+Incidents sharing at least one (band, bucket) pair are candidates, found
+with an index lookup per band instead of a scan. The most promising
+candidates are then compared exactly on their shingles and those at least
+THRESHOLD similar are returned. With 20 bands of 3 rows, pairs 50% similar
+become candidates 93% of the time and pairs 80% similar practically always,
+while unrelated reports rarely share a bucket.
+
+The buckets are written with the incident (signals.py, bulk.py, importer.py)
+and removed with it (archive.py, bulk.py, cascade). Changing SHINGLE_SIZE,
+BANDS or ROWS needs a rebuild: ``manage.py index_incident_duplicates``.
+"""
+import random
+import re
+import zlib
+from functools import lru_cache, reduce
+from hashlib import blake2b
+from operator import or_
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .models import Incident, IncidentSimilarityBucket
+
+
+# Universal hashing (a * x + b) mod P over the shingles' CRC32 values; the
+# seed is fixed so that stored buckets stay comparable across processes
+_PRIME = (1 << 61) - 1
+_SEED = 20240611
+_NON_WORD = re.compile(r'[\W_]+')
+
+
+def _config():
+    config = settings.INCIDENT_DUPLICATES
+    return config['SHINGLE_SIZE'], config['BANDS'], config['ROWS']
+
+
+@lru_cache(maxsize=8)
+def _permutations(count):
+    rng = random.Random(_SEED)
+    return [(rng.randrange(1, _PRIME), rng.randrange(_PRIME)) for _ in range(count)]
+
+
+def shingles(title, description):
+    """Hashed character shingles of an incident's normalized text"""
+    size = _config()[0]
+    text = _NON_WORD.sub(' ', f'{title or ""} {description or ""}'.casefold()).strip()
+    if len(text) <= size:
+        return frozenset([zlib.crc32(text.encode())]) if text else frozenset()
+    return frozenset(zlib.crc32(text[i:i + size].encode()) for i in range(len(text) - size + 1))
+
+
+def signature(hashed_shingles):
+    """MinHash signature: the minimum of each hash function over the shingles"""
+    _, bands, rows = _config()
+    if not hashed_shingles:
+        return []
+    return [
+        min((a * value + b) % _PRIME for value in hashed_shingles)
+        for a, b in _permutations(bands * rows)
+    ]
+
+
+def band_buckets(minhash):
+    """Bucket of every band of a signature, as signed 64-bit integers"""
+    rows = _config()[2]
+    buckets = []
+    for start in range(0, len(minhash), rows):
+        digest = blake2b(repr(minhash[start:start + rows]).encode(), digest_size=8).digest()
+        buckets.append(int.from_bytes(digest, 'big', signed=True))
+    return buckets
+
+
+@lru_cache(maxsize=256)
+def _cached_buckets(title, description, config):
+    return band_buckets(signature(shingles(title, description)))
+
+
+def _buckets(title, description):
+    # Cached: a new incident is indexed and looked up with the same text
+    return _cached_buckets(title, description, _config())
+
+
+def jaccard(a, b):
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def index_incidents(incidents, replace=True):
+    """
+    Write the buckets of incidents, given as objects or dicts with id,
+    incident_title and description, in the caller's transaction. Pass
+    replace=False for new incidents, which have no buckets yet.
+    """
+    ids = []
+    rows = []
+    for incident in incidents:
+        if isinstance(incident, dict):
+            pk, title, description = incident['id'], incident['incident_title'], incident['description']
+        else:
+            pk, title, description = incident.pk, incident.incident_title, incident.description
+        ids.append(pk)
+        rows.extend(
+            IncidentSimilarityBucket(incident_id=pk, band=band, bucket=bucket)
+            for band, bucket in enumerate(_buckets(title, description))
+        )
+    if replace and ids:
+        remove(ids)
+    IncidentSimilarityBucket.objects.bulk_create(rows)
+    return len(ids)
+
+
+def index_all(batch_size=1000, progress=None):
+    """Rewrite the buckets of every live incident, one transaction per batch"""
+    indexed = 0
+    last = None
+    while True:
+        batch = Incident.objects.order_by('pk').values('id', 'incident_title', 'description')
+        if last is not None:
+            batch = batch.filter(pk__gt=last)
+        batch = list(batch[:batch_size])
+        if not batch:
+            return indexed
+        with transaction.atomic():
+            indexed += index_incidents(batch)
+        last = batch[-1]['id']
+        if progress:
+            progress(indexed)
+
+
+def remove(ids):
+    """Drop the buckets of incidents deleted or archived behind the ORM's back"""
+    buckets = IncidentSimilarityBucket.objects.filter(incident_id__in=ids)
+    buckets._raw_delete(buckets.db)
+
+
+def find_similar(title, description, exclude=None, limit=None):
+    """
+    Live incidents whose text is at least THRESHOLD similar to the given
+    title and description, as [(incident, similarity)], most similar first.
+    """
+    config = settings.INCIDENT_DUPLICATES
+    limit = limit or config['LIMIT']
+    buckets = _buckets(title, description)
+    if not buckets:
+        return []
+
+    # One index range per band; candidates sharing more bands are likelier
+    candidates = (
+        IncidentSimilarityBucket.objects
+        .filter(reduce(or_, (Q(band=band, bucket=bucket) for band, bucket in enumerate(buckets))))
+        .values('incident_id')
+        .annotate(shared=Count('pk'))
+        .order_by('-shared', 'incident_id')
+    )
+    if exclude is not None:
+        candidates = candidates.exclude(incident_id=exclude)
+    candidate_ids = [row['incident_id'] for row in candidates[:config['MAX_CANDIDATES']]]
+    if not candidate_ids:
+        return []
+
+    target = shingles(title, description)
+    scored = []
+    incidents = Incident.objects.filter(pk__in=candidate_ids).select_related('facility', 'department').order_by()
+    for incident in incidents:
+        similarity = jaccard(target, shingles(incident.incident_title, incident.description))
+        if similarity >= config['THRESHOLD']:
+            scored.append((incident, round(similarity, 3)))
+    scored.sort(key=lambda pair: -pair[1])
+    return scored[:limit]
+
+
+def similar_to(incident, limit=None):
+    """find_similar() for a stored incident, leaving the incident itself out"""
+    return find_similar(incident.incident_title, incident.description, exclude=incident.pk, limit=limit)
@@ -0,0 +1,208 @@
+"""
+Live incident feed.
+
+Writes publish small JSON events (incident.created / incident.updated /
+incident.deleted, and incidents.archived / incidents.deleted per archival
+or bulk delete chunk) once their transaction commits. Every process runs a
+single ``EventBroker`` that owns the only upstream subscription - a Redis
+pub/sub channel when REDIS_URL is set, otherwise events published in the
+same process - and fans each event out to the in-memory queue of every
+connected SSE viewer. The broker also recomputes the dashboard counts at
+most once per interval and pushes only the keys that changed, so N open
+dashboards cost one subscription and one stats query per process instead
+of N polling loops.
+
+Without Redis, events only reach streams open in the publishing process,
+so a process that isn't serving any (a WSGI worker, a Celery worker)
+doesn't build them at all.
+"""
+import asyncio
+import itertools
+import json
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from apps.common.redis_client import get_redis, get_async_redis
+from .models import Incident
+
+logger = logging.getLogger(__name__)
+
+
+INCIDENT_CREATED = 'incident.created'
+INCIDENT_UPDATED = 'incident.updated'
+INCIDENT_DELETED = 'incident.deleted'
+INCIDENTS_ARCHIVED = 'incidents.archived'
+INCIDENTS_DELETED = 'incidents.deleted'
+STATS = 'stats'
+STATS_DELTA = 'stats.delta'
+
+
+def has_listeners():
+    """Whether a published event can reach a viewer, see the module docstring"""
+    return get_redis() is not None or broker.is_running
+
+
+def publish_event(event_type, data):
+    """Send an event to every live feed viewer, in all processes when Redis is configured"""
+    if not has_listeners():
+        return
+    message = json.dumps({'type': event_type, 'data': data}, default=str)
+    client = get_redis()
+    if client is not None:
+        try:
+            client.publish(settings.LIVE_FEED['CHANNEL'], message)
+            return
+        except Exception:
+            logger.exception("Could not publish live feed event, delivering locally")
+    broker.dispatch_threadsafe(message)
+
+
+async def stats_snapshot():
+    """Headline dashboard counts, computed with a single aggregate query"""
+    today = timezone.now().date()
+    aggregates = {
+        'total_incidents': Count('id'),
+        'incidents_this_month': Count('id', filter=Q(date_of_incident__gte=today.replace(day=1))),
+        'incidents_this_week': Count(
+            'id', filter=Q(date_of_incident__gte=today - timedelta(days=today.weekday()))
+        ),
+    }
+    for value, _ in Incident.CATEGORY_CHOICES:
+        aggregates[f'by_category.{value}'] = Count('id', filter=Q(category=value))
+    for value, _ in Incident.INJURY_DAMAGE_CHOICES:
+        aggregates[f'by_injury_type.{value}'] = Count('id', filter=Q(injury_damage_type=value))
+
+    return await Incident.objects.filter(is_active=True).order_by().aaggregate(**aggregates)
+
+
+class Subscriber:
+    def __init__(self, maxsize):
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.lagging = False
+
+    def put(self, event_id, message):
+        try:
+            self.queue.put_nowait((event_id, message))
+        except asyncio.QueueFull:
+            # Drop the viewer rather than buffering without bound; the
+            # EventSource reconnects and starts again from a fresh snapshot.
+            self.lagging = True
+
+
+class EventBroker:
+    """Single upstream subscription per process, fanned out to every viewer"""
+
+    def __init__(self):
+        self._subscribers = set()
+        self._loop = None
+        self._tasks = []
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._stats = None
+        self._stats_dirty = True
+        self._stats_date = None
+
+    @property
+    def is_running(self):
+        """Whether this process serves live feed streams (its event loop is up)"""
+        return self._loop is not None and not self._loop.is_closed()
+
+    def dispatch_threadsafe(self, message):
+        """Deliver a message published from any thread of this process"""
+        if self.is_running:
+            self._loop.call_soon_threadsafe(self._dispatch, message)
+
+    def _dispatch(self, message):
+        event = json.loads(message)
+        if event['type'] != STATS_DELTA:
+            self._stats_dirty = True
+        self._broadcast(event['type'], event['data'])
+
+    def _broadcast(self, event_type, data):
+        payload = json.dumps(data, default=str)
+        event_id = next(self._ids)
+        for subscriber in list(self._subscribers):
+            subscriber.put(event_id, (event_type, payload))
+
+    async def subscribe(self):
+        with self._lock:
+            loop = asyncio.get_running_loop()
+            if self._loop is not loop:
+                self._loop = loop
+                self._tasks = [
+                    loop.create_task(self._stats_loop()),
+                ]
+                if get_redis() is not None:
+                    self._tasks.append(loop.create_task(self._redis_loop()))
+
+        subscriber = Subscriber(settings.LIVE_FEED['MAX_QUEUED_EVENTS'])
+        self._subscribers.add(subscriber)
+        try:
+            if self._stats is None:
+                await self._refresh_stats()
+        except BaseException:
+            self.unsubscribe(subscriber)
+            raise
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        self._subscribers.discard(subscriber)
+
+    @property
+    def stats(self):
+        return self._stats
+
+    async def _refresh_stats(self):
+        today = timezone.now().date()
+        snapshot = await stats_snapshot()
+        previous = self._stats
+        self._stats = snapshot
+        self._stats_dirty = False
+        self._stats_date = today
+        if previous is not None:
+            delta = {
+                key: value for key, value in snapshot.items()
+                if previous.get(key) != value
+            }
+            if delta:
+                self._broadcast(STATS_DELTA, delta)
+
+    async def _stats_loop(self):
+        interval = settings.LIVE_FEED['STATS_INTERVAL_SECONDS']
+        while True:
+            await asyncio.sleep(interval)
+            if not self._subscribers:
+                continue
+            if self._stats_dirty or self._stats_date != timezone.now().date():
+                try:
+                    await self._refresh_stats()
+                except Exception:
+                    logger.exception("Live feed stats refresh failed")
+
+    async def _redis_loop(self):
+        backoff = 1
+        while True:
+            client = get_async_redis()
+            try:
+                async with client.pubsub() as pubsub:
+                    await pubsub.subscribe(settings.LIVE_FEED['CHANNEL'])
+                    backoff = 1
+                    async for message in pubsub.listen():
+                        if message['type'] == 'message':
+                            self._dispatch(message['data'])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Live feed Redis subscription lost, retrying in %ss", backoff)
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+            finally:
+                await client.aclose()
+
+
+broker = EventBroker()
@@ -0,0 +1,126 @@
+"""
+Facet counts of the incident list (``GET incidents/?facets=category,facility``).
+
+The filter sidebar shows, for the current search, how many incidents have
+each category, facility, ... value. Each facet's counts are a GROUP BY over
+the filtered list; on PostgreSQL all requested facets share one scan:
+
+    SELECT category, facility, GROUPING(category), GROUPING(facility), COUNT(*)
+    FROM (<filtered list>) AS incidents
+    GROUP BY GROUPING SETS ((category), (facility))
+
+GROUPING() tells which facet a row belongs to, so a NULL value (no facility)
+isn't confused with the other facets' rows. Other databases run one grouped
+query per facet.
+
+Results are cached for INCIDENT_FACETS['CACHE_SECONDS'] under the normalized
+query string, so paging through a search doesn't count it again.
+"""
+import hashlib
+from collections import Counter
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Count, F
+
+# Query parameter -> grouped column
+FACETS = {
+    'category': 'category',
+    'sub_category': 'sub_category',
+    'facility': 'facility__name',
+    'department': 'department__name',
+    'injury_damage_type': 'injury_damage_type',
+    'reported_by_type': 'reported_by_type',
+}
+
+# Parameters that don't change which incidents are counted
+IGNORED_PARAMS = {'page', 'page_size', 'ordering', 'format'}
+
+
+def parse(value):
+    """Facet names of the comma separated ``facets`` parameter, or ValueError"""
+    names = list(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+    unknown = [name for name in names if name not in FACETS]
+    if unknown:
+        raise ValueError(
+            f"Unknown facet(s) {', '.join(unknown)}. Choose from: {', '.join(FACETS)}"
+        )
+    return names
+
+
+def cache_key(query_params, names):
+    """Key of the facet counts of a list request, independent of parameter order and paging"""
+    items = sorted(
+        [
+            (name, value)
+            for name, values in query_params.lists() if name not in IGNORED_PARAMS | {'facets'}
+            for value in values
+        ] + [('facets', ','.join(sorted(names)))]
+    )
+    return 'incident-facets:' + hashlib.sha256(urlencode(items).encode()).hexdigest()
+
+
+def _grouping_sets(querysets, names):
+    columns = {f'facet_{name}': F(FACETS[name]) for name in names}
+    rows = querysets[0].order_by().values(**columns)
+    if len(querysets) > 1:
+        rows = rows.union(*(queryset.order_by().values(**columns) for queryset in querysets[1:]), all=True)
+    sql, params = rows.query.sql_with_params()
+
+    connection = connections[rows.db]
+    quote = connection.ops.quote_name
+    aliases = [quote(alias) for alias in columns]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT {', '.join(aliases)}, "
+            f"{', '.join(f'GROUPING({alias})' for alias in aliases)}, COUNT(*) "
+            f"FROM ({sql}) AS incidents "
+            f"GROUP BY GROUPING SETS ({', '.join(f'({alias})' for alias in aliases)})",
+            params
+        )
+        result = {name: Counter() for name in names}
+        for row in cursor.fetchall():
+            values, grouping, count = row[:len(names)], row[len(names):-1], row[-1]
+            index = grouping.index(0)
+            result[names[index]][values[index]] += count
+    return result
+
+
+def _grouped_queries(querysets, names):
+    result = {name: Counter() for name in names}
+    for name in names:
+        for queryset in querysets:
+            rows = queryset.order_by().values_list(FACETS[name]).annotate(count=Count('pk'))
+            for value, count in rows:
+                result[name][value] += count
+    return result
+
+
+def compute(querysets, names):
+    """
+    Per-value incident counts of each facet, over the union of querysets
+    (already filtered). Values are ordered by count, most frequent first.
+    """
+    if connections[querysets[0].db].vendor == 'postgresql':
+        counts = _grouping_sets(querysets, names)
+    else:
+        counts = _grouped_queries(querysets, names)
+    return {
+        name: [
+            {'value': value, 'count': count}
+            for value, count in sorted(counts[name].items(), key=lambda item: (-item[1], str(item[0])))
+        ]
+        for name in names
+    }
+
+
+def facet_counts(query_params, querysets, names):
+    """compute(), cached by the normalized query string"""
+    key = cache_key(query_params, names)
+    result = cache.get(key)
+    if result is None:
+        result = compute(querysets, names)
+        cache.set(key, result, settings.INCIDENT_FACETS['CACHE_SECONDS'])
+    return result
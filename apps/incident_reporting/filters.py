@@ -0,0 +1,41 @@
+import django_filters
+from django_filters.constants import EMPTY_VALUES
+
+from .models import Incident, incident_number_lookup, normalize_name
+
+
+class LookupNameFilter(django_filters.CharFilter):
+    """Match a Facility / Department / Site by name, ignoring case and spacing"""
+
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+        return qs.filter(**{f'{self.field_name}__key': normalize_name(value)[1]})
+
+
+class IncidentNumberFilter(django_filters.CharFilter):
+    """Exact match on the stored incident number, ignoring case and spacing"""
+
+    def filter(self, qs, value):
+        if value in EMPTY_VALUES:
+            return qs
+        return qs.filter(**incident_number_lookup(value))
+
+
+class IncidentFilter(django_filters.FilterSet):
+    """
+    Query parameters of the incident list. No Meta.model on purpose: the
+    same filters apply to ArchivedIncident for ?include_archived=true.
+    """
+    incident_number = IncidentNumberFilter()
+    category = django_filters.ChoiceFilter(choices=Incident.CATEGORY_CHOICES)
+    sub_category = django_filters.ChoiceFilter(choices=Incident.SUB_CATEGORY_CHOICES)
+    facility = LookupNameFilter()
+    department = LookupNameFilter()
+    injury_damage_type = django_filters.ChoiceFilter(choices=Incident.INJURY_DAMAGE_CHOICES)
+    waste_type = django_filters.ChoiceFilter(choices=Incident.WASTE_TYPE_CHOICES)
+    reported_by_type = django_filters.ChoiceFilter(choices=Incident.REPORTED_BY_CHOICES)
+    is_active = django_filters.BooleanFilter()
+    date_of_incident = django_filters.DateFilter()
+    date_of_incident__gte = django_filters.DateFilter(field_name='date_of_incident', lookup_expr='gte')
+    date_of_incident__lte = django_filters.DateFilter(field_name='date_of_incident', lookup_expr='lte')
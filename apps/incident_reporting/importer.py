@@ -0,0 +1,404 @@
+"""
+Bulk import of historical incidents (used by ``manage.py import_incidents``).
+
+Rows are streamed from CSV or NDJSON and handled in batches:
+
+1. Columnar validation - each batch is pivoted into columns and every column
+   is checked in one pass (choice lookups against precomputed maps that also
+   accept legacy labels like "Near-Miss", length limits, required values,
+   date/time parsing), instead of running a serializer per row.
+2. Loading - on PostgreSQL the valid rows are streamed with
+   ``COPY ... FROM STDIN`` into a temporary staging table and merged with a
+   single ``INSERT ... SELECT ... ON CONFLICT (incident_title) DO UPDATE``
+   (or an UPDATE + INSERT pair when the table is partitioned, as there is no
+   unique index on incident_title to conflict on); other databases use
+   ``bulk_create(update_conflicts=True)``.
+
+Imported incidents are indexed for near-duplicate detection (duplicates.py)
+in the same transaction as their batch. Each batch is committed on its own,
+and the caller can checkpoint after every batch so a long import can be
+resumed.
+"""
+import csv
+import io
+import json
+from datetime import datetime
+
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime, parse_time
+
+from apps.common.ids import uuid7
+
+from . import duplicates, partitioning
+from .models import Incident, Facility, Department, Site, format_incident_number
+
+
+IMPORT_FIELDS = [
+    'incident_title', 'date_of_incident', 'time_of_incident',
+    'facility', 'department', 'site',
+    'category', 'sub_category', 'description',
+    'persons_involved_type', 'persons_involved_details',
+    'injury_damage_type', 'injury_damage_details',
+    'waste_type', 'waste_category_code',
+    'reported_by_type', 'reported_by_name', 'reported_by_contact',
+    'reporting_date', 'is_active',
+]
+
+REQUIRED_FIELDS = {
+    'incident_title', 'date_of_incident', 'time_of_incident', 'category',
+    'description', 'persons_involved_type', 'injury_damage_type',
+    'reported_by_type', 'reported_by_name',
+}
+
+# Set by the importer itself (see assign_ids)
+KEY_FIELDS = ['id', 'incident_number']
+
+# Fields overwritten when an imported title already exists
+UPDATE_FIELDS = (
+    [field for field in IMPORT_FIELDS if field != 'incident_title'] + ['incident_number', 'updated_at']
+)
+
+# Names in these columns are replaced by the id of their lookup row
+LOCATION_MODELS = {'facility': Facility, 'department': Department, 'site': Site}
+
+ATTNAMES = {field: Incident._meta.get_field(field).attname for field in KEY_FIELDS + IMPORT_FIELDS}
+COLUMNS = {
+    field: Incident._meta.get_field(field).column for field in KEY_FIELDS + IMPORT_FIELDS + ['updated_at']
+}
+
+TRUE_VALUES = {'1', 'true', 't', 'yes', 'y'}
+FALSE_VALUES = {'0', 'false', 'f', 'no', 'n'}
+
+
+def _choice_map(choices):
+    """Accept stored values and display labels, case-insensitively"""
+    mapping = {}
+    for value, label in choices:
+        for key in (value, label, label.replace('-', '_').replace(' ', '_')):
+            mapping[key.strip().lower()] = value
+    return mapping
+
+
+CHOICE_MAPS = {
+    field.name: _choice_map(field.choices)
+    for field in Incident._meta.get_fields()
+    if getattr(field, 'choices', None)
+}
+
+MAX_LENGTHS = {
+    name: Incident._meta.get_field(name).max_length
+    for name in IMPORT_FIELDS
+    if getattr(Incident._meta.get_field(name), 'max_length', None)
+}
+
+
+def read_rows(stream, fmt):
+    """Yield dict rows from a CSV or NDJSON text stream"""
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+    else:
+        for line in stream:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def _blank(value):
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+class BatchValidator:
+    def __init__(self, date_format=None):
+        self.date_format = date_format
+
+    def _date(self, value):
+        if self.date_format:
+            return datetime.strptime(value, self.date_format).date()
+        return parse_date(value)
+
+    def validate(self, rows):
+        """
+        Validate a batch. Returns (valid, rejected) where valid is a list of
+        cleaned dicts and rejected a list of (row, [errors]).
+        """
+        # An NDJSON line can hold any JSON value, not only an object
+        malformed = [(row, ['row: not a JSON object']) for row in rows if not isinstance(row, dict)]
+        if malformed:
+            rows = [row for row in rows if isinstance(row, dict)]
+
+        size = len(rows)
+        errors = [[] for _ in range(size)]
+        columns = {
+            field: [
+                None if _blank(row.get(field)) else (
+                    row[field].strip() if isinstance(row[field], str) else row[field]
+                )
+                for row in rows
+            ]
+            for field in IMPORT_FIELDS
+        }
+
+        for field, column in columns.items():
+            for i, value in enumerate(column):
+                if isinstance(value, (dict, list)):
+                    errors[i].append(f'{field}: not a single value')
+
+        for field in REQUIRED_FIELDS:
+            for i, value in enumerate(columns[field]):
+                if value is None:
+                    errors[i].append(f'{field}: required')
+
+        for field, mapping in CHOICE_MAPS.items():
+            column = columns[field]
+            unknown = {str(v).lower() for v in column if v is not None} - mapping.keys()
+            cleaned = []
+            for i, value in enumerate(column):
+                if value is None:
+                    cleaned.append(None)
+                    continue
+                key = str(value).lower()
+                if key in unknown:
+                    errors[i].append(f'{field}: unknown choice {value!r}')
+                cleaned.append(mapping.get(key))
+            columns[field] = cleaned
+
+        for field, max_length in MAX_LENGTHS.items():
+            for i, value in enumerate(columns[field]):
+                if value is not None and len(str(value)) > max_length:
+                    errors[i].append(f'{field}: longer than {max_length} characters')
+
+        columns['date_of_incident'] = self._parse_column(
+            columns['date_of_incident'], self._date, 'date_of_incident', errors
+        )
+        columns['time_of_incident'] = self._parse_column(
+            columns['time_of_incident'], parse_time, 'time_of_incident', errors
+        )
+        columns['reporting_date'] = self._parse_column(
+            columns['reporting_date'], self._reporting_date, 'reporting_date', errors
+        )
+        columns['is_active'] = self._parse_column(
+            columns['is_active'], self._boolean, 'is_active', errors
+        )
+
+        today = timezone.now().date()
+        for i, value in enumerate(columns['date_of_incident']):
+            if value is not None and value > today:
+                errors[i].append('date_of_incident: in the future')
+
+        waste_types = columns['waste_type']
+        waste_codes = columns['waste_category_code']
+        for i in range(size):
+            if waste_types[i] in (None, 'NOT_APPLICABLE'):
+                waste_types[i] = 'NOT_APPLICABLE'
+                waste_codes[i] = None
+            elif waste_codes[i] is None:
+                errors[i].append('waste_category_code: required when waste is involved')
+
+        valid, rejected = [], malformed
+        for i, row in enumerate(rows):
+            if errors[i]:
+                rejected.append((row, errors[i]))
+                continue
+            cleaned = {field: columns[field][i] for field in IMPORT_FIELDS}
+            if cleaned['reporting_date'] is None:
+                cleaned['reporting_date'] = timezone.make_aware(
+                    datetime.combine(cleaned['date_of_incident'], cleaned['time_of_incident'])
+                )
+            if cleaned['is_active'] is None:
+                cleaned['is_active'] = True
+            valid.append(cleaned)
+        return valid, rejected
+
+    def _parse_column(self, column, parser, field, errors):
+        parsed = []
+        for i, value in enumerate(column):
+            if value is None:
+                parsed.append(None)
+                continue
+            try:
+                result = parser(str(value)) if not isinstance(value, bool) else parser(value)
+            except (TypeError, ValueError):
+                result = None
+            if result is None:
+                errors[i].append(f'{field}: invalid value {value!r}')
+            parsed.append(result)
+        return parsed
+
+    def _reporting_date(self, value):
+        result = parse_datetime(value)
+        if result is None:
+            day = self._date(value)
+            result = datetime.combine(day, datetime.min.time()) if day else None
+        if result is not None and timezone.is_naive(result):
+            result = timezone.make_aware(result)
+        return result
+
+    @staticmethod
+    def _boolean(value):
+        if isinstance(value, bool):
+            return value
+        value = value.lower()
+        if value in TRUE_VALUES:
+            return True
+        if value in FALSE_VALUES:
+            return False
+        return None
+
+
+def resolve_locations(rows):
+    """Swap facility / department / site names for lookup ids, one query set per batch"""
+    for field, model in LOCATION_MODELS.items():
+        rows_by_name = model.objects.for_names({row[field] for row in rows if row[field]})
+        for row in rows:
+            row[field] = rows_by_name[row[field]].pk if row[field] in rows_by_name else None
+    return rows
+
+
+def _dedupe_titles(rows):
+    """Last row wins when a batch repeats a title (ON CONFLICT can't touch a row twice)"""
+    by_title = {}
+    for row in rows:
+        by_title[row['incident_title']] = row
+    return list(by_title.values())
+
+
+def assign_ids(rows):
+    """
+    Reuse the id of incidents whose title is already imported (one query per
+    batch) and store the matching incident_number, so a re-import that moves
+    date_of_incident keeps the number consistent with the row it updates.
+    """
+    existing = dict(
+        Incident.objects.filter(incident_title__in=[row['incident_title'] for row in rows])
+        .values_list('incident_title', 'id')
+    )
+    for row in rows:
+        row['id'] = existing.get(row['incident_title']) or uuid7()
+        row['incident_number'] = format_incident_number(row['id'], row['date_of_incident'])
+    return rows
+
+
+class BulkCreateLoader:
+    """Portable loader: bulk_create with an upsert on incident_title"""
+
+    def load(self, rows):
+        now = timezone.now()
+        incidents = [
+            Incident(
+                created_at=now, updated_at=now,
+                **{ATTNAMES[field]: value for field, value in row.items()}
+            )
+            for row in rows
+        ]
+        with transaction.atomic():
+            Incident.objects.bulk_create(
+                incidents,
+                update_conflicts=True,
+                unique_fields=['incident_title'],
+                update_fields=UPDATE_FIELDS,
+            )
+        return len(incidents)
+
+
+class PostgresCopyLoader:
+    """COPY into a temporary staging table, then one INSERT ... ON CONFLICT"""
+
+    def __init__(self):
+        self.table = Incident._meta.db_table
+        self.fields = KEY_FIELDS + IMPORT_FIELDS
+        self.columns = [COLUMNS[field] for field in self.fields] + ['created_at', 'updated_at']
+        self.column_sql = ', '.join(f'"{column}"' for column in self.columns)
+
+    def _copy(self, cursor, rows):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        now = timezone.now().isoformat()
+        for row in rows:
+            writer.writerow(
+                [r'\N' if row[field] is None else self._format(row[field]) for field in self.fields]
+                + [now, now]
+            )
+        buffer.seek(0)
+
+        sql = f'COPY incident_import_staging ({self.column_sql}) FROM STDIN WITH (FORMAT csv, NULL \'\\N\')'
+        raw_cursor = cursor.cursor
+        if hasattr(raw_cursor, 'copy_expert'):  # psycopg2
+            raw_cursor.copy_expert(sql, buffer)
+        else:  # psycopg 3
+            with raw_cursor.copy(sql) as copy:
+                copy.write(buffer.getvalue())
+
+    @staticmethod
+    def _format(value):
+        if isinstance(value, bool):
+            return 't' if value else 'f'
+        if hasattr(value, 'isoformat'):
+            return value.isoformat()
+        return value
+
+    def _merge(self, cursor):
+        updates = ', '.join(
+            f'"{COLUMNS[field]}" = EXCLUDED."{COLUMNS[field]}"' for field in UPDATE_FIELDS
+        )
+        cursor.execute(
+            f'INSERT INTO "{self.table}" ({self.column_sql}) '
+            f'SELECT {self.column_sql} FROM incident_import_staging '
+            f'ON CONFLICT ("incident_title") DO UPDATE SET {updates}'
+        )
+        return cursor.rowcount
+
+    def _merge_partitioned(self, cursor):
+        # Titles are unique through a trigger on partitioned tables, which
+        # ON CONFLICT can't use: update the existing titles, insert the rest
+        updates = ', '.join(
+            f'"{COLUMNS[field]}" = staging."{COLUMNS[field]}"' for field in UPDATE_FIELDS
+        )
+        cursor.execute(
+            f'UPDATE "{self.table}" AS incident SET {updates} '
+            f'FROM incident_import_staging AS staging '
+            f'WHERE incident."incident_title" = staging."incident_title"'
+        )
+        updated = cursor.rowcount
+        cursor.execute(
+            f'INSERT INTO "{self.table}" ({self.column_sql}) '
+            f'SELECT {self.column_sql} FROM incident_import_staging AS staging '
+            f'WHERE NOT EXISTS (SELECT 1 FROM "{self.table}" AS incident '
+            f'WHERE incident."incident_title" = staging."incident_title")'
+        )
+        return updated + cursor.rowcount
+
+    def load(self, rows):
+        with transaction.atomic(), connection.cursor() as cursor:
+            # ON COMMIT DROP only fires when the outermost transaction
+            # commits; a caller's transaction may span several batches
+            cursor.execute('DROP TABLE IF EXISTS incident_import_staging')
+            cursor.execute(
+                f'CREATE TEMPORARY TABLE incident_import_staging '
+                f'(LIKE "{self.table}" INCLUDING DEFAULTS) ON COMMIT DROP'
+            )
+            self._copy(cursor, rows)
+            if partitioning.is_partitioned():
+                return self._merge_partitioned(cursor)
+            return self._merge(cursor)
+
+
+def get_loader(method='auto'):
+    if method == 'copy' or (method == 'auto' and connection.vendor == 'postgresql'):
+        if connection.vendor != 'postgresql':
+            raise ValueError('COPY loading is only available on PostgreSQL')
+        return PostgresCopyLoader()
+    return BulkCreateLoader()
+
+
+def import_batch(rows, validator, loader):
+    """Validate and load one batch. Returns (loaded_count, rejected)"""
+    valid, rejected = validator.validate(rows)
+    if not valid:
+        return 0, rejected
+    rows = assign_ids(_dedupe_titles(resolve_locations(valid)))
+    with transaction.atomic():
+        loaded = loader.load(rows)
+        # Loaders bypass the post_save signal that indexes single saves
+        duplicates.index_incidents(rows)
+    return loaded, rejected
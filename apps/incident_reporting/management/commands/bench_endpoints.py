@@ -0,0 +1,252 @@
+import json
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from contextlib import ExitStack
+
+import django
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.utils import timezone
+
+from apps.incident_reporting.models import Incident, IncidentAttachment
+
+
+API = "/api/v1/incident_reporting/"
+
+
+class Scenario:
+    def __init__(self, name, request, write=False):
+        self.name = name
+        self.request = request
+        self.write = write
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the incident endpoints against the current database and write the "
+        "results as JSON. Use --compare to flag regressions against a previous run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", help="Write results to this JSON file")
+        parser.add_argument("--compare", help="Previous results JSON to compare against")
+        parser.add_argument("--repeat", type=int, default=30, help="Timed requests per scenario")
+        parser.add_argument("--warmup", type=int, default=3)
+        parser.add_argument(
+            "--threshold", type=float, default=10.0,
+            help="Median slowdown (percent) that counts as a regression",
+        )
+        parser.add_argument(
+            "--noise-floor-ms", type=float, default=0.5,
+            help="Ignore median changes smaller than this many milliseconds",
+        )
+        parser.add_argument("--only", nargs="+", help="Run only these scenarios")
+        parser.add_argument(
+            "--fail-on-regression", action="store_true",
+            help="Exit with an error when a regression is found",
+        )
+
+    def handle(self, *args, **options):
+        if not Incident.objects.exists():
+            raise CommandError("No incidents found; run `manage.py seed_incidents 10k` first")
+
+        client = Client(HTTP_HOST="localhost")
+        scenarios = self.build_scenarios(options["repeat"])
+        if options["only"]:
+            scenarios = [s for s in scenarios if s.name in options["only"]]
+
+        results = {"meta": self.metadata(), "scenarios": {}}
+        with ExitStack() as stack:
+            # Benchmark the production code path, not debug query logging
+            stack.enter_context(override_settings(
+                DEBUG=False,
+                MEDIA_ROOT=stack.enter_context(tempfile.TemporaryDirectory()),
+                QUERY_INSPECTOR={**settings.QUERY_INSPECTOR, "ENABLED": False},
+            ))
+            for scenario in scenarios:
+                results["scenarios"][scenario.name] = self.run_scenario(
+                    client, scenario, options["repeat"], options["warmup"]
+                )
+                self.print_result(scenario.name, results["scenarios"][scenario.name])
+
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if options["compare"]:
+            with open(options["compare"]) as f:
+                previous = json.load(f)
+            regressions = self.compare(
+                previous, results, options["threshold"], options["noise_floor_ms"]
+            )
+            if regressions and options["fail_on_regression"]:
+                raise CommandError(f"{len(regressions)} scenario(s) regressed: {', '.join(regressions)}")
+
+    def build_scenarios(self, repeat):
+        active = Incident.objects.filter(is_active=True)
+        count = active.count()
+        page_size = settings.REST_FRAMEWORK["PAGE_SIZE"]
+        middle_page = max(1, count // page_size // 2)
+
+        top_facility = (
+            active.exclude(facility=None).order_by().values("facility")
+            .annotate(n=Count("id")).order_by("-n").values_list("facility__name", flat=True).first()
+        )
+        sample = list(active.order_by("?").values_list("id", flat=True)[:max(repeat, 10)])
+        with_attachments = list(
+            IncidentAttachment.objects.order_by("?").values_list("incident_id", flat=True)[:max(repeat, 10)]
+        ) or sample
+        search_term = Incident.objects.filter(pk=sample[0]).values_list(
+            "incident_title", flat=True
+        ).first().split()[0]
+
+        def rotating(ids):
+            state = {"i": 0}
+
+            def next_id():
+                state["i"] += 1
+                return ids[state["i"] % len(ids)]
+            return next_id
+
+        next_incident = rotating(sample)
+        next_with_attachments = rotating(with_attachments)
+        sequence = {"n": 0}
+
+        def create(client):
+            sequence["n"] += 1
+            return client.post(f"{API}incidents/", {
+                "incident_title": f"Benchmark incident {time.time_ns()}-{sequence['n']}",
+                "date_of_incident": timezone.now().date().isoformat(),
+                "time_of_incident": "10:30",
+                "facility": top_facility or "Benchmark Plant",
+                "department": "Maintenance",
+                "category": "NEAR_MISS",
+                "sub_category": "SPILL",
+                "description": "Oil spill near the loading bay, contained with absorbent pads.",
+                "persons_involved_type": "EMPLOYEE",
+                "injury_damage_type": "NO_INJURY",
+                "waste_type": "HAZARDOUS",
+                "waste_category_code": "Hazardous Waste 5.1 - Used Oil",
+                "reported_by_type": "EMPLOYEE",
+                "reported_by_name": "Benchmark",
+            }, content_type="application/json")
+
+        def upload(client):
+            document = SimpleUploadedFile("report.txt", b"x" * 20_000, content_type="text/plain")
+            return client.post(
+                f"{API}incidents/{next_incident()}/upload_attachment/",
+                {"file": document, "attachment_type": "DOCUMENT", "description": "benchmark"},
+            )
+
+        return [
+            Scenario("list_first_page", lambda c: c.get(f"{API}incidents/")),
+            Scenario("list_middle_page", lambda c: c.get(f"{API}incidents/?page={middle_page}")),
+            Scenario("list_search", lambda c: c.get(f"{API}incidents/", {"search": search_term})),
+            Scenario("list_filter", lambda c: c.get(f"{API}incidents/", {
+                "category": "NEAR_MISS", "facility": top_facility or "",
+            })),
+            Scenario("list_filter_ordering", lambda c: c.get(f"{API}incidents/", {
+                "injury_damage_type": "MAJOR_INJURY", "ordering": "-date_of_incident",
+            })),
+            Scenario("detail", lambda c: c.get(f"{API}incidents/{next_incident()}/")),
+            Scenario("attachments", lambda c: c.get(f"{API}incidents/{next_with_attachments()}/attachments/")),
+            Scenario("dashboard_stats", lambda c: c.get(f"{API}incidents/dashboard_stats/")),
+            Scenario("create", create, write=True),
+            Scenario("upload", upload, write=True),
+        ]
+
+    def run_scenario(self, client, scenario, repeat, warmup):
+        timings, queries, sizes = [], [], []
+
+        def counter(execute, sql, params, many, context):
+            queries[-1] += 1
+            return execute(sql, params, many, context)
+
+        for iteration in range(warmup + repeat):
+            queries.append(0)
+            with connection.execute_wrapper(counter), transaction.atomic():
+                started = time.perf_counter()
+                response = scenario.request(client)
+                elapsed = time.perf_counter() - started
+                if scenario.write:
+                    # Keep the dataset identical between runs
+                    transaction.set_rollback(True)
+            if response.status_code >= 400:
+                raise CommandError(
+                    f"{scenario.name}: HTTP {response.status_code} {response.content[:300]!r}"
+                )
+            if iteration >= warmup:
+                timings.append(elapsed * 1000)
+                sizes.append(len(response.content))
+            else:
+                queries.pop()
+
+        timings.sort()
+        return {
+            "repeat": repeat,
+            "median_ms": round(statistics.median(timings), 3),
+            "p95_ms": round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 3),
+            "min_ms": round(timings[0], 3),
+            "mean_ms": round(statistics.fmean(timings), 3),
+            "queries": round(statistics.fmean(queries), 1),
+            "response_bytes": round(statistics.fmean(sizes)),
+        }
+
+    def metadata(self):
+        try:
+            commit = subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                capture_output=True, text=True, cwd=settings.BASE_DIR,
+            ).stdout.strip() or None
+        except OSError:
+            commit = None
+        return {
+            "timestamp": timezone.now().isoformat(),
+            "commit": commit,
+            "database": connection.vendor,
+            "incidents": Incident.objects.count(),
+            "attachments": IncidentAttachment.objects.count(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+        }
+
+    def print_result(self, name, result):
+        self.stdout.write(
+            f"{name:<22} median {result['median_ms']:>9.2f} ms  p95 {result['p95_ms']:>9.2f} ms  "
+            f"queries {result['queries']:>5}  {result['response_bytes']:>8} B"
+        )
+
+    def compare(self, previous, current, threshold, noise_floor_ms):
+        self.stdout.write("")
+        self.stdout.write(
+            f"Compared with {previous['meta'].get('commit')} "
+            f"({previous['meta'].get('incidents')} incidents, {previous['meta'].get('database')})"
+        )
+        regressions = []
+        for name, result in current["scenarios"].items():
+            before = previous["scenarios"].get(name)
+            if before is None:
+                self.stdout.write(f"{name:<22} new scenario")
+                continue
+            change_ms = result["median_ms"] - before["median_ms"]
+            change_pct = change_ms / before["median_ms"] * 100 if before["median_ms"] else 0.0
+            line = (
+                f"{name:<22} {before['median_ms']:>9.2f} -> {result['median_ms']:>9.2f} ms "
+                f"({change_pct:+6.1f}%)  queries {before['queries']} -> {result['queries']}"
+            )
+            if change_pct > threshold and change_ms > noise_floor_ms:
+                regressions.append(name)
+                self.stdout.write(self.style.ERROR(f"{line}  REGRESSION"))
+            elif change_pct < -threshold and -change_ms > noise_floor_ms:
+                self.stdout.write(self.style.SUCCESS(f"{line}  improved"))
+            else:
+                self.stdout.write(line)
+        return regressions
@@ -0,0 +1,146 @@
+import csv
+import itertools
+import json
+import os
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.incident_reporting.importer import (
+    BatchValidator,
+    get_loader,
+    import_batch,
+    read_rows,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream historical incidents from CSV or NDJSON into the database. "
+        "Uses COPY + upsert on PostgreSQL and bulk_create elsewhere; resumable "
+        "from a checkpoint file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("source", help="CSV / NDJSON file, or - for stdin")
+        parser.add_argument("--format", choices=["csv", "ndjson"], help="Defaults to the file extension")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--method", choices=["auto", "copy", "bulk"], default="auto")
+        parser.add_argument("--date-format", help="strptime format for legacy dates, e.g. %%d/%%m/%%Y")
+        parser.add_argument("--rejects", help="Write rejected rows with their errors to this NDJSON file")
+        parser.add_argument(
+            "--checkpoint",
+            help="Checkpoint file (default: <source>.checkpoint.json)",
+        )
+        parser.add_argument(
+            "--resume", action="store_true",
+            help="Skip the rows already committed according to the checkpoint",
+        )
+
+    def handle(self, *args, **options):
+        source = options["source"]
+        fmt = options["format"] or self._guess_format(source)
+        from_stdin = source == "-"
+        if from_stdin and options["resume"]:
+            raise CommandError("--resume needs a file source")
+
+        checkpoint_path = None if from_stdin else (
+            options["checkpoint"] or f"{source}.checkpoint.json"
+        )
+        state = {"source": None if from_stdin else os.path.abspath(source), "rows": 0, "loaded": 0, "rejected": 0}
+        if options["resume"]:
+            state = self._load_checkpoint(checkpoint_path, source)
+            self.stdout.write(f"Resuming after row {state['rows']}")
+
+        try:
+            loader = get_loader(options["method"])
+        except ValueError as e:
+            raise CommandError(str(e))
+        validator = BatchValidator(date_format=options["date_format"])
+        rejects = open(options["rejects"], "a") if options["rejects"] else None
+
+        stream = sys.stdin if from_stdin else open(source, newline="" if fmt == "csv" else None)
+        started = time.monotonic()
+        session_rows = 0
+        try:
+            rows = read_rows(stream, fmt)
+            if state["rows"]:
+                rows = itertools.islice(rows, state["rows"], None)
+
+            while True:
+                batch = list(itertools.islice(rows, options["batch_size"]))
+                if not batch:
+                    break
+                loaded, rejected = import_batch(batch, validator, loader)
+
+                if rejects:
+                    for row, errors in rejected:
+                        rejects.write(json.dumps({"row": row, "errors": errors}, default=str) + "\n")
+                    rejects.flush()
+
+                session_rows += len(batch)
+                state["rows"] += len(batch)
+                state["loaded"] += loaded
+                state["rejected"] += len(rejected)
+                if checkpoint_path:
+                    self._save_checkpoint(checkpoint_path, state)
+
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f"\r{state['rows']:>10} rows  {state['loaded']:>10} loaded  "
+                    f"{state['rejected']:>8} rejected  {session_rows / elapsed:>10,.0f} rows/s",
+                    ending="",
+                )
+                self.stdout.flush()
+        except (csv.Error, json.JSONDecodeError) as e:
+            raise CommandError(
+                f"Unreadable input after row {state['rows']}: {e}. "
+                f"Fix the file and rerun with --resume."
+            )
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+            if rejects:
+                rejects.close()
+
+        elapsed = time.monotonic() - started
+        self.stdout.write("")
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {state['loaded']} incidents ({state['rejected']} rejected) "
+            f"from {state['rows']} rows in {elapsed:.1f}s "
+            f"({session_rows / elapsed if elapsed else 0:,.0f} rows/s)"
+        ))
+        if checkpoint_path:
+            state["completed"] = True
+            self._save_checkpoint(checkpoint_path, state)
+
+    @staticmethod
+    def _guess_format(source):
+        extension = os.path.splitext(source)[1].lower()
+        if extension in (".ndjson", ".jsonl", ".json"):
+            return "ndjson"
+        if extension == ".csv":
+            return "csv"
+        raise CommandError("Cannot guess the input format, pass --format")
+
+    @staticmethod
+    def _load_checkpoint(path, source):
+        try:
+            with open(path) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            raise CommandError(f"No checkpoint found at {path}")
+        if state.get("source") != os.path.abspath(source):
+            raise CommandError(f"Checkpoint {path} belongs to {state.get('source')}")
+        if state.get("completed"):
+            raise CommandError(f"{source} was already imported completely")
+        return state
+
+    @staticmethod
+    def _save_checkpoint(path, state):
+        # Write-then-rename so a crash never leaves a truncated checkpoint
+        temporary = f"{path}.tmp"
+        with open(temporary, "w") as f:
+            json.dump(state, f)
+        os.replace(temporary, path)
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.incident_reporting import duplicates
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the near-duplicate (MinHash/LSH) index of live incidents, e.g. after "
+        "seed_incidents or a change of INCIDENT_DUPLICATES"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        def progress(indexed):
+            self.stdout.write(f"\r{indexed:>9} incidents indexed", ending="")
+            self.stdout.flush()
+
+        indexed = duplicates.index_all(batch_size=options["batch_size"], progress=progress)
+        self.stdout.write("")
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {indexed} incidents in {time.monotonic() - started:.1f}s"
+        ))
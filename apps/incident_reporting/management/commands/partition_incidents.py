@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.incident_reporting import partitioning
+
+
+class Command(BaseCommand):
+    help = (
+        "Convert the incident table into a table range-partitioned by "
+        "date_of_incident (PostgreSQL), or create upcoming partitions with --ensure."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--granularity", choices=["month", "year"],
+            help="Partition size (default: INCIDENT_PARTITIONING['GRANULARITY'])",
+        )
+        parser.add_argument(
+            "--keep-legacy", action="store_true",
+            help="Keep the original table as <table>_legacy instead of dropping it",
+        )
+        parser.add_argument(
+            "--ensure", action="store_true",
+            help="Only create missing upcoming partitions (what the beat task does)",
+        )
+
+    def handle(self, *args, **options):
+        if not partitioning.is_supported():
+            raise CommandError("Partitioning is only available on PostgreSQL")
+
+        if options["ensure"]:
+            created = partitioning.ensure_partitions(granularity=options["granularity"])
+            self.stdout.write(f"Created {len(created)} partition(s): {', '.join(created) or '-'}")
+            return
+
+        try:
+            partitioning.convert_to_partitioned(
+                granularity=options["granularity"],
+                keep_legacy=options["keep_legacy"],
+                log=self.stdout.write,
+            )
+        except (RuntimeError, ValueError) as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f"{partitioning.TABLE} is now partitioned"))
@@ -0,0 +1,61 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.incident_reporting.models import Incident
+from apps.incident_reporting.synthetic import SIZES, flush, generate
+
+
+class Command(BaseCommand):
+    help = "Generate a synthetic incident dataset (10k / 100k / 1m rows) for benchmarks"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "size",
+            help=f"One of {', '.join(SIZES)} or an explicit number of incidents",
+        )
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--seed", type=int, default=0, help="Random seed for a reproducible dataset")
+        parser.add_argument("--years", type=int, default=5, help="Spread incident dates over this many years")
+        parser.add_argument(
+            "--flush", action="store_true",
+            help="Delete all existing incidents and attachments first",
+        )
+
+    def handle(self, *args, **options):
+        size = options["size"].lower()
+        if size in SIZES:
+            count = SIZES[size]
+        elif size.isdigit():
+            count = int(size)
+        else:
+            raise CommandError(f"Unknown size {options['size']!r}")
+
+        if options["flush"]:
+            deleted = flush()
+            self.stdout.write(f"Deleted {deleted} existing incidents")
+
+        started = time.monotonic()
+
+        def progress(incidents, attachments):
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f"\r{incidents:>9}/{count} incidents, {attachments} attachments "
+                f"({incidents / elapsed:,.0f} incidents/s)",
+                ending="",
+            )
+            self.stdout.flush()
+
+        incidents, attachments = generate(
+            count,
+            batch_size=options["batch_size"],
+            seed=options["seed"],
+            years=options["years"],
+            start_number=Incident.objects.count() + 1,
+            progress=progress,
+        )
+        self.stdout.write("")
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {incidents} incidents and {attachments} attachments "
+            f"in {time.monotonic() - started:.1f}s"
+        ))
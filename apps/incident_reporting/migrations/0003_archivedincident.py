@@ -0,0 +1,242 @@
+# Generated by Django 5.1 on 2026-10-19 16:11
+
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        (
+            "incident_reporting",
+            "0002_alter_incident_department_alter_incident_facility_and_more",
+        ),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedIncident",
+            fields=[
+                (
+                    "id",
+                    models.UUIDField(
+                        default=uuid.uuid4,
+                        editable=False,
+                        primary_key=True,
+                        serialize=False,
+                    ),
+                ),
+                (
+                    "date_of_incident",
+                    models.DateField(help_text="When the incident happened"),
+                ),
+                (
+                    "time_of_incident",
+                    models.TimeField(help_text="Exact time of occurrence"),
+                ),
+                (
+                    "facility",
+                    models.CharField(
+                        blank=True,
+                        help_text="Location / Facility name where incident occurred",
+                        max_length=100,
+                        null=True,
+                    ),
+                ),
+                (
+                    "department",
+                    models.CharField(
+                        blank=True,
+                        help_text="Department where incident occurred",
+                        max_length=100,
+                        null=True,
+                    ),
+                ),
+                (
+                    "site",
+                    models.CharField(
+                        blank=True,
+                        help_text="Specific site location",
+                        max_length=100,
+                        null=True,
+                    ),
+                ),
+                (
+                    "category",
+                    models.CharField(
+                        choices=[
+                            ("INCIDENT", "Incident"),
+                            ("NEAR_MISS", "Near-Miss"),
+                            ("UNSAFE_ACT", "Unsafe Act"),
+                            ("UNSAFE_CONDITION", "Unsafe Condition"),
+                        ],
+                        help_text="Type of incident",
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "sub_category",
+                    models.CharField(
+                        blank=True,
+                        choices=[
+                            ("FIRE", "Fire"),
+                            ("SPILL", "Spill"),
+                            ("EXPOSURE", "Exposure"),
+                            ("EQUIPMENT_FAILURE", "Equipment Failure"),
+                            ("CHEMICAL_LEAK", "Chemical Leak"),
+                            ("EXPLOSION", "Explosion"),
+                            ("ELECTRICAL", "Electrical"),
+                            ("STRUCTURAL", "Structural"),
+                            ("ENVIRONMENTAL", "Environmental"),
+                            ("OTHER", "Other"),
+                        ],
+                        help_text="Specific sub-category if applicable",
+                        max_length=20,
+                        null=True,
+                    ),
+                ),
+                (
+                    "description",
+                    models.TextField(help_text="Detailed narrative of what occurred"),
+                ),
+                (
+                    "persons_involved_type",
+                    models.CharField(
+                        choices=[
+                            ("EMPLOYEE", "Employee"),
+                            ("CONTRACTOR", "Contractor"),
+                            ("THIRD_PARTY", "Third Party"),
+                            ("VISITOR", "Visitor"),
+                        ],
+                        help_text="Type of person involved",
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "persons_involved_details",
+                    models.TextField(
+                        blank=True,
+                        help_text="Details of persons involved (names, roles, etc.)",
+                        null=True,
+                    ),
+                ),
+                (
+                    "injury_damage_type",
+                    models.CharField(
+                        choices=[
+                            ("NO_INJURY", "No Injury"),
+                            ("MINOR_INJURY", "Minor Injury"),
+                            ("MAJOR_INJURY", "Major Injury"),
+                            ("FATALITY", "Fatality"),
+                            ("PROPERTY_DAMAGE", "Property Damage"),
+                            ("ENVIRONMENTAL_IMPACT", "Environmental Impact"),
+                            ("NEAR_MISS", "Near Miss"),
+                        ],
+                        help_text="Type of injury or damage occurred",
+                        max_length=30,
+                    ),
+                ),
+                (
+                    "injury_damage_details",
+                    models.TextField(
+                        blank=True,
+                        help_text="Detailed description of injury or damage",
+                        null=True,
+                    ),
+                ),
+                (
+                    "waste_type",
+                    models.CharField(
+                        choices=[
+                            ("HAZARDOUS", "Hazardous"),
+                            ("NON_HAZARDOUS", "Non-Hazardous"),
+                            ("BIOMEDICAL", "Biomedical"),
+                            ("E_WASTE", "E-Waste"),
+                            ("CHEMICAL", "Chemical"),
+                            ("CONSTRUCTION", "Construction"),
+                            ("NOT_APPLICABLE", "Not Applicable"),
+                        ],
+                        default="NOT_APPLICABLE",
+                        help_text="Type of waste involved if applicable",
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "waste_category_code",
+                    models.CharField(
+                        blank=True,
+                        help_text="Regulatory classification (e.g., Hazardous Waste 5.1 – Used Oil)",
+                        max_length=100,
+                        null=True,
+                    ),
+                ),
+                (
+                    "reported_by_type",
+                    models.CharField(
+                        choices=[
+                            ("EMPLOYEE", "Employee"),
+                            ("CONTRACTOR", "Contractor"),
+                            ("VISITOR", "Visitor"),
+                            ("IOT_SENSOR", "Automated IoT Sensor Trigger"),
+                        ],
+                        help_text="Who reported the incident",
+                        max_length=20,
+                    ),
+                ),
+                (
+                    "reported_by_name",
+                    models.CharField(
+                        help_text="Name of the person/system that reported",
+                        max_length=100,
+                    ),
+                ),
+                (
+                    "reported_by_contact",
+                    models.CharField(
+                        blank=True,
+                        help_text="Contact information of reporter",
+                        max_length=100,
+                        null=True,
+                    ),
+                ),
+                (
+                    "reporting_date",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now,
+                        help_text="When the incident was officially logged",
+                    ),
+                ),
+                ("is_active", models.BooleanField(default=True)),
+                ("incident_title", models.CharField(db_index=True, max_length=200)),
+                ("created_at", models.DateTimeField()),
+                ("updated_at", models.DateTimeField()),
+                (
+                    "attachments",
+                    models.JSONField(
+                        default=list,
+                        help_text="Metadata of the incident's attachments at archival time",
+                    ),
+                ),
+                ("attachment_count", models.PositiveIntegerField(default=0)),
+                (
+                    "archived_at",
+                    models.DateTimeField(default=django.utils.timezone.now),
+                ),
+            ],
+            options={
+                "verbose_name": "Archived Incident",
+                "verbose_name_plural": "Archived Incidents",
+                "ordering": ["-reporting_date", "-date_of_incident"],
+                "indexes": [
+                    models.Index(
+                        fields=["date_of_incident"],
+                        name="incident_re_date_of_ffb4f0_idx",
+                    ),
+                    models.Index(
+                        fields=["reporting_date"], name="incident_re_reporti_4049c4_idx"
+                    ),
+                ],
+            },
+        ),
+    ]
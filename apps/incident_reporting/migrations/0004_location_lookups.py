@@ -0,0 +1,289 @@
+# Generated by Django 5.1 on 2026-10-19 16:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+LOCATION_FIELDS = {
+    "facility": "Facility",
+    "department": "Department",
+    "site": "Site",
+}
+INCIDENT_MODELS = ["Incident", "ArchivedIncident"]
+
+
+def normalize_name(value):
+    # Same rules as models.normalize_name at the time of this migration
+    name = " ".join((value or "").split())
+    return (name, name.casefold()) if name else (None, None)
+
+
+def encode_locations(apps, schema_editor):
+    """
+    Replace the free-text names with lookup rows. Spelling variants that only
+    differ in case or whitespace share a row named after the most used variant.
+    """
+    for field, lookup_name in LOCATION_FIELDS.items():
+        Lookup = apps.get_model("incident_reporting", lookup_name)
+
+        usage = {}  # raw value -> number of incidents
+        for model_name in INCIDENT_MODELS:
+            Model = apps.get_model("incident_reporting", model_name)
+            rows = (
+                Model.objects.exclude(**{f"{field}_name": None}).order_by()
+                .values_list(f"{field}_name").annotate(n=models.Count("pk"))
+            )
+            for raw, n in rows:
+                usage[raw] = usage.get(raw, 0) + n
+
+        variants = {}  # key -> {display name: incidents}
+        for raw, n in usage.items():
+            name, key = normalize_name(raw)
+            if key is not None:
+                names = variants.setdefault(key, {})
+                names[name] = names.get(name, 0) + n
+
+        Lookup.objects.bulk_create([
+            Lookup(key=key, name=min(names, key=lambda name: (-names[name], name)))
+            for key, names in variants.items()
+        ])
+        ids = dict(Lookup.objects.values_list("key", "id"))
+
+        for model_name in INCIDENT_MODELS:
+            Model = apps.get_model("incident_reporting", model_name)
+            for raw in usage:
+                key = normalize_name(raw)[1]
+                if key is not None:
+                    Model.objects.filter(**{f"{field}_name": raw}).update(**{f"{field}_id": ids[key]})
+
+
+def decode_locations(apps, schema_editor):
+    for field, lookup_name in LOCATION_FIELDS.items():
+        Lookup = apps.get_model("incident_reporting", lookup_name)
+        for model_name in INCIDENT_MODELS:
+            Model = apps.get_model("incident_reporting", model_name)
+            for pk, name in Lookup.objects.values_list("id", "name"):
+                Model.objects.filter(**{f"{field}_id": pk}).update(**{f"{field}_name": name})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("incident_reporting", "0003_archivedincident"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Department",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100)),
+                (
+                    "key",
+                    models.CharField(
+                        help_text="Case-insensitive, whitespace-normalized name",
+                        max_length=100,
+                        unique=True,
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["name"],
+                "abstract": False,
+            },
+        ),
+        migrations.CreateModel(
+            name="Facility",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100)),
+                (
+                    "key",
+                    models.CharField(
+                        help_text="Case-insensitive, whitespace-normalized name",
+                        max_length=100,
+                        unique=True,
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name_plural": "Facilities",
+                "ordering": ["name"],
+                "abstract": False,
+            },
+        ),
+        migrations.CreateModel(
+            name="Site",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100)),
+                (
+                    "key",
+                    models.CharField(
+                        help_text="Case-insensitive, whitespace-normalized name",
+                        max_length=100,
+                        unique=True,
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["name"],
+                "abstract": False,
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name="incident",
+            name="incident_re_facilit_0081ab_idx",
+        ),
+        migrations.RenameField(
+            model_name="incident",
+            old_name="facility",
+            new_name="facility_name",
+        ),
+        migrations.RenameField(
+            model_name="incident",
+            old_name="department",
+            new_name="department_name",
+        ),
+        migrations.RenameField(
+            model_name="incident",
+            old_name="site",
+            new_name="site_name",
+        ),
+        migrations.RenameField(
+            model_name="archivedincident",
+            old_name="facility",
+            new_name="facility_name",
+        ),
+        migrations.RenameField(
+            model_name="archivedincident",
+            old_name="department",
+            new_name="department_name",
+        ),
+        migrations.RenameField(
+            model_name="archivedincident",
+            old_name="site",
+            new_name="site_name",
+        ),
+        migrations.AddField(
+            model_name="incident",
+            name="facility",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="Location / Facility name where incident occurred",
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="incident_reporting.facility",
+            ),
+        ),
+        migrations.AddField(
+            model_name="incident",
+            name="department",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="Department where incident occurred",
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="incident_reporting.department",
+            ),
+        ),
+        migrations.AddField(
+            model_name="incident",
+            name="site",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="Specific site location",
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="incident_reporting.site",
+            ),
+        ),
+        migrations.AddField(
+            model_name="archivedincident",
+            name="facility",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="Location / Facility name where incident occurred",
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="incident_reporting.facility",
+            ),
+        ),
+        migrations.AddField(
+            model_name="archivedincident",
+            name="department",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="Department where incident occurred",
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="incident_reporting.department",
+            ),
+        ),
+        migrations.AddField(
+            model_name="archivedincident",
+            name="site",
+            field=models.ForeignKey(
+                blank=True,
+                help_text="Specific site location",
+                null=True,
+                on_delete=django.db.models.deletion.PROTECT,
+                related_name="+",
+                to="incident_reporting.site",
+            ),
+        ),
+        migrations.RunPython(encode_locations, decode_locations),
+        migrations.RemoveField(
+            model_name="incident",
+            name="facility_name",
+        ),
+        migrations.RemoveField(
+            model_name="incident",
+            name="department_name",
+        ),
+        migrations.RemoveField(
+            model_name="incident",
+            name="site_name",
+        ),
+        migrations.RemoveField(
+            model_name="archivedincident",
+            name="facility_name",
+        ),
+        migrations.RemoveField(
+            model_name="archivedincident",
+            name="department_name",
+        ),
+        migrations.RemoveField(
+            model_name="archivedincident",
+            name="site_name",
+        ),
+    ]
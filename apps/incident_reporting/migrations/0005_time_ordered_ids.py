@@ -0,0 +1,44 @@
+# Generated by Django 5.1 on 2026-10-19 16:17
+
+import apps.common.ids
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("incident_reporting", "0004_location_lookups"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="archivedincident",
+            name="id",
+            field=models.UUIDField(
+                default=apps.common.ids.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="incident",
+            name="id",
+            field=models.UUIDField(
+                default=apps.common.ids.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="incidentattachment",
+            name="id",
+            field=models.UUIDField(
+                default=apps.common.ids.uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+    ]
@@ -0,0 +1,152 @@
+from django.db import migrations, models
+
+
+BATCH_SIZE = 1000
+INCIDENT_MODELS = ["Incident", "ArchivedIncident"]
+TABLE = "incident_reporting_incident"
+UNIQUE_INDEX = "incident_reporting_incident_number_uniq"
+# Trigger enforcing uniqueness across partitions, as partitioning.py
+# installed it at the time of this migration
+UNIQUE_FUNCTION = "incident_reporting_incident_unique_incident_number"
+UNIQUE_TRIGGER_SQL = [
+    f"""
+    CREATE OR REPLACE FUNCTION "{UNIQUE_FUNCTION}"() RETURNS trigger AS $$
+    BEGIN
+        IF TG_OP = 'UPDATE' AND NEW."incident_number" IS NOT DISTINCT FROM OLD."incident_number" THEN
+            RETURN NEW;
+        END IF;
+        IF NEW."incident_number" IS NULL THEN
+            RETURN NEW;
+        END IF;
+        PERFORM pg_advisory_xact_lock(hashtext('{TABLE}.incident_number:' || NEW."incident_number"));
+        IF EXISTS (
+            SELECT 1 FROM "{TABLE}" WHERE "incident_number" = NEW."incident_number" AND id <> NEW.id
+        ) THEN
+            RAISE EXCEPTION 'duplicate key value violates unique constraint on "{TABLE}"."incident_number"'
+                USING ERRCODE = 'unique_violation',
+                      DETAIL = format('Key (incident_number)=(%s) already exists.', NEW."incident_number");
+        END IF;
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    f'DROP TRIGGER IF EXISTS "{UNIQUE_FUNCTION}" ON "{TABLE}"',
+    f'CREATE TRIGGER "{UNIQUE_FUNCTION}" BEFORE INSERT OR UPDATE ON "{TABLE}" '
+    f'FOR EACH ROW EXECUTE FUNCTION "{UNIQUE_FUNCTION}"()',
+]
+
+
+def format_incident_number(pk, date_of_incident):
+    # Same rules as models.format_incident_number at the time of this migration
+    suffix = pk.hex[-8:] if pk.version == 7 else str(pk)[:8]
+    return f"INC-{date_of_incident.strftime('%Y%m%d')}-{suffix.upper()}"
+
+
+def backfill_incident_numbers(apps, schema_editor):
+    """Store the number that used to be computed on every read"""
+    for model_name in INCIDENT_MODELS:
+        Model = apps.get_model("incident_reporting", model_name)
+        last = None
+        while True:
+            rows = Model.objects.order_by("pk").only("pk", "date_of_incident")
+            if last is not None:
+                rows = rows.filter(pk__gt=last)
+            rows = list(rows[:BATCH_SIZE])
+            if not rows:
+                break
+            for row in rows:
+                row.incident_number = format_incident_number(row.pk, row.date_of_incident)
+            Model.objects.bulk_update(rows, ["incident_number"])
+            last = rows[-1].pk
+
+
+def is_partitioned(schema_editor):
+    """Whether partition_incidents already converted the table (PostgreSQL only)"""
+    if schema_editor.connection.vendor != "postgresql":
+        return False
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [TABLE])
+        row = cursor.fetchone()
+    return bool(row) and row[0] == "p"
+
+
+def incident_number_fields(model):
+    """The column before and after it becomes unique"""
+    fields = (
+        models.CharField(editable=False, max_length=32, null=True),
+        models.CharField(editable=False, max_length=32, unique=True),
+    )
+    for field in fields:
+        field.set_attributes_from_name("incident_number")
+        field.model = model
+    return fields
+
+
+def make_unique(apps, schema_editor):
+    """
+    A unique constraint on a partitioned table has to include the partition
+    key, so once the table is partitioned uniqueness is enforced by an index
+    and a trigger instead (see partitioning.py).
+    """
+    Incident = apps.get_model("incident_reporting", "Incident")
+    if is_partitioned(schema_editor):
+        schema_editor.execute(f'ALTER TABLE "{TABLE}" ALTER COLUMN "incident_number" SET NOT NULL')
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS "{UNIQUE_INDEX}" ON "{TABLE}" ("incident_number")')
+        for statement in UNIQUE_TRIGGER_SQL:
+            # No parameters: the function body contains a literal %s
+            schema_editor.execute(statement, params=None)
+        return
+    schema_editor.alter_field(Incident, *incident_number_fields(Incident))
+
+
+def drop_unique(apps, schema_editor):
+    Incident = apps.get_model("incident_reporting", "Incident")
+    if is_partitioned(schema_editor):
+        schema_editor.execute(f'DROP TRIGGER IF EXISTS "{UNIQUE_FUNCTION}" ON "{TABLE}"')
+        schema_editor.execute(f'DROP FUNCTION IF EXISTS "{UNIQUE_FUNCTION}"()')
+        schema_editor.execute(f'DROP INDEX IF EXISTS "{UNIQUE_INDEX}"')
+        return
+    schema_editor.alter_field(Incident, *reversed(incident_number_fields(Incident)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("incident_reporting", "0005_time_ordered_ids"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="incident",
+            name="incident_number",
+            field=models.CharField(editable=False, max_length=32, null=True),
+        ),
+        migrations.AddField(
+            model_name="archivedincident",
+            name="incident_number",
+            field=models.CharField(editable=False, max_length=32, null=True),
+        ),
+        migrations.RunPython(backfill_incident_numbers, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="archivedincident",
+            name="incident_number",
+            field=models.CharField(db_index=True, editable=False, max_length=32),
+        ),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(make_unique, drop_unique),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name="incident",
+                    name="incident_number",
+                    field=models.CharField(
+                        editable=False,
+                        help_text="INC-YYYYMMDD-XXXXXXXX reference printed on reports",
+                        max_length=32,
+                        unique=True,
+                    ),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 5.1 on 2026-10-19 16:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("incident_reporting", "0006_stored_incident_number"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SafetyContact",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=100)),
+                ("email", models.EmailField(max_length=254)),
+                ("is_active", models.BooleanField(default=True)),
+                (
+                    "facility",
+                    models.ForeignKey(
+                        blank=True,
+                        help_text="Leave empty to be notified about every facility",
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="safety_contacts",
+                        to="incident_reporting.facility",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Safety Contact",
+                "verbose_name_plural": "Safety Contacts",
+                "ordering": ["name"],
+            },
+        ),
+        migrations.CreateModel(
+            name="IncidentNotification",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("queued_at", models.DateTimeField(auto_now_add=True)),
+                ("sent_at", models.DateTimeField(blank=True, null=True)),
+                (
+                    "incident",
+                    models.OneToOneField(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="notification",
+                        to="incident_reporting.incident",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Incident Notification",
+                "verbose_name_plural": "Incident Notifications",
+                "ordering": ["queued_at"],
+                "indexes": [
+                    models.Index(
+                        condition=models.Q(("sent_at__isnull", True)),
+                        fields=["queued_at"],
+                        name="incident_notification_pending",
+                    )
+                ],
+            },
+        ),
+    ]
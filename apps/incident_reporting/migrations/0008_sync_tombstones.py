@@ -0,0 +1,42 @@
+# Generated by Django 5.1 on 2026-10-19 16:32
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("incident_reporting", "0007_severe_incident_notifications"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IncidentTombstone",
+            fields=[
+                (
+                    "incident_id",
+                    models.UUIDField(editable=False, primary_key=True, serialize=False),
+                ),
+                ("deleted_at", models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                "verbose_name": "Incident Tombstone",
+                "verbose_name_plural": "Incident Tombstones",
+                "ordering": ["deleted_at", "incident_id"],
+            },
+        ),
+        migrations.AddIndex(
+            model_name="incident",
+            index=models.Index(
+                fields=["updated_at", "id"], name="incident_re_updated_f53fdc_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="incidenttombstone",
+            index=models.Index(
+                fields=["deleted_at", "incident_id"],
+                name="incident_re_deleted_9bb673_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.1 on 2026-10-19 16:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("incident_reporting", "0008_sync_tombstones"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IncidentSimilarityBucket",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("band", models.PositiveSmallIntegerField()),
+                ("bucket", models.BigIntegerField()),
+                (
+                    "incident",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to="incident_reporting.incident",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Incident Similarity Bucket",
+                "verbose_name_plural": "Incident Similarity Buckets",
+                "indexes": [
+                    models.Index(
+                        fields=["band", "bucket"], name="incident_similarity_bucket"
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("incident", "band"), name="incident_similarity_band"
+                    )
+                ],
+            },
+        ),
+    ]
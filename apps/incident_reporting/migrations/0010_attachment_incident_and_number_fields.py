@@ -0,0 +1,65 @@
+# Generated by Django 5.1 on 2026-10-19 17:15
+
+import apps.incident_reporting.models
+import django.db.models.deletion
+from django.db import migrations, models
+
+TABLE = "incident_reporting_incident"
+
+
+class AlterAttachmentIncident(migrations.AlterField):
+    """A partitioned incident table cannot be referenced by a foreign key,
+    so unapplying this leaves the constraint off there."""
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == "postgresql":
+            with schema_editor.connection.cursor() as cursor:
+                cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [TABLE])
+                if cursor.fetchone() == ("p",):
+                    return
+        super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("incident_reporting", "0009_similarity_buckets"),
+    ]
+
+    operations = [
+        # 0006 stores incident_number in plain CharFields; the column is the
+        # same for IncidentNumberField, only the model state changes
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name="archivedincident",
+                    name="incident_number",
+                    field=apps.incident_reporting.models.IncidentNumberField(
+                        db_index=True, editable=False, max_length=32
+                    ),
+                ),
+                migrations.AlterField(
+                    model_name="incident",
+                    name="incident_number",
+                    field=apps.incident_reporting.models.IncidentNumberField(
+                        editable=False,
+                        help_text="INC-YYYYMMDD-XXXXXXXX reference printed on reports",
+                        max_length=32,
+                        unique=True,
+                    ),
+                ),
+            ],
+        ),
+        # partition_incidents drops this constraint; tables that were never
+        # partitioned lose it here, so every database matches the model
+        AlterAttachmentIncident(
+            model_name="incidentattachment",
+            name="incident",
+            field=models.ForeignKey(
+                db_constraint=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="attachments",
+                to="incident_reporting.incident",
+            ),
+        ),
+    ]
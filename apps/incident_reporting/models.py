@@ -1,6 +1,8 @@
-from django.db import models
+from django.core.cache import cache
+from django.db import models, transaction
 from django.utils import timezone
-import uuid
+from datetime import datetime
+from apps.common.ids import uuid7
 import os
 
 # Create your models here.
@@ -13,9 +15,152 @@ def incident_attachment_path(instance, filename):
 
 
 
-class Incident(models.Model):
+def format_incident_number(pk, date_of_incident):
+    """INC-YYYYMMDD-XXXXXXXX, from the incident date and id"""
+    # The leading hex digits of a time-ordered id are its timestamp and
+    # repeat across incidents created together; use the random tail.
+    # Older uuid4 ids keep the numbers already printed on reports.
+    suffix = pk.hex[-8:] if pk.version == 7 else str(pk)[:8]
+    return f"INC-{date_of_incident.strftime('%Y%m%d')}-{suffix.upper()}"
+
+
+def incident_number_lookup(number):
     """
-    Main Incident Model - Phase 1 Requirements
+    Filter kwargs matching an incident number. The date embedded in the
+    number is matched too, so a partitioned table only scans one partition.
+    """
+    number = number.strip().upper()
+    lookup = {'incident_number': number}
+    try:
+        lookup['date_of_incident'] = datetime.strptime(number.split('-')[1], '%Y%m%d').date()
+    except (IndexError, ValueError):
+        pass
+    return lookup
+
+
+class IncidentNumberField(models.CharField):
+    """
+    Stored incident number, recomputed from the id and date_of_incident on
+    every save() and bulk_create(). QuerySet.update() bypasses it: callers
+    changing date_of_incident in bulk have to set incident_number too.
+    """
+    
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault('max_length', 32)
+        kwargs.setdefault('editable', False)
+        super().__init__(*args, **kwargs)
+    
+    def pre_save(self, model_instance, add):
+        value = format_incident_number(model_instance.pk, model_instance.date_of_incident)
+        setattr(model_instance, self.attname, value)
+        return value
+
+
+def normalize_name(value):
+    """
+    Collapse whitespace in a free-text location name. Returns (name, key):
+    the cleaned display name and the case-insensitive key used to dedupe
+    spelling variants, or (None, None) for blank values.
+    """
+    if value is None:
+        return None, None
+    name = ' '.join(str(value).split())
+    if not name:
+        return None, None
+    return name, name.casefold()
+
+
+class NamedLookupManager(models.Manager):
+    # Option lists are dropped whenever a row changes (signals.py); the
+    # timeout only bounds rows changed behind the ORM's back
+    CHOICES_CACHE_SECONDS = 60 * 60
+    
+    def choices_cache_key(self):
+        return f'lookup-choices:{self.model._meta.label_lower}'
+    
+    def choices(self):
+        """(pk, name) of every row, ordered by name, cached for filter option lists"""
+        key = self.choices_cache_key()
+        choices = cache.get(key)
+        if choices is None:
+            choices = list(self.order_by('name').values_list('pk', 'name'))
+            cache.set(key, choices, self.CHOICES_CACHE_SECONDS)
+        return choices
+    
+    def clear_choices_cache(self):
+        # After commit, so a concurrent request can't cache the old list again
+        key = self.choices_cache_key()
+        transaction.on_commit(lambda: cache.delete(key))
+    
+    def for_name(self, value):
+        """The row for a (possibly differently spelled) name, created if needed"""
+        name, key = normalize_name(value)
+        if key is None:
+            return None
+        return self.get_or_create(key=key, defaults={'name': name})[0]
+    
+    def for_names(self, values):
+        """Bulk for_name(): {value: row} for every non-blank value"""
+        keys = {}
+        for value in values:
+            name, key = normalize_name(value)
+            if key is not None:
+                keys.setdefault(key, name)
+        self.bulk_create(
+            [self.model(key=key, name=name) for key, name in keys.items()],
+            ignore_conflicts=True
+        )
+        if keys:
+            self.clear_choices_cache()  # bulk_create sends no signals
+        rows = self.in_bulk(list(keys), field_name='key')
+        return {
+            value: rows[normalize_name(value)[1]]
+            for value in values if normalize_name(value)[1] is not None
+        }
+
+
+class NamedLookup(models.Model):
+    """
+    Dictionary-encoded location name: incidents store an integer id instead
+    of repeating the text on every row.
+    """
+    name = models.CharField(max_length=100)
+    key = models.CharField(
+        max_length=100,
+        unique=True,
+        help_text="Case-insensitive, whitespace-normalized name"
+    )
+    
+    objects = NamedLookupManager()
+    
+    class Meta:
+        abstract = True
+        ordering = ['name']
+    
+    def __str__(self):
+        return self.name
+
+
+class Facility(NamedLookup):
+    class Meta(NamedLookup.Meta):
+        verbose_name_plural = "Facilities"
+
+
+class Department(NamedLookup):
+    class Meta(NamedLookup.Meta):
+        pass
+
+
+class Site(NamedLookup):
+    class Meta(NamedLookup.Meta):
+        pass
+
+
+
+class IncidentFields(models.Model):
+    """
+    Incident fields - Phase 1 Requirements. Shared by live incidents and
+    their archived copies.
     """
     
     # Choice Fields
@@ -74,7 +219,11 @@ class Incident(models.Model):
     ]
 
     # Primary Fields
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
+    incident_number = IncidentNumberField(
+        unique=True,
+        help_text="INC-YYYYMMDD-XXXXXXXX reference printed on reports"
+    )
     
     # (1) Incident Title / Name
     incident_title = models.CharField(
@@ -94,19 +243,25 @@ class Incident(models.Model):
     )
     
     # (4) Location (Facility / Department / Site)
-    facility = models.CharField(
-        max_length=100, 
-        blank=True, null=True ,
+    facility = models.ForeignKey(
+        Facility,
+        on_delete=models.PROTECT,
+        blank=True, null=True,
+        related_name='+',
         help_text="Location / Facility name where incident occurred"
     )
-    department = models.CharField(
-        max_length=100, 
-        blank=True, null=True ,
+    department = models.ForeignKey(
+        Department,
+        on_delete=models.PROTECT,
+        blank=True, null=True,
+        related_name='+',
         help_text="Department where incident occurred"
     )
-    site = models.CharField(
-        max_length=100, 
-        blank=True, null=True ,
+    site = models.ForeignKey(
+        Site,
+        on_delete=models.PROTECT,
+        blank=True, null=True,
+        related_name='+',
         help_text="Specific site location"
     )
     
@@ -198,24 +353,64 @@ class Incident(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=True)
     
+    class Meta:
+        abstract = True
+    
+    def __str__(self):
+        return f"{self.incident_title} - {self.date_of_incident}"
+    
+    def save(self, *args, update_fields=None, **kwargs):
+        # The number embeds the date, save(update_fields=[...]) must write both
+        if update_fields is not None and 'date_of_incident' in update_fields:
+            update_fields = {*update_fields, 'incident_number'}
+        super().save(*args, update_fields=update_fields, **kwargs)
+    
+
+
+class Incident(IncidentFields):
+    """
+    Main Incident Model - Phase 1 Requirements
+    """
+    
     class Meta:
         ordering = ['-reporting_date', '-date_of_incident']
         indexes = [
             models.Index(fields=['date_of_incident']),
             models.Index(fields=['category']),
-            models.Index(fields=['facility']),
             models.Index(fields=['reporting_date']),
+            # Keyset order of the changes feed (sync.py)
+            models.Index(fields=['updated_at', 'id']),
         ]
         verbose_name = "Incident"
         verbose_name_plural = "Incidents"
     
-    def __str__(self):
-        return f"{self.incident_title} - {self.date_of_incident}"
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Severity as stored, so saving can tell whether it changed (notifications.became_severe)
+        if 'injury_damage_type' in instance.__dict__:
+            instance._saved_injury_damage_type = instance.injury_damage_type
+        return instance
+
+
+class IncidentTombstone(models.Model):
+    """
+    Id of a deleted (or archived) incident, so that delta sync clients can
+    drop it from their copy. Compacted after INCIDENT_SYNC['TOMBSTONE_DAYS'].
+    """
+    incident_id = models.UUIDField(primary_key=True, editable=False)
+    deleted_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['deleted_at', 'incident_id']
+        indexes = [
+            models.Index(fields=['deleted_at', 'incident_id']),
+        ]
+        verbose_name = "Incident Tombstone"
+        verbose_name_plural = "Incident Tombstones"
     
-    @property
-    def incident_number(self):
-        """Generate a unique incident number"""
-        return f"INC-{self.date_of_incident.strftime('%Y%m%d')}-{str(self.id)[:8].upper()}"
+    def __str__(self):
+        return f"{self.incident_id} deleted {self.deleted_at}"
 
 
 class IncidentAttachment(models.Model):
@@ -231,11 +426,14 @@ class IncidentAttachment(models.Model):
         ('OTHER', 'Other'),
     ]
     
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     incident = models.ForeignKey(
         Incident, 
         on_delete=models.CASCADE, 
-        related_name='attachments'
+        related_name='attachments',
+        # The incident table may be partitioned (partitioning.py), which rules
+        # out a foreign key constraint on id alone; Django still cascades deletes
+        db_constraint=False
     )
     
     # File fields
@@ -273,3 +471,120 @@ class IncidentAttachment(models.Model):
             self.file_size = self.file.size
         super().save(*args, **kwargs)
 
+
+
+class ArchivedIncident(IncidentFields):
+    """
+    Cold copy of an incident moved out of the live table by the archival job
+    (see archive.py). Keeps the incident's id so lookups by id keep working,
+    and the metadata of its attachments; the files stay in storage.
+    """
+    
+    # Copied verbatim from the live row
+    incident_number = IncidentNumberField(db_index=True)
+    incident_title = models.CharField(max_length=200, db_index=True)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    
+    attachments = models.JSONField(
+        default=list,
+        help_text="Metadata of the incident's attachments at archival time"
+    )
+    attachment_count = models.PositiveIntegerField(default=0)
+    archived_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['-reporting_date', '-date_of_incident']
+        indexes = [
+            models.Index(fields=['date_of_incident']),
+            models.Index(fields=['reporting_date']),
+        ]
+        verbose_name = "Archived Incident"
+        verbose_name_plural = "Archived Incidents"
+
+
+class SafetyContact(models.Model):
+    """
+    Safety manager e-mailed about severe incidents (notifications.py).
+    Contacts without a facility hear about every facility.
+    """
+    name = models.CharField(max_length=100)
+    email = models.EmailField()
+    facility = models.ForeignKey(
+        Facility,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='safety_contacts',
+        help_text="Leave empty to be notified about every facility"
+    )
+    is_active = models.BooleanField(default=True)
+    
+    class Meta:
+        ordering = ['name']
+        verbose_name = "Safety Contact"
+        verbose_name_plural = "Safety Contacts"
+    
+    def __str__(self):
+        return f"{self.name} <{self.email}>"
+
+
+class IncidentNotification(models.Model):
+    """
+    Severe incident waiting to be (or already) e-mailed. Queued in the same
+    transaction as the incident, so every severe incident is announced once.
+    """
+    incident = models.OneToOneField(
+        Incident,
+        on_delete=models.CASCADE,
+        related_name='notification',
+        # The incident table may be partitioned, which rules out a foreign key
+        # constraint on id alone; Django still cascades deletes
+        db_constraint=False
+    )
+    queued_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['queued_at']
+        indexes = [
+            models.Index(
+                fields=['queued_at'],
+                condition=models.Q(sent_at__isnull=True),
+                name='incident_notification_pending'
+            ),
+        ]
+        verbose_name = "Incident Notification"
+        verbose_name_plural = "Incident Notifications"
+    
+    def __str__(self):
+        return f"{self.incident_id} ({'sent' if self.sent_at else 'pending'})"
+
+
+class IncidentSimilarityBucket(models.Model):
+    """
+    LSH bucket of one band of an incident's MinHash signature (duplicates.py).
+    Incidents sharing a (band, bucket) pair are candidate duplicates.
+    """
+    incident = models.ForeignKey(
+        Incident,
+        on_delete=models.CASCADE,
+        related_name='+',
+        # As for IncidentNotification: no constraint on a partitioned table
+        db_constraint=False
+    )
+    band = models.PositiveSmallIntegerField()
+    bucket = models.BigIntegerField()
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['incident', 'band'], name='incident_similarity_band'),
+        ]
+        indexes = [
+            models.Index(fields=['band', 'bucket'], name='incident_similarity_bucket'),
+        ]
+        verbose_name = "Incident Similarity Bucket"
+        verbose_name_plural = "Incident Similarity Buckets"
+    
+    def __str__(self):
+        return f"{self.incident_id} band {self.band}"
@@ -0,0 +1,174 @@
+"""
+Severe incident e-mails.
+
+Creating an incident whose injury_damage_type is one of
+INCIDENT_NOTIFICATIONS['SEVERE_INJURY_TYPES'], or raising an incident's
+injury_damage_type to one of them, queues an IncidentNotification in the
+same transaction (once per incident). After the commit,
+tasks.send_incident_notifications is scheduled DIGEST_WINDOW seconds out on
+the notifications queue, so ``create`` only pays for one insert and a broker
+publish; beat also runs the task every few minutes in case that publish was
+lost.
+
+The task takes the pending notifications, groups the incidents by facility
+and sends one e-mail per facility to its SafetyContacts plus the contacts
+for every facility. A lone incident gets its own message; a burst of reports
+within the window becomes a single digest. All messages of a batch go out
+over one SMTP connection, and the notifications of each message are marked
+sent as soon as it is accepted, so a failure mid-batch never re-sends them.
+"""
+import logging
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import IncidentNotification, SafetyContact
+
+logger = logging.getLogger(__name__)
+
+
+CELERY_EMAIL_BACKEND = 'djcelery_email.backends.CeleryEmailBackend'
+
+
+def is_severe(incident):
+    return incident.injury_damage_type in settings.INCIDENT_NOTIFICATIONS['SEVERE_INJURY_TYPES']
+
+
+def became_severe(incident, created):
+    """
+    Whether saving made the incident severe: created as severe, or changed
+    from a type that wasn't. Re-saving an incident that already was severe
+    doesn't queue it again.
+    """
+    if not is_severe(incident):
+        return False
+    if created or not hasattr(incident, '_saved_injury_damage_type'):
+        return True
+    return incident._saved_injury_damage_type not in settings.INCIDENT_NOTIFICATIONS['SEVERE_INJURY_TYPES']
+
+
+def queue_notification(incident):
+    """Queue a severe incident. Returns False when it was queued before."""
+    return IncidentNotification.objects.get_or_create(incident=incident)[1]
+
+
+def email_backend():
+    # This already runs in a worker: djcelery_email's backend would only
+    # queue another task per message, so deliver with the backend behind it
+    if settings.EMAIL_BACKEND == CELERY_EMAIL_BACKEND:
+        return getattr(settings, 'CELERY_EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+    return settings.EMAIL_BACKEND
+
+
+def recipients_by_facility(facility_ids):
+    """{facility id: [address]}, with the contacts for every facility under None"""
+    recipients = defaultdict(list)
+    contacts = SafetyContact.objects.filter(
+        Q(facility__isnull=True) | Q(facility_id__in=facility_ids), is_active=True
+    ).values_list('facility_id', 'email')
+    for facility_id, email in contacts:
+        recipients[facility_id].append(email)
+    return recipients
+
+
+def describe(incident):
+    location = ' / '.join(
+        str(place) for place in (incident.facility, incident.department, incident.site) if place
+    )
+    return '\n'.join([
+        f"{incident.incident_number}: {incident.incident_title}",
+        f"Severity: {incident.get_injury_damage_type_display()}",
+        f"When: {incident.date_of_incident} {incident.time_of_incident:%H:%M}",
+        f"Where: {location or 'Not specified'}",
+        f"Reported by: {incident.reported_by_name} ({incident.get_reported_by_type_display()})",
+        '',
+        incident.description,
+    ])
+
+
+def build_messages(incidents):
+    """
+    (EmailMessage, incidents) per facility: the incident itself, or a digest
+    of several. Facilities nobody is subscribed to get no message.
+    """
+    by_facility = defaultdict(list)
+    for incident in incidents:
+        by_facility[incident.facility_id].append(incident)
+    recipients = recipients_by_facility([pk for pk in by_facility if pk is not None])
+
+    messages = []
+    for facility_id, group in by_facility.items():
+        to = sorted(set(recipients[None] + (recipients[facility_id] if facility_id else [])))
+        facility = group[0].facility.name if group[0].facility else 'an unspecified facility'
+        if not to:
+            logger.warning("No safety contact for %s, %d severe incidents not e-mailed", facility, len(group))
+            continue
+        if len(group) == 1:
+            subject = f"Severe incident at {facility}: {group[0].incident_title}"
+        else:
+            subject = f"{len(group)} severe incidents at {facility}"
+        body = f"\n\n{'-' * 40}\n\n".join(describe(incident) for incident in group)
+        messages.append((EmailMessage(
+            subject, body, getattr(settings, 'EMAIL_FROM', None), to
+        ), group))
+    return messages
+
+
+def mark_sent(incidents):
+    IncidentNotification.objects.filter(
+        incident_id__in=[incident.pk for incident in incidents]
+    ).update(sent_at=timezone.now())
+
+
+def send_batch(batch_size):
+    """
+    Send one batch of pending notifications. Returns (notifications handled,
+    e-mails sent). A failed send leaves the rest of the batch pending for the
+    next run; what went out before it stays marked sent.
+    """
+    failure = None
+    with transaction.atomic():
+        # skip_locked: a scheduled run and the beat sweep never send twice
+        pending = list(
+            IncidentNotification.objects.filter(sent_at__isnull=True)
+            .select_for_update(skip_locked=True, of=('self',))
+            .select_related('incident__facility', 'incident__department', 'incident__site')
+            [:batch_size]
+        )
+        if not pending:
+            return 0, 0
+        incidents = [notification.incident for notification in pending]
+        messages = build_messages(incidents)
+        # Nobody to e-mail for these, they are done as well
+        addressed = {incident.pk for _, group in messages for incident in group}
+        mark_sent([incident for incident in incidents if incident.pk not in addressed])
+
+        sent = 0
+        try:
+            # One connection for the whole batch
+            with get_connection(backend=email_backend()) as connection:
+                for message, group in messages:
+                    connection.send_messages([message])
+                    mark_sent(group)
+                    sent += 1
+        except Exception as exc:
+            # Commit the messages already sent before giving up on the batch
+            failure = exc
+    if failure is not None:
+        raise failure
+    return len(pending), sent
+
+
+def send_pending(batch_size=None):
+    """Send every pending notification. Returns the number of e-mails sent."""
+    batch_size = batch_size or settings.INCIDENT_NOTIFICATIONS['BATCH_SIZE']
+    sent = 0
+    while True:
+        handled, messages = send_batch(batch_size)
+        sent += messages
+        if handled < batch_size:
+            return sent
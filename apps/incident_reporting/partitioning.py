@@ -0,0 +1,310 @@
+"""
+Declarative range partitioning of the Incident table by date_of_incident
+(PostgreSQL only).
+
+``manage.py partition_incidents`` converts the regular table into a table
+``PARTITION BY RANGE (date_of_incident)`` with monthly or yearly partitions
+plus a DEFAULT partition for out-of-range dates. PostgreSQL requires every
+unique constraint on a partitioned table to contain the partition key, so
+the conversion:
+
+* changes the primary key to ``(id, date_of_incident)`` - ``id`` stays
+  unique in practice and Django keeps using it as the model's pk;
+* turns single-column unique constraints (``incident_title``,
+  ``incident_number``) into plain indexes guarded by a trigger that
+  enforces uniqueness across partitions;
+* drops foreign keys pointing at the table that older schemas may still
+  carry. IncidentAttachment.incident is declared with ``db_constraint=False``;
+  Django still emulates ON DELETE CASCADE, so deletes through the ORM keep
+  removing attachments.
+
+``ensure_partitions()`` creates upcoming partitions ahead of time; it runs
+from Celery beat (tasks.ensure_incident_partitions). Rows that already
+landed in the DEFAULT partition are moved into a new partition when it is
+created.
+"""
+from datetime import date
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Incident
+
+
+TABLE = Incident._meta.db_table
+PARTITION_KEY = 'date_of_incident'
+DEFAULT_PARTITION = f'{TABLE}_pdefault'
+
+
+def _granularity(granularity=None):
+    granularity = granularity or settings.INCIDENT_PARTITIONING['GRANULARITY']
+    if granularity not in ('month', 'year'):
+        raise ValueError(f"Unknown partition granularity {granularity!r}")
+    return granularity
+
+
+def period_start(day, granularity):
+    if granularity == 'year':
+        return date(day.year, 1, 1)
+    return date(day.year, day.month, 1)
+
+
+def next_period(start, granularity):
+    if granularity == 'year':
+        return date(start.year + 1, 1, 1)
+    if start.month == 12:
+        return date(start.year + 1, 1, 1)
+    return date(start.year, start.month + 1, 1)
+
+
+def partition_name(start, granularity):
+    if granularity == 'year':
+        return f'{TABLE}_p{start.year}'
+    return f'{TABLE}_p{start.year}m{start.month:02d}'
+
+
+def periods(first_day, last_day, granularity):
+    """(name, start, end) for every period touching [first_day, last_day]"""
+    start = period_start(first_day, granularity)
+    while start <= last_day:
+        end = next_period(start, granularity)
+        yield partition_name(start, granularity), start, end
+        start = end
+
+
+def is_supported():
+    return connection.vendor == 'postgresql'
+
+
+def is_partitioned():
+    if not is_supported():
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [TABLE])
+        row = cursor.fetchone()
+    return bool(row) and row[0] == 'p'
+
+
+def existing_partitions():
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname
+            FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = to_regclass(%s)
+            """,
+            [TABLE],
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+
+def _unique_trigger_sql(column):
+    function = f'{TABLE}_unique_{column}'[:63]
+    return [
+        f"""
+        CREATE OR REPLACE FUNCTION "{function}"() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'UPDATE' AND NEW."{column}" IS NOT DISTINCT FROM OLD."{column}" THEN
+                RETURN NEW;
+            END IF;
+            IF NEW."{column}" IS NULL THEN
+                RETURN NEW;
+            END IF;
+            -- Serialize writers of the same value, then check every partition
+            PERFORM pg_advisory_xact_lock(hashtext('{TABLE}.{column}:' || NEW."{column}"));
+            IF EXISTS (
+                SELECT 1 FROM "{TABLE}" WHERE "{column}" = NEW."{column}" AND id <> NEW.id
+            ) THEN
+                RAISE EXCEPTION 'duplicate key value violates unique constraint on "{TABLE}"."{column}"'
+                    USING ERRCODE = 'unique_violation',
+                          DETAIL = format('Key ({column})=(%s) already exists.', NEW."{column}");
+            END IF;
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+        """,
+        f'DROP TRIGGER IF EXISTS "{function}" ON "{TABLE}"',
+        f'CREATE TRIGGER "{function}" BEFORE INSERT OR UPDATE ON "{TABLE}" '
+        f'FOR EACH ROW EXECUTE FUNCTION "{function}"()',
+    ]
+
+
+def enforce_unique(column, index_name):
+    """
+    Make ``column`` unique on the partitioned table: a plain index plus the
+    same trigger the conversion installs. For migrations adding unique
+    columns after the table was partitioned.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f'CREATE INDEX IF NOT EXISTS "{index_name}" ON "{TABLE}" ("{column}")')
+        for statement in _unique_trigger_sql(column):
+            cursor.execute(statement)
+
+
+def release_unique(column, index_name):
+    """Undo enforce_unique()"""
+    function = f'{TABLE}_unique_{column}'[:63]
+    with connection.cursor() as cursor:
+        cursor.execute(f'DROP TRIGGER IF EXISTS "{function}" ON "{TABLE}"')
+        cursor.execute(f'DROP FUNCTION IF EXISTS "{function}"()')
+        cursor.execute(f'DROP INDEX IF EXISTS "{index_name}"')
+
+
+def _table_indexes(cursor, table):
+    cursor.execute(
+        """
+        SELECT index_class.relname,
+               pg_get_indexdef(pg_index.indexrelid),
+               pg_index.indisunique,
+               pg_index.indisprimary,
+               ARRAY(
+                   SELECT attribute.attname
+                   FROM unnest(pg_index.indkey) AS key(attnum)
+                   JOIN pg_attribute attribute
+                     ON attribute.attrelid = pg_index.indrelid AND attribute.attnum = key.attnum
+               )
+        FROM pg_index
+        JOIN pg_class index_class ON index_class.oid = pg_index.indexrelid
+        WHERE pg_index.indrelid = to_regclass(%s)
+        """,
+        [table],
+    )
+    return cursor.fetchall()
+
+
+def _create_partition(cursor, name, start, end):
+    """
+    Create a partition and attach it, moving any rows for its range out of
+    the DEFAULT partition first (attaching would fail otherwise).
+    """
+    cursor.execute(
+        f'CREATE TABLE "{name}" (LIKE "{TABLE}" INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'
+    )
+    if DEFAULT_PARTITION in existing_partitions():
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM "{DEFAULT_PARTITION}" '
+            f'WHERE "{PARTITION_KEY}" >= %s AND "{PARTITION_KEY}" < %s RETURNING *) '
+            f'INSERT INTO "{name}" SELECT * FROM moved',
+            [start, end],
+        )
+    cursor.execute(
+        f'ALTER TABLE "{TABLE}" ATTACH PARTITION "{name}" FOR VALUES FROM (%s) TO (%s)',
+        [start, end],
+    )
+
+
+def ensure_partitions(ahead=None, granularity=None):
+    """
+    Make sure partitions exist from the current period up to ``ahead``
+    periods into the future. Returns the names of the partitions created.
+    Does nothing when the table is not partitioned.
+    """
+    if not is_partitioned():
+        return []
+    granularity = _granularity(granularity)
+    ahead = settings.INCIDENT_PARTITIONING['PREMAKE'] if ahead is None else ahead
+
+    today = timezone.now().date()
+    last = period_start(today, granularity)
+    for _ in range(ahead):
+        last = next_period(last, granularity)
+
+    created = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        existing = existing_partitions()
+        for name, start, end in periods(today, last, granularity):
+            if name not in existing:
+                _create_partition(cursor, name, start, end)
+                created.append(name)
+    return created
+
+
+def convert_to_partitioned(granularity=None, keep_legacy=False, log=print):
+    """
+    Rewrite the regular Incident table as a partitioned table, in a single
+    transaction. The table is locked for the duration of the copy.
+    """
+    if not is_supported():
+        raise RuntimeError('Partitioning needs PostgreSQL')
+    if is_partitioned():
+        raise RuntimeError(f'{TABLE} is already partitioned')
+    granularity = _granularity(granularity)
+    staging = f'{TABLE}_partitioned'
+    legacy = f'{TABLE}_legacy'
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Run deferred foreign key checks now, ALTER TABLE refuses to run
+        # while they are pending
+        cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        cursor.execute(f'LOCK TABLE "{TABLE}" IN ACCESS EXCLUSIVE MODE')
+        indexes = _table_indexes(cursor, TABLE)
+
+        cursor.execute(f'SELECT min("{PARTITION_KEY}") FROM "{TABLE}"')
+        first_day = cursor.fetchone()[0] or timezone.now().date()
+        today = timezone.now().date()
+        last = period_start(today, granularity)
+        for _ in range(settings.INCIDENT_PARTITIONING['PREMAKE']):
+            last = next_period(last, granularity)
+
+        cursor.execute(
+            f'CREATE TABLE "{staging}" (LIKE "{TABLE}" INCLUDING DEFAULTS INCLUDING GENERATED) '
+            f'PARTITION BY RANGE ("{PARTITION_KEY}")'
+        )
+        partitions = list(periods(first_day, last, granularity))
+        for name, start, end in partitions:
+            cursor.execute(
+                f'CREATE TABLE "{name}" PARTITION OF "{staging}" FOR VALUES FROM (%s) TO (%s)',
+                [start, end],
+            )
+        cursor.execute(f'CREATE TABLE "{DEFAULT_PARTITION}" PARTITION OF "{staging}" DEFAULT')
+        log(f'Created {len(partitions)} {granularity}ly partitions plus {DEFAULT_PARTITION}')
+
+        cursor.execute(f'INSERT INTO "{staging}" SELECT * FROM "{TABLE}"')
+        log(f'Copied {cursor.rowcount} incidents')
+
+        cursor.execute(
+            """
+            SELECT conrelid::regclass::text, conname
+            FROM pg_constraint
+            WHERE contype = 'f' AND confrelid = to_regclass(%s)
+            """,
+            [TABLE],
+        )
+        for referencing_table, constraint in cursor.fetchall():
+            cursor.execute(f'ALTER TABLE {referencing_table} DROP CONSTRAINT "{constraint}"')
+            log(f'Dropped foreign key {constraint} on {referencing_table}')
+
+        if keep_legacy:
+            cursor.execute(f'ALTER TABLE "{TABLE}" RENAME TO "{legacy}"')
+            for index_name, *_ in indexes:
+                cursor.execute(f'ALTER INDEX "{index_name}" RENAME TO "{index_name[:55]}_legacy"')
+            log(f'Kept the original table as {legacy}')
+        else:
+            cursor.execute(f'DROP TABLE "{TABLE}"')
+
+        cursor.execute(f'ALTER TABLE "{staging}" RENAME TO "{TABLE}"')
+
+        unique_columns = []
+        for index_name, definition, unique, primary, columns in indexes:
+            definition = definition.replace(f'public.{TABLE} ', f'public."{TABLE}" ')
+            if primary:
+                cursor.execute(
+                    f'ALTER TABLE "{TABLE}" ADD CONSTRAINT "{index_name}" '
+                    f'PRIMARY KEY ({", ".join(columns)}, "{PARTITION_KEY}")'
+                )
+            elif unique and PARTITION_KEY not in columns:
+                cursor.execute(definition.replace('CREATE UNIQUE INDEX', 'CREATE INDEX', 1))
+                if len(columns) == 1:
+                    unique_columns.append(columns[0])
+                else:
+                    log(f'Warning: unique index {index_name} is no longer enforced')
+            else:
+                cursor.execute(definition)
+        log(f'Recreated {len(indexes)} indexes')
+
+        for column in unique_columns:
+            for statement in _unique_trigger_sql(column):
+                cursor.execute(statement)
+            log(f'Enforcing uniqueness of {column} with a trigger')
@@ -1,11 +1,78 @@
+from datetime import timedelta
+
 from rest_framework import serializers
-from .models import Incident, IncidentAttachment
+from apps.common.metrics import TimedRepresentationMixin
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from . import analytics
+from .filters import IncidentFilter
+from .models import (
+    Incident,
+    IncidentAttachment,
+    ArchivedIncident,
+    Facility,
+    Department,
+    Site,
+    normalize_name
+)
 import os
 
 
+class LookupNameField(serializers.CharField):
+    """
+    Reads and writes a Facility / Department / Site foreign key by name, so
+    the API keeps exchanging plain strings. Validation only cleans the name;
+    LocationNamesMixin looks up the row, creating unknown names, on save.
+    """
+    
+    def __init__(self, model, **kwargs):
+        self.model = model
+        kwargs.setdefault('max_length', 100)
+        kwargs.setdefault('required', False)
+        kwargs.setdefault('allow_blank', True)
+        kwargs.setdefault('allow_null', True)
+        super().__init__(**kwargs)
+    
+    def run_validation(self, data=serializers.empty):
+        return normalize_name(super().run_validation(data))[0]
+    
+    def to_representation(self, value):
+        return value.name
+
+
+class LocationNamesMixin(serializers.Serializer):
+    facility = LookupNameField(Facility)
+    department = LookupNameField(Department)
+    site = LookupNameField(Site)
+    
+    def resolve_names(self, validated_data):
+        """Swap the validated names for their lookup rows"""
+        for name, field in self.fields.items():
+            if isinstance(field, LookupNameField) and name in validated_data:
+                validated_data[name] = field.model.objects.for_name(validated_data[name])
+        return validated_data
+    
+    def create(self, validated_data):
+        return super().create(self.resolve_names(validated_data))
+    
+    def update(self, instance, validated_data):
+        return super().update(instance, self.resolve_names(validated_data))
+
+
+def format_file_size(size):
+    """Format file size in human readable format"""
+    if not size:
+        return "0 B"
+    
+    for unit in ['B', 'KB', 'MB', 'GB']:
+        if size < 1024.0:
+            return f"{size:.1f} {unit}"
+        size /= 1024.0
+    return f"{size:.1f} TB"
 
 
-class IncidentAttachmentSerializer(serializers.ModelSerializer):
+class IncidentAttachmentSerializer(TimedRepresentationMixin, serializers.ModelSerializer):
     """
     Serializer for Incident Attachments
     """
@@ -32,18 +99,10 @@ class IncidentAttachmentSerializer(serializers.ModelSerializer):
     
     def get_file_size_formatted(self, obj):
         """Format file size in human readable format"""
-        if not obj.file_size:
-            return "0 B"
-        
-        size = obj.file_size
-        for unit in ['B', 'KB', 'MB', 'GB']:
-            if size < 1024.0:
-                return f"{size:.1f} {unit}"
-            size /= 1024.0
-        return f"{size:.1f} TB"
+        return format_file_size(obj.file_size)
 
 
-class IncidentListSerializer(serializers.ModelSerializer):
+class IncidentListSerializer(TimedRepresentationMixin, LocationNamesMixin, serializers.ModelSerializer):
     """
     Lightweight serializer for incident list view
     """
@@ -72,7 +131,31 @@ class IncidentListSerializer(serializers.ModelSerializer):
         return (today - obj.date_of_incident).days
 
 
-class IncidentDetailSerializer(serializers.ModelSerializer):
+class SimilarIncidentSerializer(LocationNamesMixin, serializers.ModelSerializer):
+    """
+    Likely duplicate of an incident (duplicates.py), with the Jaccard
+    similarity of their texts
+    """
+    incident_number = serializers.ReadOnlyField()
+    similarity = serializers.FloatField(read_only=True)
+    
+    class Meta:
+        model = Incident
+        fields = [
+            'id', 'incident_number', 'incident_title', 'category',
+            'date_of_incident', 'time_of_incident', 'facility', 'department',
+            'reporting_date', 'similarity'
+        ]
+
+
+class SimilarQuerySerializer(serializers.Serializer):
+    """Query parameters of the similar action"""
+    limit = serializers.IntegerField(
+        min_value=1, max_value=settings.INCIDENT_DUPLICATES['MAX_CANDIDATES'], required=False
+    )
+
+
+class IncidentDetailSerializer(TimedRepresentationMixin, LocationNamesMixin, serializers.ModelSerializer):
     """
     Detailed serializer for incident CRUD operations
     """
@@ -166,7 +249,7 @@ class IncidentDetailSerializer(serializers.ModelSerializer):
         return data
 
 
-class IncidentCreateSerializer(serializers.ModelSerializer):
+class IncidentCreateSerializer(LocationNamesMixin, serializers.ModelSerializer):
     """
     Serializer specifically for creating new incidents
     """
@@ -183,9 +266,6 @@ class IncidentCreateSerializer(serializers.ModelSerializer):
             'reported_by_type', 'reported_by_name', 'reported_by_contact'
         ]
         extra_kwargs = {
-            'facility': {'required': False, 'allow_blank': True},
-            'department': {'required': False, 'allow_blank': True},
-            'site': {'required': False, 'allow_blank': True},
             'persons_involved_details': {'required': False, 'allow_blank': True},
             'injury_damage_details': {'required': False, 'allow_blank': True},
         }
@@ -217,7 +297,7 @@ class IncidentCreateSerializer(serializers.ModelSerializer):
         return value
 
 
-class IncidentUpdateSerializer(serializers.ModelSerializer):
+class IncidentUpdateSerializer(LocationNamesMixin, serializers.ModelSerializer):
     """
     Serializer for updating existing incidents
     """
@@ -253,6 +333,56 @@ class IncidentUpdateSerializer(serializers.ModelSerializer):
         return value.strip()
 
 
+class IncidentBulkChangesSerializer(IncidentUpdateSerializer):
+    """
+    Changes of a bulk update, validated once for every selected incident.
+    Titles are unique per incident, so they can't be changed in bulk.
+    """
+    
+    class Meta(IncidentUpdateSerializer.Meta):
+        fields = [field for field in IncidentUpdateSerializer.Meta.fields if field != 'incident_title']
+
+
+class BulkSelectionSerializer(serializers.Serializer):
+    """Incidents selected by a list of ids or by the list endpoint's filters"""
+    ids = serializers.ListField(child=serializers.UUIDField(), required=False, allow_empty=False)
+    filter = serializers.DictField(required=False, allow_empty=False)
+    
+    def validate_ids(self, value):
+        limit = settings.INCIDENT_BULK['MAX_OBJECTS']
+        if len(value) > limit:
+            raise serializers.ValidationError(f"At most {limit} incidents can be changed at once")
+        return value
+    
+    def validate_filter(self, value):
+        unknown = [name for name in value if name not in IncidentFilter.base_filters]
+        if unknown:
+            raise serializers.ValidationError(
+                f"Unknown filter(s) {', '.join(unknown)}. "
+                f"Choose from: {', '.join(IncidentFilter.base_filters)}"
+            )
+        return value
+    
+    def validate(self, data):
+        if ('ids' in data) == ('filter' in data):
+            raise serializers.ValidationError("Select incidents with either ids or filter")
+        return data
+
+
+class BulkUpdateSerializer(BulkSelectionSerializer):
+    changes = serializers.DictField(allow_empty=False)
+    
+    def validate_changes(self, value):
+        changes = IncidentBulkChangesSerializer(data=value, partial=True)
+        changes.is_valid(raise_exception=True)
+        unknown = set(value) - set(changes.validated_data)
+        if unknown:
+            raise serializers.ValidationError(
+                f"These fields can't be changed in bulk: {', '.join(sorted(unknown))}"
+            )
+        return changes.validated_data
+
+
 class IncidentSummarySerializer(serializers.Serializer):
     """
     Serializer for incident statistics and summary data
@@ -280,6 +410,44 @@ class IncidentSummarySerializer(serializers.Serializer):
     )
 
 
+class AnalyticsQuerySerializer(serializers.Serializer):
+    """
+    Query parameters of the analytics action. The range defaults to the
+    last 365 days; group_by is a comma separated list of dimensions.
+    """
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    bucket = serializers.ChoiceField(choices=analytics.BUCKETS, default='month')
+    group_by = serializers.CharField(required=False, allow_blank=True, default='')
+    
+    def validate_group_by(self, value):
+        dimensions = [dimension.strip() for dimension in value.split(',') if dimension.strip()]
+        unknown = [dimension for dimension in dimensions if dimension not in analytics.DIMENSIONS]
+        if unknown:
+            raise serializers.ValidationError(
+                f"Unknown dimension(s) {', '.join(unknown)}. "
+                f"Choose from: {', '.join(analytics.DIMENSIONS)}"
+            )
+        if len(set(dimensions)) != len(dimensions):
+            raise serializers.ValidationError("Dimensions must not repeat")
+        if len(dimensions) > analytics.MAX_DIMENSIONS:
+            raise serializers.ValidationError(
+                f"At most {analytics.MAX_DIMENSIONS} dimensions can be grouped"
+            )
+        return dimensions
+    
+    def validate(self, data):
+        data['date_to'] = data.get('date_to') or timezone.now().date()
+        data['date_from'] = data.get('date_from') or data['date_to'] - timedelta(days=365)
+        if data['date_from'] > data['date_to']:
+            raise serializers.ValidationError("date_from must not be after date_to")
+        if analytics.bucket_count(data['date_from'], data['date_to'], data['bucket']) > analytics.MAX_BUCKETS:
+            raise serializers.ValidationError(
+                f"The range spans more than {analytics.MAX_BUCKETS} buckets, use a larger bucket"
+            )
+        return data
+
+
 class AttachmentUploadSerializer(serializers.ModelSerializer):
     """
     Serializer for uploading attachments to existing incidents
@@ -327,6 +495,55 @@ class AttachmentUploadSerializer(serializers.ModelSerializer):
             incident=incident,
             **validated_data
         )
+
+
+class ArchivedIncidentListSerializer(IncidentListSerializer):
+    """
+    List row of an archived incident, same shape as IncidentListSerializer
+    """
+    archived = serializers.SerializerMethodField()
+    
+    class Meta(IncidentListSerializer.Meta):
+        model = ArchivedIncident
+        fields = IncidentListSerializer.Meta.fields + ['archived', 'archived_at']
+    
+    def get_attachment_count(self, obj):
+        return obj.attachment_count
     
+    def get_archived(self, obj):
+        return True
 
 
+class ArchivedIncidentDetailSerializer(IncidentDetailSerializer):
+    """
+    Read-only detail of an archived incident. Attachments come from the
+    metadata stored at archival time.
+    """
+    attachments = serializers.SerializerMethodField()
+    archived = serializers.SerializerMethodField()
+    
+    class Meta(IncidentDetailSerializer.Meta):
+        model = ArchivedIncident
+        fields = IncidentDetailSerializer.Meta.fields + ['archived', 'archived_at']
+        read_only_fields = fields
+    
+    def get_attachments(self, obj):
+        request = self.context.get('request')
+        attachments = []
+        for attachment in obj.attachments:
+            url = default_storage.url(attachment['file'])
+            if request:
+                url = request.build_absolute_uri(url)
+            attachments.append({
+                **attachment,
+                'file': url,
+                'file_url': url,
+                'file_size_formatted': format_file_size(attachment['file_size']),
+            })
+        return attachments
+    
+    def get_attachment_count(self, obj):
+        return obj.attachment_count
+    
+    def get_archived(self, obj):
+        return True
@@ -0,0 +1,113 @@
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import detail_cache, duplicates, notifications
+from .events import publish_event, has_listeners, INCIDENT_CREATED, INCIDENT_UPDATED, INCIDENT_DELETED
+from .models import Incident, IncidentAttachment, IncidentTombstone, Facility, Department, Site
+from .tasks import delete_attachment_files, send_incident_notifications
+
+logger = logging.getLogger(__name__)
+
+
+def publish_incidents(incident_ids, event_type):
+    """Publish the committed state of incidents to the live feed, loaded in one query"""
+    from .serializers import IncidentListSerializer
+
+    if not has_listeners():
+        return
+
+    incidents = (
+        Incident.objects.filter(pk__in=incident_ids)
+        .select_related('facility', 'department').prefetch_related('attachments')
+    )
+    for incident in incidents:
+        publish_event(event_type, {
+            'id': str(incident.pk),
+            'incident': IncidentListSerializer(incident).data,
+        })
+
+
+def _publish_incident(incident_id, event_type):
+    publish_incidents([incident_id], event_type)
+
+
+def schedule_notifications():
+    try:
+        send_incident_notifications.apply_async(
+            countdown=settings.INCIDENT_NOTIFICATIONS['DIGEST_WINDOW']
+        )
+    except Exception:
+        # Still queued in the database: the beat sweep sends it
+        logger.exception("Could not schedule severe incident notifications")
+
+
+def schedule_file_deletion(names):
+    try:
+        delete_attachment_files.delay(names)
+    except Exception:
+        # The rows are gone already; the files stay behind as orphans
+        logger.exception("Could not schedule the deletion of %d attachment file(s)", len(names))
+
+
+@receiver(post_save, sender=Incident)
+def incident_saved(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is None or {'incident_title', 'description'} & set(update_fields):
+        duplicates.index_incidents([instance], replace=not created)
+    if not created:
+        detail_cache.invalidate(instance.pk)
+
+    event_type = INCIDENT_CREATED if created else INCIDENT_UPDATED
+    incident_id = instance.pk
+    transaction.on_commit(lambda: _publish_incident(incident_id, event_type))
+
+    if update_fields is None or 'injury_damage_type' in update_fields:
+        if notifications.became_severe(instance, created) and notifications.queue_notification(instance):
+            transaction.on_commit(schedule_notifications)
+        instance._saved_injury_damage_type = instance.injury_damage_type
+
+
+@receiver(post_delete, sender=Incident)
+def incident_deleted(sender, instance, **kwargs):
+    # Lets delta sync clients (sync.py) drop the incident
+    IncidentTombstone.objects.create(incident_id=instance.pk)
+    detail_cache.invalidate(instance.pk)
+    data = {'id': str(instance.pk)}
+    transaction.on_commit(lambda: publish_event(INCIDENT_DELETED, data))
+
+
+@receiver(post_save, sender=IncidentAttachment)
+@receiver(post_delete, sender=IncidentAttachment)
+def attachment_changed(sender, instance, origin=None, **kwargs):
+    # attachment_count is part of the list row, so the incident changed too
+    incident_id = instance.incident_id
+    # origin is the instance or queryset whose delete() cascaded here
+    if getattr(origin, 'model', type(origin)) is not Incident:
+        # New version for delta sync and the cached detail (detail_cache.py);
+        # not needed when the incident itself is being deleted
+        Incident.objects.filter(pk=incident_id).update(updated_at=timezone.now())
+        detail_cache.invalidate(incident_id)
+    transaction.on_commit(lambda: _publish_incident(incident_id, INCIDENT_UPDATED))
+
+
+@receiver(post_delete, sender=IncidentAttachment)
+def attachment_deleted(sender, instance, **kwargs):
+    # Also runs for attachments removed by an incident's cascade delete
+    if instance.file:
+        names = [instance.file.name]
+        transaction.on_commit(lambda: schedule_file_deletion(names))
+
+
+@receiver(post_save, sender=Facility)
+@receiver(post_delete, sender=Facility)
+@receiver(post_save, sender=Department)
+@receiver(post_delete, sender=Department)
+@receiver(post_save, sender=Site)
+@receiver(post_delete, sender=Site)
+def location_changed(sender, instance, **kwargs):
+    # Admin filter option lists (NamedLookupManager.choices)
+    sender.objects.clear_choices_cache()
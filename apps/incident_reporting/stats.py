@@ -0,0 +1,140 @@
+"""
+Building blocks for the dashboard statistics shared by the sync and async
+dashboard_stats views: every headline, per-choice and per-month count is
+expressed as a conditional Count so each set is one aggregate query.
+
+The counts are split in two queries: totals over all incidents, and the
+date-windowed counts (this month, this week, 12-month trend) which carry a
+``date_of_incident >=`` bound in their WHERE clause so that a partitioned
+incident table only scans the last year's partitions.
+"""
+import calendar
+from datetime import timedelta
+
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from apps.common.single_flight import SingleFlight, make_key
+from .models import Incident, Facility
+
+# Dashboards loading together share one computation (AGGREGATE_CACHE)
+dashboard_flight = SingleFlight('dashboard-stats', 'AGGREGATE_CACHE')
+
+
+def trend_months(today):
+    """The 12 month windows of the dashboard trend, newest first"""
+    months = []
+    for i in range(12):
+        month_date = today.replace(day=1) - timedelta(days=i*30)
+        month_start = month_date.replace(day=1)
+        if month_date.month == 12:
+            month_end = month_date.replace(year=month_date.year+1, month=1, day=1) - timedelta(days=1)
+        else:
+            month_end = month_date.replace(month=month_date.month+1, day=1) - timedelta(days=1)
+        months.append((month_date, month_start, month_end))
+    return months
+
+
+def _week_start(today):
+    return today - timedelta(days=today.weekday())
+
+
+def window_start(today, months):
+    """Earliest date any windowed count looks at"""
+    return min([_week_start(today)] + [month_start for _, month_start, _ in months])
+
+
+def total_aggregates():
+    aggregates = {'total_incidents': Count('id')}
+    for value, _ in Incident.CATEGORY_CHOICES:
+        aggregates[f'category__{value}'] = Count('id', filter=Q(category=value))
+    for value, _ in Incident.INJURY_DAMAGE_CHOICES:
+        aggregates[f'injury__{value}'] = Count('id', filter=Q(injury_damage_type=value))
+    return aggregates
+
+
+def window_aggregates(today, months):
+    """Counts to run on a queryset already filtered from window_start()"""
+    aggregates = {
+        'incidents_this_month': Count('id', filter=Q(date_of_incident__gte=today.replace(day=1))),
+        'incidents_this_week': Count('id', filter=Q(date_of_incident__gte=_week_start(today))),
+    }
+    for i, (_, month_start, month_end) in enumerate(months):
+        aggregates[f'month__{i}'] = Count('id', filter=Q(
+            date_of_incident__gte=month_start,
+            date_of_incident__lte=month_end
+        ))
+    return aggregates
+
+
+def facility_counts(queryset):
+    """
+    (facility id, incidents) rows, grouped on the integer key. Incidents
+    without a facility are counted under None.
+    """
+    return queryset.order_by().values_list('facility').annotate(count=Count('pk'))
+
+
+def dashboard_payload(counts, months, by_facility, recent_incidents):
+    monthly_trend = [
+        {
+            'month': calendar.month_name[month_date.month],
+            'year': month_date.year,
+            'count': counts[f'month__{i}'],
+            'date': month_start.isoformat()
+        }
+        for i, (month_date, month_start, _) in enumerate(months)
+    ]
+    monthly_trend.reverse()  # Show oldest to newest
+
+    return {
+        'total_incidents': counts['total_incidents'],
+        'incidents_this_month': counts['incidents_this_month'],
+        'incidents_this_week': counts['incidents_this_week'],
+        'active_incidents': counts['total_incidents'],
+        'by_category': {
+            value: counts[f'category__{value}'] for value, _ in Incident.CATEGORY_CHOICES
+        },
+        'by_injury_type': {
+            value: counts[f'injury__{value}'] for value, _ in Incident.INJURY_DAMAGE_CHOICES
+        },
+        'by_facility': by_facility,
+        'recent_incidents': recent_incidents,
+        'monthly_trend': monthly_trend,
+    }
+
+
+def dashboard():
+    """The dashboard_stats payload, computed from the database"""
+    from .serializers import IncidentListSerializer
+
+    today = timezone.now().date()
+    months = trend_months(today)
+    active = Incident.objects.filter(is_active=True)
+
+    # Totals, per-category and per-injury-type counts in one query, then the
+    # month / week / trend counts over the last year only (partition pruning)
+    counts = active.order_by().aggregate(**total_aggregates())
+    counts.update(
+        active.filter(date_of_incident__gte=window_start(today, months))
+        .order_by().aggregate(**window_aggregates(today, months))
+    )
+
+    rows = list(facility_counts(active))
+    names = dict(
+        Facility.objects.filter(pk__in=[pk for pk, _ in rows]).values_list('id', 'name')
+    )
+    # Blank facility under '', as before facilities became a lookup table
+    by_facility = {names.get(pk, ''): count for pk, count in rows}
+
+    recent_incidents = active.select_related(
+        'facility', 'department'
+    ).prefetch_related('attachments')[:10]
+    recent = IncidentListSerializer(recent_incidents, many=True).data
+
+    return dashboard_payload(counts, months, by_facility, recent)
+
+
+def shared_dashboard():
+    """dashboard(), computed once for all the dashboards asking at the same time"""
+    return dashboard_flight.get(make_key('dashboard_stats'), dashboard)
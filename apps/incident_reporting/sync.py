@@ -0,0 +1,120 @@
+"""
+Delta sync of the incident list (``GET incidents/changes/?token=...``).
+
+A client starts without a token and pages through every incident, then keeps
+the last ``next_token`` and later asks only for what changed since: the
+incidents created or updated after the token's position, walked in keyset
+order over the (updated_at, id) index, and the ids of incidents deleted or
+archived since, from the IncidentTombstone table. The cost of a sync grows
+with the number of changes, not with the size of the table.
+
+Changes younger than INCIDENT_SYNC['SETTLE_SECONDS'] are left for the next
+sync: updated_at is set before the saving transaction commits, so a row of a
+slower transaction could otherwise appear behind a position already handed
+out. Tombstones are compacted after TOMBSTONE_DAYS; a token older than that
+can have missed deletions and gets ``TokenExpired`` (the client resyncs).
+"""
+import base64
+import binascii
+import json
+import uuid
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Incident, IncidentTombstone
+
+
+class InvalidToken(ValueError):
+    pass
+
+
+class TokenExpired(Exception):
+    pass
+
+
+def _dump_position(position):
+    return position and [position[0].isoformat(), str(position[1])]
+
+
+def _load_position(value):
+    return value and (datetime.fromisoformat(value[0]), uuid.UUID(value[1]))
+
+
+def encode_token(incident_position, tombstone_position):
+    """Token for the keyset positions (updated_at, id) and (deleted_at, incident_id)"""
+    state = {'u': _dump_position(incident_position), 'd': _dump_position(tombstone_position)}
+    return base64.urlsafe_b64encode(json.dumps(state).encode()).decode().rstrip('=')
+
+
+def decode_token(token):
+    try:
+        state = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+        incident_position, tombstone_position = _load_position(state['u']), _load_position(state['d'])
+    except (binascii.Error, ValueError, TypeError, KeyError, IndexError):
+        raise InvalidToken('Malformed sync token')
+    if tombstone_position is None:
+        raise InvalidToken('Malformed sync token')
+    return incident_position, tombstone_position
+
+
+def after(queryset, time_field, id_field, position):
+    """Rows strictly after position in (time_field, id_field) order"""
+    if position is None:
+        return queryset
+    moment, pk = position
+    # A range on the leading index column, minus the ties already seen
+    return queryset.filter(**{f'{time_field}__gte': moment}).exclude(
+        Q(**{time_field: moment}) & Q(**{f'{id_field}__lte': pk})
+    )
+
+
+def changes(token=None, limit=None, now=None):
+    """
+    One page of changes after ``token``. Returns (changed_ids, deleted_ids,
+    next_token, has_more), changed_ids in (updated_at, id) order.
+    """
+    options = settings.INCIDENT_SYNC
+    limit = min(limit or options['PAGE_SIZE'], options['MAX_PAGE_SIZE'])
+    now = now or timezone.now()
+    horizon = now - timedelta(seconds=options['SETTLE_SECONDS'])
+
+    if token:
+        incident_position, tombstone_position = decode_token(token)
+        if tombstone_position[0] < now - timedelta(days=options['TOMBSTONE_DAYS']):
+            raise TokenExpired('Sync token is too old, start a full sync')
+    else:
+        # A full sync: deletions before now are already reflected
+        incident_position, tombstone_position = None, (horizon, uuid.UUID(int=0))
+
+    rows = list(
+        after(Incident.objects.filter(updated_at__lt=horizon), 'updated_at', 'id', incident_position)
+        .order_by('updated_at', 'id').values_list('updated_at', 'id')[:limit + 1]
+    )
+    tombstones = list(
+        after(
+            IncidentTombstone.objects.filter(deleted_at__lt=horizon),
+            'deleted_at', 'incident_id', tombstone_position
+        ).order_by('deleted_at', 'incident_id').values_list('deleted_at', 'incident_id')[:limit + 1]
+    )
+    has_more = len(rows) > limit or len(tombstones) > limit
+    if len(tombstones) > limit:
+        tombstones = tombstones[:limit]
+        next_tombstone = tombstones[-1]
+    else:
+        # Every deletion before the horizon was seen: move up to it, so an
+        # idle client's token doesn't age out while nothing is deleted
+        next_tombstone = (horizon, uuid.UUID(int=0))
+    rows = rows[:limit]
+
+    next_token = encode_token(rows[-1] if rows else incident_position, next_tombstone)
+    return [pk for _, pk in rows], [pk for _, pk in tombstones], next_token, has_more
+
+
+def compact_tombstones(now=None):
+    """Delete tombstones older than TOMBSTONE_DAYS. Returns the number deleted."""
+    now = now or timezone.now()
+    cutoff = now - timedelta(days=settings.INCIDENT_SYNC['TOMBSTONE_DAYS'])
+    return IncidentTombstone.objects.filter(deleted_at__lt=cutoff).delete()[0]
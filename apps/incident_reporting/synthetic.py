@@ -0,0 +1,266 @@
+"""
+Synthetic incident data for benchmarks.
+
+Generates incidents with realistic, skewed distributions: a few large
+facilities report most incidents, near-misses and unsafe conditions dominate
+while fatalities are rare, dates follow a seasonal curve over several years,
+and most incidents have zero to a handful of attachments.
+
+Free text comes from pools pre-generated with Faker, so millions of rows can
+be produced without calling Faker per row.
+"""
+import random
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+from faker import Faker
+
+from .models import (
+    Incident, IncidentAttachment, IncidentNotification, IncidentSimilarityBucket,
+    Facility, Department, Site
+)
+
+
+SIZES = {
+    '10k': 10_000,
+    '100k': 100_000,
+    '1m': 1_000_000,
+}
+
+CATEGORY_WEIGHTS = {
+    'NEAR_MISS': 45,
+    'UNSAFE_CONDITION': 25,
+    'UNSAFE_ACT': 18,
+    'INCIDENT': 12,
+}
+
+SUB_CATEGORY_WEIGHTS = {
+    None: 20,
+    'SPILL': 16,
+    'EQUIPMENT_FAILURE': 15,
+    'ELECTRICAL': 10,
+    'STRUCTURAL': 8,
+    'EXPOSURE': 8,
+    'CHEMICAL_LEAK': 7,
+    'ENVIRONMENTAL': 6,
+    'FIRE': 5,
+    'OTHER': 4,
+    'EXPLOSION': 1,
+}
+
+INJURY_WEIGHTS = {
+    'NO_INJURY': 40,
+    'NEAR_MISS': 25,
+    'MINOR_INJURY': 18,
+    'PROPERTY_DAMAGE': 9,
+    'ENVIRONMENTAL_IMPACT': 5,
+    'MAJOR_INJURY': 2.7,
+    'FATALITY': 0.3,
+}
+
+WASTE_WEIGHTS = {
+    'NOT_APPLICABLE': 70,
+    'HAZARDOUS': 8,
+    'CHEMICAL': 7,
+    'NON_HAZARDOUS': 6,
+    'CONSTRUCTION': 4,
+    'E_WASTE': 3,
+    'BIOMEDICAL': 2,
+}
+
+PERSON_WEIGHTS = {
+    'EMPLOYEE': 60,
+    'CONTRACTOR': 28,
+    'THIRD_PARTY': 7,
+    'VISITOR': 5,
+}
+
+REPORTER_WEIGHTS = {
+    'EMPLOYEE': 62,
+    'CONTRACTOR': 20,
+    'IOT_SENSOR': 15,
+    'VISITOR': 3,
+}
+
+ATTACHMENT_TYPE_WEIGHTS = {
+    'PHOTO': 55,
+    'DOCUMENT': 20,
+    'VIDEO': 12,
+    'VOICE_NOTE': 10,
+    'OTHER': 3,
+}
+
+ATTACHMENT_EXTENSIONS = {
+    'PHOTO': '.jpg',
+    'DOCUMENT': '.pdf',
+    'VIDEO': '.mp4',
+    'VOICE_NOTE': '.m4a',
+    'OTHER': '.txt',
+}
+
+# Number of attachments per incident
+ATTACHMENT_COUNT_WEIGHTS = {0: 45, 1: 25, 2: 14, 3: 9, 4: 4, 5: 3}
+
+# Relative incident volume per month, January first (more in summer and
+# during the pre-monsoon maintenance season)
+MONTH_WEIGHTS = [7, 7, 8, 9, 10, 10, 9, 8, 8, 8, 8, 8]
+
+WASTE_CODES = [
+    'Hazardous Waste 5.1 - Used Oil',
+    'Hazardous Waste 33.1 - Empty Containers',
+    'Hazardous Waste 35.3 - Chemical Sludge',
+    'Biomedical Category Yellow',
+    'E-Waste Category ITEW1',
+    'C&D Waste - Concrete',
+]
+
+
+def _choices(weights):
+    return list(weights), list(weights.values())
+
+
+class IncidentGenerator:
+    """Builds unsaved Incident / IncidentAttachment instances"""
+
+    def __init__(self, seed=0, years=5, facilities=40, pool_size=2000):
+        self.random = random.Random(seed)
+        self.faker = Faker()
+        self.faker.seed_instance(seed)
+        self.today = timezone.now().date()
+        self.start = self.today - timedelta(days=365 * years)
+
+        # Zipf-like facility sizes: the first few sites produce most reports
+        facility_names = list(dict.fromkeys(
+            f"{self.faker.city()} Plant" for _ in range(facilities)
+        ))
+        self.facilities = self._lookups(Facility, facility_names)
+        self.facility_weights = [1 / (rank + 1) for rank in range(len(self.facilities))]
+        self.departments = self._lookups(Department, [
+            'Production', 'Maintenance', 'Warehouse', 'Logistics', 'Utilities',
+            'Quality Control', 'R&D Lab', 'Packaging', 'Boiler House', 'Admin',
+        ])
+        self.sites = self._lookups(Site, [f"Block {letter}{n}" for letter in 'ABCDEF' for n in range(1, 6)])
+        self.titles = [self.faker.sentence(nb_words=5).rstrip('.') for _ in range(pool_size)]
+        self.descriptions = [self.faker.paragraph(nb_sentences=4) for _ in range(pool_size)]
+        self.details = [self.faker.sentence(nb_words=10) for _ in range(pool_size)]
+        self.names = [self.faker.name() for _ in range(pool_size)]
+        self.contacts = [self.faker.phone_number() for _ in range(pool_size)]
+        self.sensors = [f"IoT-{self.faker.bothify('??-####').upper()}" for _ in range(200)]
+
+        self._days = (self.today - self.start).days
+        self._categories = _choices(CATEGORY_WEIGHTS)
+        self._sub_categories = _choices(SUB_CATEGORY_WEIGHTS)
+        self._injuries = _choices(INJURY_WEIGHTS)
+        self._wastes = _choices(WASTE_WEIGHTS)
+        self._persons = _choices(PERSON_WEIGHTS)
+        self._reporters = _choices(REPORTER_WEIGHTS)
+        self._attachment_types = _choices(ATTACHMENT_TYPE_WEIGHTS)
+        self._attachment_counts = _choices(ATTACHMENT_COUNT_WEIGHTS)
+
+    @staticmethod
+    def _lookups(model, names):
+        rows = model.objects.for_names(names)
+        return [rows[name] for name in names]
+
+    def _pick(self, options):
+        values, weights = options
+        return self.random.choices(values, weights)[0]
+
+    def _incident_date(self):
+        # Rejection-sample a uniform day against the seasonal month weights
+        top = max(MONTH_WEIGHTS)
+        while True:
+            day = self.start + timedelta(days=self.random.randrange(self._days + 1))
+            if self.random.random() * top < MONTH_WEIGHTS[day.month - 1]:
+                return day
+
+    def incident(self, number):
+        r = self.random
+        incident_date = self._incident_date()
+        incident_time = time(r.randrange(24), r.randrange(60))
+        reported_by_type = self._pick(self._reporters)
+        waste_type = self._pick(self._wastes)
+        reporting_date = timezone.make_aware(
+            datetime.combine(incident_date, incident_time)
+            + timedelta(minutes=r.randrange(5, 60 * 48))
+        )
+
+        return Incident(
+            incident_title=f"{r.choice(self.titles)} #{number}",
+            date_of_incident=incident_date,
+            time_of_incident=incident_time,
+            facility=r.choices(self.facilities, self.facility_weights)[0],
+            department=r.choice(self.departments) if r.random() < 0.9 else None,
+            site=r.choice(self.sites) if r.random() < 0.7 else None,
+            category=self._pick(self._categories),
+            sub_category=self._pick(self._sub_categories),
+            description=r.choice(self.descriptions),
+            persons_involved_type=self._pick(self._persons),
+            persons_involved_details=r.choice(self.details) if r.random() < 0.5 else None,
+            injury_damage_type=self._pick(self._injuries),
+            injury_damage_details=r.choice(self.details) if r.random() < 0.4 else None,
+            waste_type=waste_type,
+            waste_category_code=None if waste_type == 'NOT_APPLICABLE' else r.choice(WASTE_CODES),
+            reported_by_type=reported_by_type,
+            reported_by_name=(
+                r.choice(self.sensors) if reported_by_type == 'IOT_SENSOR' else r.choice(self.names)
+            ),
+            reported_by_contact=r.choice(self.contacts) if r.random() < 0.6 else None,
+            reporting_date=min(reporting_date, timezone.now()),
+            is_active=r.random() < 0.93,
+        )
+
+    def attachments(self, incident):
+        attachments = []
+        for n in range(self._pick(self._attachment_counts)):
+            attachment_type = self._pick(self._attachment_types)
+            filename = f"evidence_{n + 1}{ATTACHMENT_EXTENSIONS[attachment_type]}"
+            attachments.append(IncidentAttachment(
+                incident=incident,
+                file=f"incidents/{incident.id}/attachments/{filename}",
+                filename=filename,
+                file_size=int(self.random.lognormvariate(12, 1.2)),
+                attachment_type=attachment_type,
+                description=self.random.choice(self.details) if self.random.random() < 0.3 else None,
+            ))
+        return attachments
+
+
+def generate(count, batch_size=5000, seed=0, years=5, start_number=1, progress=None):
+    """
+    Bulk-insert ``count`` incidents (plus attachments) in batches.
+    Returns (incidents_created, attachments_created).
+    """
+    generator = IncidentGenerator(seed=seed, years=years)
+    incidents_created = attachments_created = 0
+
+    for batch_start in range(0, count, batch_size):
+        batch = [
+            generator.incident(start_number + batch_start + i)
+            for i in range(min(batch_size, count - batch_start))
+        ]
+        Incident.objects.bulk_create(batch, batch_size=batch_size)
+        attachments = [a for incident in batch for a in generator.attachments(incident)]
+        IncidentAttachment.objects.bulk_create(attachments, batch_size=batch_size)
+
+        incidents_created += len(batch)
+        attachments_created += len(attachments)
+        if progress:
+            progress(incidents_created, attachments_created)
+
+    return incidents_created, attachments_created
+
+
+def flush():
+    """
+    Delete every incident with its attachments, notifications and
+    duplicate-detection buckets. Raw deletes, as in archive.py: per-row
+    signals would publish a live feed event and leave a sync tombstone for
+    each of possibly millions of rows. Attachment files stay in storage.
+    Returns the number of incidents deleted.
+    """
+    with transaction.atomic():
+        for model in (IncidentAttachment, IncidentNotification, IncidentSimilarityBucket):
+            model.objects.all()._raw_delete(model.objects.db)
+        return Incident.objects.all()._raw_delete(Incident.objects.db)
@@ -0,0 +1,42 @@
+"""
+Background incident work. Queues are assigned in settings.CELERY_TASK_ROUTES.
+
+Tasks that are safe to run twice use acks_late, so a worker dying mid-task
+leaves the message to be redelivered instead of losing it. Fire-and-forget
+tasks don't store results.
+"""
+from celery import shared_task
+from django.core.files.storage import default_storage
+
+from . import archive, notifications, partitioning, sync
+
+
+@shared_task(acks_late=True, reject_on_worker_lost=True, ignore_result=True)
+def ensure_incident_partitions():
+    """Create the next date_of_incident partitions before rows arrive for them"""
+    return partitioning.ensure_partitions()
+
+
+@shared_task(acks_late=True, reject_on_worker_lost=True, ignore_result=True)
+def archive_incidents(limit=None):
+    """Move incidents outside the retention policy to the archive table"""
+    return archive.archive_incidents(limit=limit)
+
+
+@shared_task(acks_late=True, reject_on_worker_lost=True, ignore_result=True)
+def compact_incident_tombstones():
+    """Drop deletion tombstones that no valid sync token can still need"""
+    return sync.compact_tombstones()
+
+
+@shared_task(acks_late=True, reject_on_worker_lost=True, ignore_result=True)
+def delete_attachment_files(names):
+    """Remove attachment files from storage once their rows are deleted"""
+    for name in names:
+        default_storage.delete(name)
+
+
+@shared_task(acks_late=True, reject_on_worker_lost=True, ignore_result=True)
+def send_incident_notifications():
+    """E-mail pending severe incidents: one message or digest per facility"""
+    return notifications.send_pending()
@@ -1,3 +1,1547 @@
-from django.test import TestCase
+import asyncio
+import csv
+import hashlib
+import io
+import json
+import re
+import smtplib
+import socketserver
+import tempfile
+import threading
+from datetime import date, time, timedelta
+from unittest import mock, skipUnless
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.mail.backends.smtp import EmailBackend as SMTPBackend
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from apps.common import admin_jobs, idempotency
+from apps.common.tiered_cache import TieredCache
+from apps.common.models import AdminJob
+from apps.common.query_inspector import detect_duplicate_queries
+from coreAPI.celery import app as celery_app, configure_queue_worker
+from . import (
+    analytics, archive, async_views, detail_cache, duplicates, events, importer, notifications, partitioning, sync,
+    synthetic
+)
+from .admin_actions import DeactivateIncidents, DeleteIncidents, ExportIncidents
+from .models import (
+    Incident, IncidentAttachment, IncidentNotification, IncidentTombstone, IncidentSimilarityBucket,
+    ArchivedIncident, Department, Facility, SafetyContact, format_incident_number
+)
 
 # Create your tests here.
+
+
+API = '/api/v1/incident_reporting/'
+
+
+def make_incident(index, **kwargs):
+    data = {
+        'incident_title': f'Incident {index}',
+        'date_of_incident': date.today() - timedelta(days=index),
+        'time_of_incident': time(9, 30),
+        'facility': Facility.objects.for_name(f'Facility {index % 3}'),
+        'category': Incident.CATEGORY_CHOICES[index % 4][0],
+        'description': 'Test incident',
+        'persons_involved_type': 'EMPLOYEE',
+        'injury_damage_type': Incident.INJURY_DAMAGE_CHOICES[index % 7][0],
+        'reported_by_type': 'EMPLOYEE',
+        'reported_by_name': 'Tester',
+    }
+    data.update(kwargs)
+    return Incident.objects.create(**data)
+
+
+class IncidentQueryCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for index in range(12):
+            incident = make_incident(index)
+            IncidentAttachment.objects.bulk_create([
+                IncidentAttachment(
+                    incident=incident, file=f'incidents/{incident.id}/a.txt',
+                    filename='a.txt', file_size=10, attachment_type='DOCUMENT'
+                )
+            ])
+
+    def test_read_endpoints_do_not_repeat_queries(self):
+        for path in ['incidents/', 'incidents/dashboard_stats/', 'async/incidents/']:
+            with self.subTest(path=path), detect_duplicate_queries(threshold=3):
+                response = self.client.get(API + path)
+                self.assertEqual(response.status_code, 200)
+
+
+class LocationLookupTests(TestCase):
+    payload = {
+        'date_of_incident': date.today().isoformat(),
+        'time_of_incident': '10:30',
+        'department': 'Maintenance',
+        'category': 'NEAR_MISS',
+        'description': 'Oil spill near the loading bay',
+        'persons_involved_type': 'EMPLOYEE',
+        'injury_damage_type': 'NO_INJURY',
+        'reported_by_type': 'EMPLOYEE',
+        'reported_by_name': 'Tester',
+    }
+
+    def create(self, title, facility):
+        return self.client.post(API + 'incidents/', {
+            **self.payload, 'incident_title': title, 'facility': facility
+        }, content_type='application/json')
+
+    def test_spelling_variants_share_one_facility(self):
+        first = self.create('Spill 1', 'North Plant')
+        second = self.create('Spill 2', '  north   PLANT ')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second.json()['incident']['facility'], 'North Plant')
+        self.assertEqual(Facility.objects.count(), 1)
+
+        response = self.client.get(API + 'incidents/', {'facility': 'NORTH plant'})
+        self.assertEqual(response.json()['count'], 2)
+        self.assertEqual(response.json()['results'][0]['facility'], 'North Plant')
+
+        stats = self.client.get(API + 'incidents/dashboard_stats/').json()
+        self.assertEqual(stats['by_facility'], {'North Plant': 2})
+
+    def test_blank_facility_is_stored_as_null(self):
+        response = self.create('Spill 3', '')
+        self.assertEqual(response.status_code, 201)
+        self.assertIsNone(response.json()['incident']['facility'])
+        self.assertFalse(Facility.objects.exists())
+
+        self.create('Spill 4', 'North Plant')
+        for path in ['incidents/dashboard_stats/', 'async/incidents/dashboard_stats/']:
+            with self.subTest(path=path):
+                stats = self.client.get(API + path).json()
+                self.assertEqual(stats['by_facility'], {'': 1, 'North Plant': 1})
+
+    def test_rejected_requests_create_no_lookup_rows(self):
+        future = (date.today() + timedelta(days=1)).isoformat()
+        response = self.client.post(API + 'incidents/', {
+            **self.payload, 'incident_title': 'Spill 4', 'facility': 'Ghost Plant', 'date_of_incident': future
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+        incident = make_incident(0)
+        for body in [
+            {'ids': [str(incident.pk)], 'changes': {'facility': 'Ghost Plant', 'category': 'BOGUS'}},
+            {'changes': {'facility': 'Ghost Plant'}},
+        ]:
+            with self.subTest(body=body):
+                response = self.client.patch(API + 'incidents/bulk/', body, content_type='application/json')
+                self.assertEqual(response.status_code, 400)
+        self.assertFalse(Facility.objects.filter(key='ghost plant').exists())
+        self.assertFalse(Department.objects.filter(key='maintenance').exists())
+
+        response = self.client.patch(API + 'incidents/bulk/', {
+            'ids': [str(incident.pk)], 'changes': {'facility': ' ghost  Plant'}
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        incident.refresh_from_db()
+        self.assertEqual(incident.facility.name, 'ghost Plant')
+
+
+class IncidentDetailCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.incident = make_incident(0, category='NEAR_MISS')
+        IncidentAttachment.objects.bulk_create([
+            IncidentAttachment(
+                incident=cls.incident, file=f'incidents/{cls.incident.id}/a.txt',
+                filename='a.txt', file_size=10, attachment_type='DOCUMENT'
+            )
+        ])
+
+    def setUp(self):
+        cache.clear()
+        detail_cache.detail_cache.clear()
+        self.url = API + f'incidents/{self.incident.pk}/'
+
+    def test_repeat_views_are_served_from_the_cache(self):
+        first = self.client.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get(self.url)
+        self.assertEqual(second.json(), first.json())
+        # Only the updated_at lookup
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(detail_cache.detail_cache.stats()['entries'], 1)
+
+        with override_settings(INCIDENT_DETAIL_CACHE={**settings.INCIDENT_DETAIL_CACHE, 'ENABLED': False}):
+            self.assertEqual(self.client.get(self.url).json(), first.json())
+
+    @override_settings(ALLOWED_HOSTS=['testserver', 'reports.example.com'])
+    def test_file_urls_follow_the_request_host(self):
+        self.client.get(self.url)
+        attachment = self.client.get(self.url, HTTP_HOST='reports.example.com').json()['attachments'][0]
+        self.assertTrue(attachment['file_url'].startswith('http://reports.example.com/'))
+        self.assertEqual(attachment['file'], attachment['file_url'])
+
+    def test_shared_tier_fills_other_processes(self):
+        self.client.get(self.url)
+        detail_cache.detail_cache.clear()  # another worker
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertEqual(len(queries), 1)
+
+    def test_writes_change_the_payload(self):
+        self.client.get(self.url)
+        self.client.patch(self.url, {'category': 'INCIDENT'}, content_type='application/json')
+        self.assertEqual(self.client.get(self.url).json()['category'], 'INCIDENT')
+
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            response = self.client.post(self.url + 'upload_attachment/', {
+                'file': SimpleUploadedFile('photo.jpg', b'jpeg'), 'attachment_type': 'PHOTO',
+            })
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual(self.client.get(self.url).json()['attachment_count'], 2)
+
+        # Bulk updates skip the signals; the new updated_at is enough
+        self.client.patch(API + 'incidents/bulk/', {
+            'ids': [str(self.incident.pk)], 'changes': {'category': 'UNSAFE_ACT'}
+        }, content_type='application/json')
+        self.assertEqual(self.client.get(self.url).json()['category'], 'UNSAFE_ACT')
+
+        self.client.delete(self.url)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+        self.assertEqual(self.client.get(API + 'incidents/not-a-uuid/').status_code, 404)
+
+    def test_lru_is_bounded(self):
+        lru = TieredCache('test-lru', max_entries=2, timeout=60)
+        for key in 'abc':
+            lru.set(key, 1, {'key': key * 10})
+        self.assertEqual(list(lru.entries), ['b', 'c'])
+        self.assertEqual(lru.stats()['bytes'], 2 * len(b'{"key":"bbbbbbbbbb"}'))
+        # Evicted locally, still shared
+        self.assertEqual(lru.get('a', 1), {'key': 'a' * 10})
+        self.assertIsNone(lru.get('a', 2))
+        lru.discard('a')
+        self.assertIsNone(lru.get('a', 1))
+
+
+class DuplicateDetectionTests(TestCase):
+    spill = (
+        'Diesel spill at loading bay 3',
+        'A forklift punctured a diesel drum while unloading the morning delivery. '
+        'About 40 litres spread towards the drain before it was contained with absorbent pads.'
+    )
+    unrelated = [
+        ('Electrical fire in the compressor room', 'Smoke from panel B2 after a breaker failed to trip.'),
+        ('Contractor fell from a ladder', 'Ladder slipped on a wet floor in the paint shop, minor bruises.'),
+        ('Ammonia smell near cold storage', 'Leaking valve on the refrigeration line, area ventilated.'),
+    ]
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.original = make_incident(0, incident_title=cls.spill[0], description=cls.spill[1])
+        cls.others = [
+            make_incident(index, incident_title=title, description=description)
+            for index, (title, description) in enumerate(cls.unrelated, start=1)
+        ]
+
+    def payload(self, title, description):
+        return {
+            'incident_title': title,
+            'description': description,
+            'date_of_incident': date.today().isoformat(),
+            'time_of_incident': '08:15',
+            'category': 'INCIDENT',
+            'sub_category': 'SPILL',
+            'persons_involved_type': 'EMPLOYEE',
+            'injury_damage_type': 'NO_INJURY',
+            'reported_by_type': 'EMPLOYEE',
+            'reported_by_name': 'Second reporter',
+        }
+
+    def test_create_returns_candidate_duplicates(self):
+        response = self.client.post(API + 'incidents/', self.payload(
+            'Diesel spill at loading bay three',
+            'Forklift punctured a diesel drum while unloading the morning delivery; '
+            'about 40 litres spread towards the drain before it was contained with absorbent pads.'
+        ), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        matches = response.json()['possible_duplicates']
+        self.assertEqual([match['id'] for match in matches], [str(self.original.pk)])
+        self.assertGreaterEqual(matches[0]['similarity'], settings.INCIDENT_DUPLICATES['THRESHOLD'])
+
+        response = self.client.post(API + 'incidents/', self.payload(
+            'Cracked windscreen on site vehicle', 'A stone hit the windscreen of van 12 on the access road.'
+        ), content_type='application/json')
+        self.assertEqual(response.json()['possible_duplicates'], [])
+
+    def test_similar_action(self):
+        duplicate = make_incident(
+            10, incident_title='Diesel spill - loading bay 3', description=self.spill[1].replace('40', 'forty')
+        )
+        response = self.client.get(API + f'incidents/{self.original.pk}/similar/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([match['id'] for match in response.json()['results']], [str(duplicate.pk)])
+
+        self.assertEqual(self.client.get(API + f'incidents/{self.others[0].pk}/similar/').json()['results'], [])
+        response = self.client.get(API + f'incidents/{self.original.pk}/similar/', {'limit': 0})
+        self.assertEqual(response.status_code, 400)
+        missing = '0190d4a0-0000-7000-8000-000000000000'
+        self.assertEqual(self.client.get(API + f'incidents/{missing}/similar/').status_code, 404)
+
+    def test_candidates_come_from_the_bucket_index(self):
+        bands = settings.INCIDENT_DUPLICATES['BANDS']
+        self.assertEqual(IncidentSimilarityBucket.objects.filter(incident=self.original).count(), bands)
+        with CaptureQueriesContext(connection) as queries:
+            matches = duplicates.find_similar(*self.spill)
+        self.assertEqual([incident for incident, _ in matches], [self.original])
+        # Only the candidates are loaded, never the whole table
+        self.assertEqual(len(queries), 2)
+        self.assertIn(str(self.original.pk).replace('-', ''), queries[1]['sql'].replace('-', ''))
+        for other in self.others:
+            self.assertNotIn(str(other.pk).replace('-', ''), queries[1]['sql'].replace('-', ''))
+
+    def test_index_follows_writes(self):
+        response = self.client.patch(API + f'incidents/{self.others[0].pk}/', {
+            'incident_title': 'Diesel spill at loading bay 3 (second report)', 'description': self.spill[1],
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [incident for incident, _ in duplicates.similar_to(self.original)], [self.others[0]]
+        )
+
+        self.client.delete(
+            API + 'incidents/bulk/', {'ids': [str(self.others[0].pk)]}, content_type='application/json'
+        )
+        self.others[1].delete()
+        Incident.objects.filter(pk=self.others[2].pk).update(date_of_incident=date(2000, 1, 1))
+        archive.archive_incidents()
+        remaining = set(IncidentSimilarityBucket.objects.values_list('incident_id', flat=True))
+        self.assertEqual(remaining, {self.original.pk})
+
+    def test_rebuild(self):
+        IncidentSimilarityBucket.objects.all().delete()
+        self.assertEqual(duplicates.index_all(batch_size=2), 4)
+        self.assertEqual(
+            IncidentSimilarityBucket.objects.count(), 4 * settings.INCIDENT_DUPLICATES['BANDS']
+        )
+        self.assertEqual([incident for incident, _ in duplicates.find_similar(*self.spill)], [self.original])
+
+
+class BulkChangeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.incidents = [
+            make_incident(index, category='NEAR_MISS', injury_damage_type='NO_INJURY') for index in range(5)
+        ]
+        cls.ids = [str(incident.pk) for incident in cls.incidents]
+
+    def bulk(self, method, body, **kwargs):
+        return getattr(self.client, method)(
+            API + 'incidents/bulk/', body, content_type='application/json', **kwargs
+        )
+
+    @override_settings(INCIDENT_BULK={'MAX_OBJECTS': 100, 'CHUNK_SIZE': 2})
+    def test_update_by_ids_in_chunks(self):
+        before = timezone.now()
+        missing = '0190d4a0-0000-7000-8000-000000000000'
+        with CaptureQueriesContext(connection) as queries:
+            response = self.bulk('patch', {'ids': self.ids + [missing], 'changes': {'category': 'INCIDENT'}})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'count': 5, 'results': {**{pk: 'updated' for pk in self.ids}, missing: 'not_found'},
+        })
+        self.assertEqual(sum(query['sql'].startswith('UPDATE') for query in queries), 3)
+        self.assertFalse(any('LIKE' in query['sql'] for query in queries))
+        self.assertFalse(Incident.objects.exclude(category='INCIDENT').exists())
+        # Delta sync picks the changes up
+        self.assertFalse(Incident.objects.filter(updated_at__lt=before).exists())
+
+    def test_update_by_filter(self):
+        facility = self.incidents[1].facility
+        response = self.bulk('patch', {'filter': {'facility': facility.name}, 'changes': {'is_active': False}})
+        self.assertEqual(response.status_code, 200)
+        inactive = set(Incident.objects.filter(is_active=False).values_list('pk', flat=True))
+        self.assertEqual(inactive, set(Incident.objects.filter(facility=facility).values_list('pk', flat=True)))
+        self.assertEqual(set(response.json()['results']), {str(pk) for pk in inactive})
+
+    def test_date_change_renumbers_and_severity_queues_notifications(self):
+        day = date(2024, 3, 1)
+        response = self.bulk('patch', {
+            'ids': self.ids[:2], 'changes': {'date_of_incident': day.isoformat(), 'injury_damage_type': 'FATALITY'}
+        })
+        self.assertEqual(response.status_code, 200)
+        for incident in Incident.objects.filter(pk__in=self.ids[:2]):
+            self.assertEqual(incident.date_of_incident, day)
+            self.assertEqual(incident.incident_number, format_incident_number(incident.pk, day))
+        self.assertEqual(IncidentNotification.objects.count(), 2)
+
+    def test_already_severe_incidents_are_not_notified_again(self):
+        Incident.objects.filter(pk=self.ids[0]).update(injury_damage_type='MAJOR_INJURY')
+        with mock.patch('apps.incident_reporting.bulk.schedule_notifications'):
+            response = self.bulk('patch', {'ids': self.ids[:2], 'changes': {'injury_damage_type': 'FATALITY'}})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            list(IncidentNotification.objects.values_list('incident_id', flat=True)), [self.incidents[1].pk]
+        )
+
+    def test_delete_cleans_up_like_single_deletes(self):
+        IncidentAttachment.objects.bulk_create([
+            IncidentAttachment(
+                incident=self.incidents[0], file=f'incidents/{self.incidents[0].id}/a.txt',
+                filename='a.txt', file_size=10, attachment_type='DOCUMENT'
+            )
+        ])
+        with mock.patch('apps.incident_reporting.signals.delete_attachment_files') as task, \
+                mock.patch('apps.incident_reporting.bulk.publish_event') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.bulk('delete', {'ids': self.ids[:3]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], {pk: 'deleted' for pk in self.ids[:3]})
+        self.assertEqual(Incident.objects.count(), 2)
+        self.assertFalse(IncidentAttachment.objects.exists())
+        self.assertEqual(IncidentTombstone.objects.count(), 3)
+        task.delay.assert_called_once_with([f'incidents/{self.incidents[0].id}/a.txt'])
+        self.assertEqual(set(publish.call_args.args[1]['ids']), set(self.ids[:3]))
+
+    def test_retry_with_the_same_key_is_replayed(self):
+        body = {'ids': self.ids[:1]}
+        first = self.bulk('delete', body, headers={'Idempotency-Key': 'bulk-1'})
+        retry = self.bulk('delete', body, headers={'Idempotency-Key': 'bulk-1'})
+        self.assertEqual(retry.headers['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry.json()['results'], {self.ids[0]: 'deleted'})
+
+    @override_settings(INCIDENT_BULK={'MAX_OBJECTS': 3, 'CHUNK_SIZE': 2})
+    def test_invalid_requests(self):
+        for body, field in [
+            (
+                {'ids': self.ids[:1], 'filter': {'category': 'NEAR_MISS'}, 'changes': {'is_active': False}},
+                'non_field_errors'
+            ),
+            ({'ids': self.ids[:1], 'changes': {'incident_title': 'Same for all'}}, 'changes'),
+            ({'ids': self.ids[:1], 'changes': {'category': 'NOT_A_CATEGORY'}}, 'changes'),
+            ({'filter': {'description': 'spill'}, 'changes': {'is_active': False}}, 'filter'),
+            ({'filter': {'category': 'NEAR_MISS'}, 'changes': {'is_active': False}}, 'filter'),
+            ({'ids': self.ids, 'changes': {'is_active': False}}, 'ids'),
+        ]:
+            with self.subTest(body=body):
+                response = self.bulk('patch', body)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(field, response.json())
+        self.assertFalse(Incident.objects.filter(is_active=False).exists())
+
+
+class BackgroundAdminActionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        cls.incidents = [make_incident(index) for index in range(5)]
+
+    def start(self, action_class):
+        with mock.patch('apps.common.tasks.run_admin_job') as task:
+            with self.captureOnCommitCallbacks(execute=True):
+                job = admin_jobs.enqueue(action_class, Incident.objects.all(), self.admin)
+        task.delay.assert_called_once_with(str(job.pk))
+        return job
+
+    def test_action_hands_the_selection_to_a_task(self):
+        self.client.force_login(self.admin)
+        with mock.patch('apps.common.tasks.run_admin_job') as task:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post('/admin/incident_reporting/incident/', {
+                    'action': 'DeactivateIncidents',
+                    '_selected_action': [str(incident.pk) for incident in self.incidents[:3]],
+                })
+        self.assertEqual(response.status_code, 302)
+        job = AdminJob.objects.get()
+        self.assertEqual((job.status, job.total, job.created_by), (AdminJob.QUEUED, 3, self.admin))
+        task.delay.assert_called_once_with(str(job.pk))
+        self.assertEqual(Incident.objects.filter(is_active=True).count(), 5)
+
+    @override_settings(ADMIN_JOBS={'CHUNK_SIZE': 2})
+    def test_chunks_commit_with_their_progress(self):
+        job = self.start(DeactivateIncidents)
+        before = timezone.now()
+        progress = []
+        process = DeactivateIncidents.process
+
+        def record(action, job, queryset):
+            process(action, job, queryset)
+            progress.append(AdminJob.objects.get(pk=job.pk).processed)
+
+        with mock.patch.object(DeactivateIncidents, 'process', record):
+            admin_jobs.run(job.pk)
+
+        self.assertEqual(progress, [0, 2, 4])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed, job.progress), (AdminJob.DONE, 5, 100))
+        self.assertFalse(Incident.objects.filter(is_active=True).exists())
+        # Delta sync sees the bulk update
+        self.assertFalse(Incident.objects.filter(updated_at__lt=before).exists())
+
+        self.client.force_login(self.admin)
+        response = self.client.get(f'/admin/common/adminjob/{job.pk}/progress/')
+        self.assertEqual(response.json()['status'], AdminJob.DONE)
+        self.assertEqual(response.json()['progress'], 100)
+
+    @override_settings(ADMIN_JOBS={'CHUNK_SIZE': 2})
+    def test_cancel_stops_before_the_next_chunk(self):
+        job = self.start(DeactivateIncidents)
+        process = DeactivateIncidents.process
+
+        def cancel_during(action, job, queryset):
+            process(action, job, queryset)
+            admin_jobs.cancel(AdminJob.objects.filter(pk=job.pk))
+
+        with mock.patch.object(DeactivateIncidents, 'process', cancel_during):
+            admin_jobs.run(job.pk)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed), (AdminJob.CANCELLED, 2))
+        self.assertEqual(Incident.objects.filter(is_active=True).count(), 3)
+
+    def test_job_fails_when_it_cannot_be_queued(self):
+        with mock.patch('apps.common.tasks.run_admin_job') as task:
+            task.delay.side_effect = ConnectionError('broker down')
+            with self.assertLogs('apps.common.admin_jobs', level='ERROR'), self.captureOnCommitCallbacks(execute=True):
+                job = admin_jobs.enqueue(DeleteIncidents, Incident.objects.all(), self.admin)
+        job.refresh_from_db()
+        self.assertEqual(job.status, AdminJob.FAILED)
+        self.assertIn('broker down', job.error)
+
+    def test_cancelled_queued_job_never_runs(self):
+        job = self.start(DeleteIncidents)
+        admin_jobs.cancel(AdminJob.objects.filter(pk=job.pk))
+        admin_jobs.run(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, AdminJob.CANCELLED)
+        self.assertEqual(Incident.objects.count(), 5)
+
+    @override_settings(ADMIN_JOBS={'CHUNK_SIZE': 2})
+    def test_failed_chunk_is_rolled_back(self):
+        job = self.start(DeleteIncidents)
+        process = DeleteIncidents.process
+        calls = []
+
+        def fail_second(action, job, queryset):
+            calls.append(1)
+            process(action, job, queryset)
+            if len(calls) == 2:
+                raise RuntimeError('disk full')
+
+        with mock.patch.object(DeleteIncidents, 'process', fail_second):
+            with self.assertLogs('apps.common.admin_jobs', level='ERROR'):
+                admin_jobs.run(job.pk)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.processed, job.error), (AdminJob.FAILED, 2, 'RuntimeError: disk full'))
+        self.assertEqual(Incident.objects.count(), 3)
+        self.assertEqual(IncidentTombstone.objects.count(), 2)
+
+    def test_export_attaches_a_csv(self):
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            job = self.start(ExportIncidents)
+            admin_jobs.run(job.pk)
+            job.refresh_from_db()
+            self.assertEqual(job.status, AdminJob.DONE)
+            with job.result.open('r') as result:
+                rows = list(csv.DictReader(result))
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(
+            {row['incident_number'] for row in rows},
+            {incident.incident_number for incident in self.incidents}
+        )
+        self.assertEqual(rows[0]['facility'], self.incidents[0].facility.name)
+
+
+class AdminChangelistTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        facilities = [Facility.objects.for_name(f'Facility {index}') for index in range(5)] + [None]
+        incidents = [
+            make_incident(index, facility=facilities[index % len(facilities)]) for index in range(120)
+        ]
+        IncidentAttachment.objects.bulk_create([
+            IncidentAttachment(
+                incident=incident, file=f'incidents/{incident.id}/a.txt',
+                filename='a.txt', file_size=10, attachment_type='DOCUMENT'
+            )
+            for incident in incidents
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def changelist(self, model, params=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f'/admin/incident_reporting/{model}/', params)
+        self.assertEqual(response.status_code, 200)
+        return response, [query['sql'] for query in queries]
+
+    def test_query_count_does_not_grow_with_rows(self):
+        # One count and one page of rows, joined with its incident / facility
+        for model in ['incident', 'incidentattachment']:
+            with self.subTest(model=model):
+                self.changelist(model)
+                response, queries = self.changelist(model)
+                # Planner estimates (on PostgreSQL) don't read the table
+                incident_queries = [
+                    sql for sql in queries
+                    if 'FROM "incident_reporting_' in sql and not sql.startswith('EXPLAIN')
+                ]
+                self.assertEqual(len(incident_queries), 2, '\n'.join(incident_queries))
+                self.assertEqual(sum('COUNT(' in sql for sql in queries), 1)
+                self.assertEqual(len(response.context['cl'].result_list), 100)
+                self.assertFalse(response.context['cl'].show_full_result_count)
+
+    def test_facility_options_cached_until_a_facility_changes(self):
+        self.changelist('incident')
+        response, queries = self.changelist('incident', {'facility__id__exact': Facility.objects.first().pk})
+        self.assertFalse(any('"incident_reporting_facility"' in sql and 'JOIN' not in sql for sql in queries))
+        self.assertEqual(response.context['cl'].result_count, 20)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Facility.objects.for_name('New Plant')
+        response, queries = self.changelist('incident')
+        self.assertContains(response, 'New Plant')
+
+    def test_incident_lookups_use_autocomplete(self):
+        attachment = IncidentAttachment.objects.first()
+        response = self.client.get(f'/admin/incident_reporting/incidentattachment/{attachment.pk}/change/')
+        # The incident select only renders the current choice
+        select = re.search(r'<select name="incident"[^>]*>(.*?)</select>', response.content.decode(), re.S)
+        self.assertIn('admin-autocomplete', select.group(0))
+        self.assertEqual(select.group(1).count('<option'), 1)
+
+
+class FacetCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        north = Facility.objects.for_name('North Plant')
+        south = Facility.objects.for_name('South Plant')
+        for index, (category, facility) in enumerate([
+            ('INCIDENT', north), ('INCIDENT', north), ('NEAR_MISS', south), ('INCIDENT', None),
+        ]):
+            make_incident(index, category=category, facility=facility, injury_damage_type='NO_INJURY')
+        cls.inactive = make_incident(4, category='NEAR_MISS', facility=north, is_active=False)
+
+    def setUp(self):
+        cache.clear()
+
+    def list(self, **params):
+        response = self.client.get(API + 'incidents/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_counts_per_value_of_the_filtered_list(self):
+        body = self.list(facets='category,facility', is_active='true')
+        self.assertEqual(body['count'], 4)
+        self.assertEqual(body['facets'], {
+            'category': [{'value': 'INCIDENT', 'count': 3}, {'value': 'NEAR_MISS', 'count': 1}],
+            'facility': [
+                {'value': 'North Plant', 'count': 2},
+                {'value': None, 'count': 1},
+                {'value': 'South Plant', 'count': 1},
+            ],
+        })
+        self.assertNotIn('facets', self.list())
+
+    def test_archived_incidents_are_counted_with_include_archived(self):
+        Incident.objects.filter(pk=self.inactive.pk).update(
+            updated_at=timezone.now() - timedelta(days=365)
+        )
+        self.assertEqual(archive.archive_incidents(), 1)
+        body = self.list(facets='category', include_archived='true')
+        self.assertEqual(body['facets']['category'], [
+            {'value': 'INCIDENT', 'count': 3}, {'value': 'NEAR_MISS', 'count': 2},
+        ])
+
+    def test_cached_by_normalized_query_string(self):
+        self.list(facets='category,facility', is_active='true')
+        with CaptureQueriesContext(connection) as queries:
+            body = self.list(is_active='true', facets='facility,category', page=1)
+        self.assertFalse(any('GROUP BY' in query['sql'] for query in queries))
+        self.assertEqual(body['facets']['category'][0], {'value': 'INCIDENT', 'count': 3})
+
+        body = self.list(facets='category', category='NEAR_MISS')
+        self.assertEqual(body['facets']['category'], [{'value': 'NEAR_MISS', 'count': 2}])
+
+    @skipUnless(connection.vendor == 'postgresql', 'GROUPING SETS need PostgreSQL')
+    def test_one_grouping_sets_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.list(facets='category,facility,injury_damage_type,reported_by_type')
+        self.assertEqual(sum('GROUP BY' in query['sql'] for query in queries), 1)
+
+    def test_unknown_facet(self):
+        response = self.client.get(API + 'incidents/', {'facets': 'category,description'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('description', response.json()['facets'][0])
+
+
+class EstimatedCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        for index in range(25):
+            make_incident(index)
+
+    def test_small_results_are_counted_exactly(self):
+        body = self.client.get(API + 'incidents/').json()
+        self.assertEqual(body['count'], 25)
+        self.assertFalse(body['count_is_estimate'])
+        self.assertIsNotNone(body['next'])
+
+    @skipUnless(connection.vendor == 'postgresql', 'Planner estimates need PostgreSQL')
+    @override_settings(ESTIMATED_COUNT_THRESHOLD=10)
+    def test_large_results_use_the_planner_estimate(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {Incident._meta.db_table}')
+
+        with CaptureQueriesContext(connection) as queries:
+            body = self.client.get(API + 'incidents/').json()
+        self.assertTrue(body['count_is_estimate'])
+        self.assertEqual(body['count'], 25)
+        self.assertFalse(any('COUNT(' in query['sql'] for query in queries))
+        self.assertEqual(len(body['results']), 20)
+        self.assertIsNotNone(body['next'])
+
+        last = self.client.get(API + 'incidents/', {'page': 2}).json()
+        self.assertEqual(len(last['results']), 5)
+        self.assertIsNone(last['next'])
+        # Past the estimate is an empty page, not a 404
+        response = self.client.get(API + 'incidents/', {'page': 5})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [])
+
+        filtered = self.client.get(API + 'incidents/', {'category': 'INCIDENT'}).json()
+        self.assertEqual(len(filtered['results']), 7)
+
+
+class AnalyticsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        north = Facility.objects.for_name('North Plant')
+        south = Facility.objects.for_name('South Plant')
+        for index, (day, category, facility) in enumerate([
+            (date(2024, 1, 5), 'INCIDENT', north),
+            (date(2024, 1, 20), 'INCIDENT', north),
+            (date(2024, 2, 1), 'NEAR_MISS', south),
+            (date(2024, 4, 2), 'INCIDENT', south),
+            (date(2023, 12, 31), 'INCIDENT', north),  # outside the range
+        ]):
+            make_incident(index, date_of_incident=day, category=category, facility=facility)
+
+    def analytics(self, **params):
+        return self.client.get(API + 'incidents/analytics/', {
+            'date_from': '2024-01-01', 'date_to': '2024-06-30', **params
+        })
+
+    def test_counts_per_bucket_and_dimensions_in_one_query(self):
+        with self.assertNumQueries(1):
+            response = self.analytics(bucket='month', group_by='category,facility')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['columns'], {
+            'bucket': ['2024-01-01', '2024-02-01', '2024-04-01'],
+            'category': ['INCIDENT', 'NEAR_MISS', 'INCIDENT'],
+            'facility': ['North Plant', 'South Plant', 'South Plant'],
+            'count': [2, 1, 1],
+        })
+        self.assertEqual(len(data['buckets']), 6)
+
+    def test_quarters_and_list_filters(self):
+        data = self.analytics(bucket='quarter', facility='south plant').json()
+        self.assertEqual(data['columns'], {
+            'bucket': ['2024-01-01', '2024-04-01'],
+            'count': [1, 1],
+        })
+
+    def test_invalid_parameters(self):
+        for params in [
+            {'group_by': 'description'},
+            {'group_by': 'category,facility,waste_type'},
+            {'bucket': 'year'},
+            {'bucket': 'day', 'date_from': '2000-01-01'},
+            {'bucket': 'day', 'date_from': '0001-01-01'},
+            {'date_from': '2025-01-01'},
+        ]:
+            with self.subTest(params=params):
+                self.assertEqual(self.analytics(**params).status_code, 400)
+
+    def test_bucket_count_matches_the_buckets(self):
+        for date_from, date_to in [
+            (date(2024, 1, 1), date(2024, 1, 1)),
+            (date(2023, 11, 30), date(2024, 6, 30)),
+            (date(2021, 3, 14), date(2024, 2, 29)),
+        ]:
+            for bucket in analytics.BUCKETS:
+                with self.subTest(date_from=date_from, date_to=date_to, bucket=bucket):
+                    self.assertEqual(
+                        analytics.bucket_count(date_from, date_to, bucket),
+                        len(analytics.buckets(date_from, date_to, bucket))
+                    )
+        with mock.patch.object(analytics, 'buckets') as buckets:
+            self.assertEqual(self.analytics(bucket='day', date_from='0001-01-01').status_code, 400)
+        buckets.assert_not_called()
+
+
+@override_settings(INCIDENT_SYNC={**settings.INCIDENT_SYNC, 'SETTLE_SECONDS': 0})
+class DeltaSyncTests(TestCase):
+    def sync(self, token=None, **params):
+        if token:
+            params['token'] = token
+        response = self.client.get(API + 'incidents/changes/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_sync_returns_only_changes_since_the_token(self):
+        first, second, third = [make_incident(index) for index in range(3)]
+
+        # Full sync, two pages
+        page = self.sync(limit=2)
+        self.assertTrue(page['has_more'])
+        rest = self.sync(page['next_token'], limit=2)
+        self.assertFalse(rest['has_more'])
+        ids = [row['id'] for row in page['results'] + rest['results']]
+        self.assertEqual(sorted(ids), sorted(str(incident.pk) for incident in (first, second, third)))
+
+        self.assertEqual(self.sync(rest['next_token'])['results'], [])
+
+        second.description = 'Updated'
+        second.save()
+        response = self.client.delete(API + f'incidents/{third.pk}/')
+        self.assertEqual(response.status_code, 204)
+
+        with self.assertNumQueries(4):
+            delta = self.sync(rest['next_token'])
+        self.assertEqual([row['id'] for row in delta['results']], [str(second.pk)])
+        self.assertEqual(delta['deleted'], [str(third.pk)])
+
+        self.assertEqual(self.sync(delta['next_token'])['deleted'], [])
+
+    def test_archived_incidents_are_tombstoned(self):
+        old = make_incident(1, date_of_incident=date.today() - timedelta(days=365 * 4))
+        token = self.sync()['next_token']
+        archive.archive_incidents()
+        self.assertEqual(self.sync(token)['deleted'], [str(old.pk)])
+
+    def test_tokens_older_than_the_tombstones_must_resync(self):
+        make_incident(1).delete()
+        token = self.sync()['next_token']
+        later = timezone.now() + timedelta(days=settings.INCIDENT_SYNC['TOMBSTONE_DAYS'] + 1)
+
+        self.assertEqual(sync.compact_tombstones(now=later), 1)
+        self.assertFalse(IncidentTombstone.objects.exists())
+        with self.assertRaises(sync.TokenExpired):
+            sync.changes(token, now=later)
+
+        response = self.client.get(API + 'incidents/changes/', {'token': 'garbage'})
+        self.assertEqual(response.status_code, 400)
+
+
+class IdempotencyKeyTests(TestCase):
+    payload = {**LocationLookupTests.payload, 'incident_title': 'Gateway spill', 'facility': 'North Plant'}
+
+    def create(self, key, **changes):
+        return self.client.post(
+            API + 'incidents/', {**self.payload, **changes},
+            content_type='application/json', headers={'Idempotency-Key': key}
+        )
+
+    def test_retry_replays_the_first_response(self):
+        first = self.create('retry-1')
+        self.assertEqual(first.status_code, 201)
+        with self.assertNumQueries(1):
+            retry = self.create('retry-1')
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.headers['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(Incident.objects.count(), 1)
+
+        # Without a key the duplicate title is rejected as before
+        self.assertEqual(self.create('').status_code, 400)
+
+    def test_key_reused_with_another_body_is_rejected(self):
+        self.assertEqual(self.create('retry-2').status_code, 201)
+        response = self.create('retry-2', incident_title='Another spill')
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Incident.objects.count(), 1)
+
+    @override_settings(IDEMPOTENCY={**settings.IDEMPOTENCY, 'WAIT_SECONDS': 0})
+    def test_duplicate_of_a_running_request_waits_on_the_lock(self):
+        path = API + 'incidents/'
+        key = hashlib.sha256(f'POST {path} retry-3'.encode()).hexdigest()
+        store = idempotency.get_store()
+        self.assertTrue(store.acquire(key, 'in-flight'))
+        self.assertEqual(self.create('retry-3').status_code, 409)
+        self.assertFalse(Incident.objects.exists())
+
+        store.release(key)
+        self.assertEqual(self.create('retry-3').status_code, 201)
+
+
+class IncidentNumberTests(TestCase):
+    def test_incidents_created_together_get_distinct_numbers(self):
+        first = make_incident(1)
+        second = make_incident(2, date_of_incident=first.date_of_incident)
+        self.assertEqual(first.id.version, 7)
+        self.assertNotEqual(first.incident_number[-8:], second.incident_number[-8:])
+        self.assertEqual(first.incident_number[-8:], first.id.hex[-8:].upper())
+
+    def test_number_is_stored_and_follows_date_changes(self):
+        incident = make_incident(1)
+        self.assertEqual(
+            Incident.objects.filter(pk=incident.pk).values_list('incident_number', flat=True).get(),
+            format_incident_number(incident.pk, incident.date_of_incident)
+        )
+        incident.date_of_incident = date(2020, 1, 2)
+        incident.save()
+        self.assertTrue(Incident.objects.filter(incident_number__startswith='INC-20200102-').exists())
+
+    def test_number_follows_date_changes_saved_with_update_fields(self):
+        incident = make_incident(1)
+        incident.date_of_incident = date(2020, 1, 2)
+        incident.save(update_fields=['date_of_incident'])
+        self.assertEqual(
+            Incident.objects.filter(pk=incident.pk).values_list('incident_number', flat=True).get(),
+            format_incident_number(incident.pk, date(2020, 1, 2))
+        )
+
+    def test_lookup_by_number(self):
+        incident = make_incident(1)
+        make_incident(2)
+        response = self.client.get(API + f'incidents/by-number/{incident.incident_number.lower()}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['id'], str(incident.pk))
+
+        response = self.client.get(API + 'incidents/', {'incident_number': incident.incident_number})
+        self.assertEqual([row['id'] for row in response.json()['results']], [str(incident.pk)])
+
+        self.assertEqual(self.client.get(API + 'incidents/by-number/INC-19000101-00000000/').status_code, 404)
+
+
+class IncidentTaskTests(TestCase):
+    def test_tasks_are_routed_to_their_queues(self):
+        routes = {
+            'apps.incident_reporting.tasks.delete_attachment_files': 'media',
+            'apps.incident_reporting.tasks.archive_incidents': 'maintenance',
+            'apps.incident_reporting.tasks.ensure_incident_partitions': 'maintenance',
+            'apps.common.tasks.run_admin_job': 'bulk',
+            'coreAPI.celery.debug_task': 'default',
+        }
+        router = celery_app.amqp.router
+        for task, queue in routes.items():
+            with self.subTest(task=task):
+                self.assertEqual(router.route({}, task)['queue'].name, queue)
+
+    def test_worker_is_sized_for_its_queue(self):
+        conf = mock.Mock()
+        self.assertEqual(configure_queue_worker(conf=conf, options={'queues': ['media']}), 'media')
+        self.assertEqual((conf.worker_concurrency, conf.worker_prefetch_multiplier), (2, 1))
+        conf = mock.Mock()
+        self.assertEqual(configure_queue_worker(conf=conf, options={'queues': 'notifications'}), 'notifications')
+        self.assertEqual((conf.worker_concurrency, conf.worker_prefetch_multiplier), (4, 4))
+        self.assertIsNone(configure_queue_worker(conf=mock.Mock(), options={'queues': None}))
+
+    def test_attachment_files_are_deleted_after_commit(self):
+        incident = make_incident(1)
+        IncidentAttachment.objects.bulk_create([
+            IncidentAttachment(
+                incident=incident, file=f'incidents/{incident.id}/a.txt',
+                filename='a.txt', file_size=10, attachment_type='DOCUMENT'
+            )
+        ])
+        with mock.patch('apps.incident_reporting.signals.delete_attachment_files') as task:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.delete(API + f'incidents/{incident.pk}/')
+        self.assertEqual(response.status_code, 204)
+        task.delay.assert_called_once_with([f'incidents/{incident.id}/a.txt'])
+
+    def test_unreachable_broker_does_not_fail_deletes(self):
+        incidents = [make_incident(1), make_incident(2)]
+        IncidentAttachment.objects.bulk_create([
+            IncidentAttachment(
+                incident=incident, file=f'incidents/{incident.id}/a.txt',
+                filename='a.txt', file_size=10, attachment_type='DOCUMENT'
+            ) for incident in incidents
+        ])
+        with mock.patch('apps.incident_reporting.signals.delete_attachment_files') as task, \
+                self.assertLogs('apps.incident_reporting.signals', 'ERROR') as logs:
+            task.delay.side_effect = ConnectionError('broker down')
+            with self.captureOnCommitCallbacks(execute=True):
+                single = self.client.delete(API + f'incidents/{incidents[0].pk}/')
+                bulk = self.client.delete(
+                    API + 'incidents/bulk/', {'ids': [str(incidents[1].pk)]}, content_type='application/json'
+                )
+        self.assertEqual((single.status_code, bulk.status_code), (204, 200))
+        self.assertFalse(Incident.objects.exists())
+        self.assertEqual(len(logs.records), 2)
+
+
+class SMTPStandIn(socketserver.ThreadingTCPServer):
+    """Just enough of an SMTP server to record connections and messages"""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        self.connections = 0
+        self.messages = []  # (recipients, raw message)
+        super().__init__(('127.0.0.1', 0), SMTPStandInHandler)
+
+
+class SMTPStandInHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        self.server.connections += 1
+        self.reply('220 localhost')
+        recipients = []
+        for line in self.rfile:
+            command = line.decode().strip()
+            verb = command[:4].upper()
+            if verb == 'MAIL':
+                recipients = []
+            elif verb == 'RCPT':
+                recipients.append(command.split(':', 1)[1].strip(' <>'))
+            elif verb == 'DATA':
+                self.reply('354 End data with <CR><LF>.<CR><LF>')
+                data = []
+                for data_line in self.rfile:
+                    if data_line.rstrip(b'\r\n') == b'.':
+                        break
+                    data.append(data_line.decode())
+                self.server.messages.append((tuple(sorted(recipients)), ''.join(data)))
+            elif verb == 'QUIT':
+                self.reply('221 Bye')
+                return
+            self.reply('250 OK')
+
+
+class SevereIncidentNotificationTests(TestCase):
+    def setUp(self):
+        self.smtp = SMTPStandIn()
+        threading.Thread(target=self.smtp.serve_forever, daemon=True).start()
+        self.addCleanup(self.smtp.server_close)
+        self.addCleanup(self.smtp.shutdown)
+        settings = override_settings(
+            EMAIL_BACKEND='django.core.mail.backends.smtp.EmailBackend',
+            EMAIL_HOST='127.0.0.1', EMAIL_PORT=self.smtp.server_address[1],
+            EMAIL_HOST_USER='', EMAIL_HOST_PASSWORD='',
+            EMAIL_USE_TLS=False, EMAIL_USE_SSL=False,
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def test_severe_incidents_are_queued_once_after_commit(self):
+        with mock.patch('apps.incident_reporting.signals.send_incident_notifications') as task:
+            with self.captureOnCommitCallbacks(execute=True):
+                incident = make_incident(1, injury_damage_type='FATALITY')
+                make_incident(2, injury_damage_type='MINOR_INJURY')
+            with self.captureOnCommitCallbacks(execute=True):
+                incident.save()
+        task.apply_async.assert_called_once_with(countdown=60)
+        self.assertEqual(
+            list(IncidentNotification.objects.values_list('incident_id', flat=True)), [incident.pk]
+        )
+
+    def test_only_a_change_to_severe_queues_a_notification(self):
+        incident = make_incident(1, injury_damage_type='NO_INJURY')
+        incident = Incident.objects.get(pk=incident.pk)
+        incident.injury_damage_type = 'FATALITY'
+        with mock.patch('apps.incident_reporting.signals.send_incident_notifications'):
+            with self.captureOnCommitCallbacks(execute=True):
+                incident.save()
+        self.assertTrue(IncidentNotification.objects.filter(incident=incident).exists())
+
+        for severe in [incident, Incident.objects.get(pk=incident.pk)]:
+            with self.subTest(severe=severe), CaptureQueriesContext(connection) as queries:
+                severe.incident_title = f'{severe.incident_title}!'
+                severe.save()
+            self.assertFalse([query for query in queries if 'incidentnotification' in query['sql']])
+
+    def test_messages_sent_before_a_failure_stay_sent(self):
+        north = Facility.objects.for_name('North Plant')
+        south = Facility.objects.for_name('South Plant')
+        SafetyContact.objects.bulk_create([
+            SafetyContact(name='North', email='north@example.com', facility=north),
+            SafetyContact(name='South', email='south@example.com', facility=south),
+        ])
+        make_incident(1, injury_damage_type='FATALITY', facility=north)
+        make_incident(2, injury_damage_type='FATALITY', facility=south)
+
+        send_messages = SMTPBackend.send_messages
+
+        def fail_after_first(backend, messages):
+            if self.smtp.messages:
+                raise smtplib.SMTPServerDisconnected('Connection lost')
+            return send_messages(backend, messages)
+
+        with mock.patch.object(SMTPBackend, 'send_messages', autospec=True, side_effect=fail_after_first):
+            with self.assertRaises(smtplib.SMTPServerDisconnected):
+                notifications.send_pending()
+        self.assertEqual(len(self.smtp.messages), 1)
+        self.assertEqual(IncidentNotification.objects.filter(sent_at__isnull=True).count(), 1)
+
+        self.assertEqual(notifications.send_pending(), 1)
+        self.assertEqual(
+            sorted(recipients for recipients, _ in self.smtp.messages),
+            [('north@example.com',), ('south@example.com',)]
+        )
+
+    def test_burst_goes_out_as_one_digest_per_facility_over_one_connection(self):
+        north = Facility.objects.for_name('North Plant')
+        south = Facility.objects.for_name('South Plant')
+        SafetyContact.objects.bulk_create([
+            SafetyContact(name='Head of safety', email='head@example.com'),
+            SafetyContact(name='North', email='north@example.com', facility=north),
+            SafetyContact(name='South', email='south@example.com', facility=south),
+            SafetyContact(name='Former', email='former@example.com', facility=north, is_active=False),
+        ])
+        make_incident(1, injury_damage_type='FATALITY', facility=north)
+        make_incident(2, injury_damage_type='MAJOR_INJURY', facility=north)
+        make_incident(3, injury_damage_type='MAJOR_INJURY', facility=south, incident_title='Crane fall')
+        make_incident(4, injury_damage_type='NO_INJURY', facility=south)
+
+        self.assertEqual(notifications.send_pending(), 2)
+        self.assertEqual(self.smtp.connections, 1)
+        messages = dict(self.smtp.messages)
+        self.assertIn(
+            'Subject: 2 severe incidents at North Plant',
+            messages[('head@example.com', 'north@example.com')]
+        )
+        self.assertIn(
+            'Subject: Severe incident at South Plant: Crane fall',
+            messages[('head@example.com', 'south@example.com')]
+        )
+        self.assertFalse(IncidentNotification.objects.filter(sent_at__isnull=True).exists())
+
+        self.assertEqual(notifications.send_pending(), 0)
+        self.assertEqual(self.smtp.connections, 1)
+
+
+class IncidentArchiveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.recent = make_incident(1)
+        cls.old = make_incident(2, date_of_incident=date.today() - timedelta(days=365 * 4))
+        cls.inactive = make_incident(3, is_active=False)
+        IncidentAttachment.objects.bulk_create([
+            IncidentAttachment(
+                incident=cls.old, file=f'incidents/{cls.old.id}/a.txt',
+                filename='a.txt', file_size=10, attachment_type='DOCUMENT'
+            )
+        ])
+        Incident.objects.filter(pk=cls.inactive.pk).update(
+            updated_at=timezone.now() - timedelta(days=365)
+        )
+
+    def test_archive_moves_old_and_inactive_incidents(self):
+        self.assertEqual(archive.archive_incidents(chunk_size=1), 2)
+
+        self.assertEqual(list(Incident.objects.values_list('pk', flat=True)), [self.recent.pk])
+        self.assertFalse(IncidentAttachment.objects.filter(incident_id=self.old.pk).exists())
+        archived = ArchivedIncident.objects.get(pk=self.old.pk)
+        self.assertEqual(archived.incident_title, self.old.incident_title)
+        self.assertEqual(archived.created_at, self.old.created_at)
+        self.assertEqual(archived.attachment_count, 1)
+        self.assertEqual(archived.attachments[0]['filename'], 'a.txt')
+        self.assertEqual(archive.archive_incidents(), 0)
+
+    def test_retrieve_falls_back_to_archive(self):
+        archive.archive_incidents()
+        for path in [f'incidents/{self.old.pk}/', f'async/incidents/{self.old.pk}/']:
+            with self.subTest(path=path):
+                response = self.client.get(API + path)
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.json()['archived'])
+                self.assertEqual(response.json()['attachment_count'], 1)
+                self.assertEqual(response.json()['attachments'][0]['filename'], 'a.txt')
+
+    def test_list_include_archived(self):
+        archive.archive_incidents()
+        response = self.client.get(API + 'incidents/')
+        self.assertEqual(response.json()['count'], 1)
+
+        with detect_duplicate_queries(threshold=3):
+            response = self.client.get(API + 'incidents/', {
+                'include_archived': 'true', 'ordering': 'date_of_incident'
+            })
+        results = response.json()['results']
+        self.assertEqual(response.json()['count'], 3)
+        self.assertEqual(results[0]['id'], str(self.old.pk))
+        self.assertTrue(results[0]['archived'])
+        self.assertEqual(results[0]['attachment_count'], 1)
+
+        response = self.client.get(API + 'incidents/', {
+            'include_archived': 'true', 'is_active': 'false'
+        })
+        self.assertEqual([row['id'] for row in response.json()['results']], [str(self.inactive.pk)])
+
+    def test_include_archived_orders_facilities_by_name(self):
+        # Facilities were created as 1, 2, 0, so id order differs from name order
+        archive.archive_incidents()
+        for ordering, expected in [
+            ('facility', [self.inactive, self.recent, self.old]),
+            ('-facility', [self.old, self.recent, self.inactive]),
+        ]:
+            with self.subTest(ordering=ordering):
+                response = self.client.get(API + 'incidents/', {
+                    'include_archived': 'true', 'ordering': ordering
+                })
+                self.assertEqual(
+                    [row['id'] for row in response.json()['results']],
+                    [str(incident.pk) for incident in expected]
+                )
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Partitioning needs PostgreSQL')
+class IncidentPartitioningTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.today = date.today()
+        for index, days_ago in enumerate([0, 40, 400, 800]):
+            make_incident(index, date_of_incident=cls.today - timedelta(days=days_ago))
+        partitioning.convert_to_partitioned('month', log=lambda message: None)
+
+    def partition(self, day):
+        return partitioning.partition_name(day.replace(day=1), 'month')
+
+    def scanned_partitions(self, path, params=None):
+        """Partitions in the plan of every date-bounded query the endpoint runs"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(API + path, params)
+        self.assertEqual(response.status_code, 200)
+
+        plans = []
+        with connection.cursor() as cursor:
+            for query in queries:
+                # The paginator's own EXPLAIN count estimates aren't re-planned
+                if query['sql'].startswith('EXPLAIN') or not re.search(r'WHERE .*"date_of_incident" >=', query['sql']):
+                    continue
+                cursor.execute('EXPLAIN ' + query['sql'])
+                plan = '\n'.join(row[0] for row in cursor.fetchall())
+                plans.append(set(re.findall(rf'{partitioning.TABLE}_p(?:\d+(?:m\d+)?|default)(?!\w)', plan)))
+        self.assertTrue(plans, 'no date-bounded query found')
+        return plans
+
+    def test_dashboard_trend_prunes_old_partitions(self):
+        for scanned in self.scanned_partitions('incidents/dashboard_stats/'):
+            self.assertIn(self.partition(self.today), scanned)
+            self.assertNotIn(self.partition(self.today - timedelta(days=400)), scanned)
+            self.assertNotIn(self.partition(self.today - timedelta(days=800)), scanned)
+
+    def test_list_date_range_scans_one_partition(self):
+        day = self.today - timedelta(days=40)
+        params = {
+            'date_of_incident__gte': day.replace(day=1).isoformat(),
+            'date_of_incident__lte': day.isoformat(),
+        }
+        for path in ['incidents/', 'async/incidents/']:
+            with self.subTest(path=path):
+                for scanned in self.scanned_partitions(path, params):
+                    self.assertEqual(scanned, {self.partition(day)})
+
+    def test_ensure_partitions_moves_rows_out_of_default(self):
+        future = self.today + timedelta(days=200)
+        make_incident(10, date_of_incident=future)
+
+        created = partitioning.ensure_partitions(ahead=8)
+
+        self.assertIn(self.partition(future), created)
+        self.assertEqual(partitioning.ensure_partitions(ahead=8), [])
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM "{partitioning.DEFAULT_PARTITION}"')
+            self.assertEqual(cursor.fetchone()[0], 0)
+        self.assertTrue(Incident.objects.filter(date_of_incident=future).exists())
+
+    def test_titles_stay_unique_across_partitions(self):
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            make_incident(20, incident_title='Incident 0', date_of_incident=self.today - timedelta(days=800))
+
+
+class IncidentImportTests(TestCase):
+    row = {
+        'time_of_incident': '08:15',
+        'facility': 'North Plant',
+        'category': 'Near-Miss',
+        'description': 'Forklift reversed into the racking',
+        'persons_involved_type': 'Employee',
+        'injury_damage_type': 'NO_INJURY',
+        'reported_by_type': 'EMPLOYEE',
+        'reported_by_name': 'Legacy System',
+        'is_active': 'yes',
+    }
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def rows(self, count, start=0, days_ago=10):
+        return [
+            {**self.row, 'incident_title': f'Legacy {start + i}',
+             'date_of_incident': (date.today() - timedelta(days=days_ago)).isoformat()}
+            for i in range(count)
+        ]
+
+    def write_csv(self, rows, name='incidents.csv'):
+        path = f'{self.directory}/{name}'
+        with open(path, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        return path
+
+    def write_ndjson(self, lines, name='incidents.ndjson'):
+        path = f'{self.directory}/{name}'
+        with open(path, 'w') as f:
+            f.writelines(json.dumps(line) + '\n' for line in lines)
+        return path
+
+    def import_file(self, path, *args):
+        call_command('import_incidents', path, *args, stdout=io.StringIO())
+
+    def methods(self):
+        return ['bulk', 'copy'] if connection.vendor == 'postgresql' else ['bulk']
+
+    def test_csv_import_with_both_loaders(self):
+        for method in self.methods():
+            with self.subTest(method=method), transaction.atomic():
+                self.import_file(self.write_csv(self.rows(5)), '--method', method, '--batch-size', '2')
+
+                self.assertEqual(Incident.objects.count(), 5)
+                incident = Incident.objects.select_related('facility').get(incident_title='Legacy 3')
+                self.assertEqual(incident.category, 'NEAR_MISS')
+                self.assertEqual(incident.persons_involved_type, 'EMPLOYEE')
+                self.assertEqual(incident.facility.name, 'North Plant')
+                self.assertEqual(
+                    incident.incident_number, format_incident_number(incident.pk, incident.date_of_incident)
+                )
+                self.assertEqual(
+                    IncidentSimilarityBucket.objects.filter(incident=incident).count(),
+                    settings.INCIDENT_DUPLICATES['BANDS']
+                )
+                transaction.set_rollback(True)
+
+    @skipUnless(connection.vendor == 'postgresql', 'Partitioning needs PostgreSQL')
+    def test_copy_loader_merges_into_a_partitioned_table(self):
+        partitioning.convert_to_partitioned('month', log=lambda message: None)
+        self.import_file(self.write_csv(self.rows(3)), '--method', 'copy')
+        first = Incident.objects.get(incident_title='Legacy 2')
+
+        self.import_file(self.write_csv(self.rows(4, days_ago=400)), '--method', 'copy')
+
+        self.assertEqual(Incident.objects.count(), 4)
+        moved = Incident.objects.get(incident_title='Legacy 2')
+        self.assertEqual(moved.pk, first.pk)
+        self.assertEqual(moved.date_of_incident, date.today() - timedelta(days=400))
+
+    def test_invalid_rows_go_to_the_rejects_file(self):
+        future = (date.today() + timedelta(days=3)).isoformat()
+        valid, *invalid = self.rows(4)
+        invalid[0]['category'] = 'Bad Luck'
+        invalid[1]['date_of_incident'] = future
+        invalid[2]['facility'] = ['North Plant']
+        rejects = f'{self.directory}/rejects.ndjson'
+
+        self.import_file(self.write_ndjson([valid, *invalid, [1, 2]]), '--rejects', rejects)
+
+        self.assertEqual(list(Incident.objects.values_list('incident_title', flat=True)), ['Legacy 0'])
+        with open(rejects) as f:
+            errors = {json.dumps(line['row']): line['errors'] for line in map(json.loads, f)}
+        self.assertEqual(errors, {
+            json.dumps(invalid[0]): ["category: unknown choice 'Bad Luck'"],
+            json.dumps(invalid[1]): ['date_of_incident: in the future'],
+            json.dumps(invalid[2]): ['facility: not a single value'],
+            '[1, 2]': ['row: not a JSON object'],
+        })
+
+    def test_reimport_keeps_the_id_and_renumbers(self):
+        self.import_file(self.write_csv(self.rows(2)))
+        first = Incident.objects.get(incident_title='Legacy 1')
+
+        moved = self.rows(2, days_ago=40)
+        moved[1]['description'] = 'Forklift reversed into the racking, load fell'
+        self.import_file(self.write_csv(moved))
+
+        self.assertEqual(Incident.objects.count(), 2)
+        again = Incident.objects.get(incident_title='Legacy 1')
+        self.assertEqual(again.pk, first.pk)
+        self.assertEqual(again.date_of_incident, date.today() - timedelta(days=40))
+        self.assertEqual(again.incident_number, format_incident_number(first.pk, again.date_of_incident))
+        self.assertEqual(again.incident_number[-8:], first.incident_number[-8:])
+        self.assertEqual(again.description, moved[1]['description'])
+
+    def test_resume_continues_after_the_last_committed_batch(self):
+        path = self.write_csv(self.rows(5))
+        import_batch = importer.import_batch
+        calls = []
+
+        def crash_on_second_batch(rows, validator, loader):
+            calls.append([row['incident_title'] for row in rows])
+            if len(calls) == 2:
+                raise RuntimeError('worker killed')
+            return import_batch(rows, validator, loader)
+
+        with mock.patch(
+            'apps.incident_reporting.management.commands.import_incidents.import_batch',
+            side_effect=crash_on_second_batch
+        ):
+            with self.assertRaises(RuntimeError):
+                self.import_file(path, '--batch-size', '2')
+            self.assertEqual(Incident.objects.count(), 2)
+
+            self.import_file(path, '--batch-size', '2', '--resume')
+
+        self.assertEqual(calls[2:], [['Legacy 2', 'Legacy 3'], ['Legacy 4']])
+        self.assertEqual(Incident.objects.count(), 5)
+        with open(f'{path}.checkpoint.json') as f:
+            self.assertEqual(json.load(f), {
+                'source': path, 'rows': 5, 'loaded': 5, 'rejected': 0, 'completed': True
+            })
+        with self.assertRaisesMessage(CommandError, 'already imported completely'):
+            self.import_file(path, '--resume')
+
+
+class SyntheticDataTests(TestCase):
+    def sample(self, seed, count=1500):
+        generator = synthetic.IncidentGenerator(seed=seed, facilities=8, pool_size=50)
+        return [generator.incident(number) for number in range(count)]
+
+    def fields(self, incident):
+        return (
+            incident.incident_title, incident.date_of_incident, incident.time_of_incident,
+            incident.facility.name, incident.category, incident.injury_damage_type,
+            incident.description, incident.reported_by_name, incident.is_active,
+        )
+
+    def test_same_seed_gives_the_same_dataset(self):
+        first, second = self.sample(7, 50), self.sample(7, 50)
+        self.assertEqual([self.fields(i) for i in first], [self.fields(i) for i in second])
+        self.assertNotEqual([self.fields(i) for i in first], [self.fields(i) for i in self.sample(8, 50)])
+
+    def test_values_follow_the_weights(self):
+        incidents = self.sample(1)
+
+        def share(field, value):
+            return sum(getattr(i, field) == value for i in incidents) / len(incidents)
+
+        total = sum(synthetic.CATEGORY_WEIGHTS.values())
+        for value, weight in synthetic.CATEGORY_WEIGHTS.items():
+            self.assertAlmostEqual(share('category', value), weight / total, delta=0.04)
+        self.assertLess(share('injury_damage_type', 'FATALITY'), 0.01)
+        self.assertAlmostEqual(share('injury_damage_type', 'NO_INJURY'), 0.4, delta=0.04)
+
+        # Skewed facility sizes, dates within the range and never in the future
+        facilities = [i.facility.name for i in incidents]
+        counts = sorted((facilities.count(name) for name in set(facilities)), reverse=True)
+        self.assertGreater(counts[0], 3 * counts[-1])
+        today = timezone.now().date()
+        self.assertTrue(all(today - timedelta(days=365 * 5) <= i.date_of_incident <= today for i in incidents))
+        self.assertTrue(all(i.reporting_date <= timezone.now() for i in incidents))
+        for incident in incidents[:200]:
+            incident.full_clean(exclude=['incident_title', 'incident_number'])
+
+    def test_flush_deletes_without_per_row_signals(self):
+        synthetic.generate(30, batch_size=10)
+        make_incident(1, injury_damage_type='FATALITY')
+        self.assertTrue(IncidentNotification.objects.exists())
+
+        with mock.patch.object(events, 'publish_event') as publish:
+            call_command('seed_incidents', '5', '--flush', stdout=io.StringIO())
+
+        publish.assert_not_called()
+        self.assertFalse(IncidentTombstone.objects.exists())
+        self.assertFalse(IncidentNotification.objects.exists())
+        self.assertEqual(Incident.objects.count(), 5)
+        self.assertEqual(
+            IncidentAttachment.objects.count(),
+            IncidentAttachment.objects.filter(incident__in=Incident.objects.all()).count()
+        )
+
+
+class LiveFeedTests(TestCase):
+    def setUp(self):
+        # A broker of this test's own, bound to the event loop the test runs in
+        broker = events.EventBroker()
+        for module in (events, async_views):
+            patcher = mock.patch.object(module, 'broker', broker)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def create_incident(self, index):
+        with self.captureOnCommitCallbacks(execute=True):
+            make_incident(index, injury_damage_type='NO_INJURY')
+
+    async def next_event(self, stream):
+        chunk = await asyncio.wait_for(anext(stream), timeout=5)
+        return chunk.decode() if isinstance(chunk, bytes) else chunk
+
+    async def test_stream_sends_a_snapshot_then_committed_changes(self):
+        await sync_to_async(self.create_incident)(1)
+        response = await self.async_client.get(API + 'async/incidents/events/')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+
+        snapshot = await self.next_event(stream)
+        self.assertTrue(snapshot.startswith('event: stats\n'))
+        self.assertIn('"total_incidents": 1', snapshot)
+
+        await sync_to_async(self.create_incident)(2)
+        created = await self.next_event(stream)
+        self.assertIn('event: incident.created', created)
+        self.assertIn('"incident_title": "Incident 2"', created)
+
+        # Only the counts that changed are pushed
+        await events.broker._refresh_stats()
+        delta = await self.next_event(stream)
+        self.assertIn('event: stats.delta', delta)
+        changed = json.loads(delta.split('data: ', 1)[1])
+        self.assertEqual(changed['total_incidents'], 2)
+        self.assertEqual(changed['by_category.UNSAFE_ACT'], 1)
+        self.assertNotIn('by_category.NEAR_MISS', changed)
+
+        # The server cancels the response when the viewer disconnects
+        reader = asyncio.ensure_future(self.next_event(stream))
+        await asyncio.sleep(0.1)
+        reader.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await reader
+        self.assertFalse(events.broker._subscribers)
+
+    async def test_subscriber_is_dropped_when_the_snapshot_fails(self):
+        with mock.patch.object(events, 'stats_snapshot', side_effect=RuntimeError('database down')):
+            with self.assertRaises(RuntimeError):
+                await events.broker.subscribe()
+        self.assertFalse(events.broker._subscribers)
+
+    def test_slow_viewer_is_disconnected(self):
+        subscriber = events.Subscriber(maxsize=1)
+        subscriber.put(1, ('incident.created', '{}'))
+        self.assertFalse(subscriber.lagging)
+        subscriber.put(2, ('incident.created', '{}'))
+        self.assertTrue(subscriber.lagging)
+
+    def test_events_are_only_built_when_someone_can_listen(self):
+        # No Redis and no stream served by this process
+        with mock.patch('apps.incident_reporting.serializers.IncidentListSerializer') as serializer:
+            self.create_incident(1)
+        serializer.assert_not_called()
+
+        client = mock.Mock()
+        with mock.patch.object(events, 'get_redis', return_value=client):
+            self.create_incident(2)
+        channel, message = client.publish.call_args.args
+        self.assertEqual(channel, settings.LIVE_FEED['CHANNEL'])
+        self.assertEqual(json.loads(message)['type'], events.INCIDENT_CREATED)
+
+    def test_stream_is_refused_under_wsgi(self):
+        response = self.client.get(API + 'async/incidents/events/')
+        self.assertEqual(response.status_code, 501)
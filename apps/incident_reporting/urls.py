@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import views, async_views
 
 
 # Create router and register viewsets
@@ -10,7 +10,20 @@ router.register(r'incidents', views.IncidentViewSet, basename='incident')
 router.register(r"incidents/(?P<incident_id>\d+)/attachments", views.AttachmentViewSet, basename="incident-attachments")
 
 
-urlpatterns = [
-    path('', include(router.urls)),
+# Async-native read endpoints, served without a worker thread under ASGI
+async_urlpatterns = [
+    path('async/incidents/', async_views.incident_list, name='async-incident-list'),
+    path('async/incidents/dashboard_stats/', async_views.dashboard_stats, name='async-incident-dashboard-stats'),
+    path('async/incidents/events/', async_views.incident_events, name='async-incident-events'),
+    path('async/incidents/<uuid:pk>/', async_views.incident_detail, name='async-incident-detail'),
+    path(
+        'async/incidents/<uuid:pk>/attachments/',
+        async_views.incident_attachments,
+        name='async-incident-attachments'
+    ),
 ]
 
+
+urlpatterns = [
+    path('', include(router.urls)),
+] + async_urlpatterns
@@ -1,17 +1,24 @@
 from rest_framework import viewsets, status, filters, serializers
-from rest_framework.decorators import action, permission_classes
+from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.generics import get_object_or_404
 from rest_framework.permissions import AllowAny
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models import Count, Q
-from django.utils import timezone
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import BooleanField, F, Value
+from django.http import Http404
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
-from datetime import timedelta, datetime
-import calendar
 
-from .models import Incident, IncidentAttachment
+from apps.common import throttling
+from apps.common.idempotency import idempotent
+from apps.common.single_flight import make_key
+from . import analytics, bulk, detail_cache, duplicates, facets, stats, sync
+from .filters import IncidentFilter
+from .models import (
+    Incident, IncidentAttachment, ArchivedIncident, incident_number_lookup
+)
 from .serializers import (
     IncidentListSerializer,
     IncidentDetailSerializer,
@@ -19,7 +26,14 @@ from .serializers import (
     IncidentUpdateSerializer,
     IncidentSummarySerializer,
     AttachmentUploadSerializer,
-    IncidentAttachmentSerializer
+    AnalyticsQuerySerializer,
+    BulkSelectionSerializer,
+    BulkUpdateSerializer,
+    IncidentAttachmentSerializer,
+    SimilarIncidentSerializer,
+    SimilarQuerySerializer,
+    ArchivedIncidentListSerializer,
+    ArchivedIncidentDetailSerializer
 )
 
 # Create your views here.
@@ -30,25 +44,26 @@ class IncidentViewSet(viewsets.ModelViewSet):
     """
     Complete CRUD ViewSet for Incidents
     """
-    queryset = Incident.objects.all().prefetch_related('attachments')
+    queryset = Incident.objects.select_related(
+        'facility', 'department', 'site'
+    ).prefetch_related('attachments')
     permission_classes = [AllowAny]  # No authentication required
     parser_classes = [JSONParser, MultiPartParser, FormParser]
     
     # Filtering and Search
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-    filterset_fields = [
-        'category', 'sub_category', 'facility', 'department',
-        'injury_damage_type', 'waste_type', 'reported_by_type', 'is_active'
-    ]
+    filterset_class = IncidentFilter
     search_fields = [
-        'incident_title', 'description', 'facility', 'department',
-        'persons_involved_details', 'reported_by_name'
+        'incident_number', 'incident_title', 'description', 'facility__name',
+        'department__name', 'persons_involved_details', 'reported_by_name'
     ]
     ordering_fields = [
         'created_at', 'date_of_incident', 'reporting_date', 
         'incident_title', 'facility'
     ]
     ordering = ['-reporting_date', '-date_of_incident']
+    # Throttle budgets of the actions that aren't plain reads or writes
+    throttle_scopes = {'bulk': throttling.BULK, 'upload_attachment': throttling.UPLOAD}
     
     def get_serializer_class(self):
         """Return appropriate serializer based on action"""
@@ -65,7 +80,28 @@ class IncidentViewSet(viewsets.ModelViewSet):
         """
         GET /api/incidents/
         List all incidents with pagination and filtering
+        ?include_archived=true also lists archived incidents
+        ?facets=category,facility adds per-value counts of the filtered list
         """
+        try:
+            facet_names = facets.parse(request.query_params.get('facets', ''))
+        except ValueError as e:
+            raise serializers.ValidationError({'facets': [str(e)]})
+        include_archived = request.query_params.get('include_archived', '').lower() in ('1', 'true', 'yes')
+        
+        if include_archived:
+            response = self.list_with_archived(request)
+        else:
+            response = self.list_live(request)
+        
+        if facet_names:
+            querysets = [self.filter_queryset(Incident.objects.all())]
+            if include_archived:
+                querysets.append(self.filter_queryset(ArchivedIncident.objects.all()))
+            response.data['facets'] = facets.facet_counts(request.query_params, querysets, facet_names)
+        return response
+    
+    def list_live(self, request):
         queryset = self.filter_queryset(self.get_queryset())
         page = self.paginate_queryset(queryset)
         
@@ -79,10 +115,63 @@ class IncidentViewSet(viewsets.ModelViewSet):
             'results': serializer.data
         })
     
+    def list_with_archived(self, request):
+        """
+        Page through live and archived incidents as one ordered list: the
+        filtered keys of both tables are UNIONed, ordered and paginated in
+        SQL, then only the rows of the current page are loaded.
+        """
+        ordering = filters.OrderingFilter().get_ordering(request, self.queryset, self)
+        # Lookups sort by name (NamedLookup.Meta.ordering), as they do in list_live
+        sort_keys = {'facility': F('facility__name')}
+        columns, union_ordering = {}, []
+        for field in ordering:
+            name = field.lstrip('-')
+            columns[f'sort_{name}'] = sort_keys.get(name, F(name))
+            union_ordering.append(field.replace(name, f'sort_{name}'))
+        
+        live = self.filter_queryset(self.get_queryset()).order_by().values(
+            'id', **columns, archived=Value(False, output_field=BooleanField())
+        )
+        archived = self.filter_queryset(ArchivedIncident.objects.all()).order_by().values(
+            'id', **columns, archived=Value(True, output_field=BooleanField())
+        )
+        keys = live.union(archived, all=True).order_by(*union_ordering)
+        
+        page = self.paginate_queryset(keys)
+        rows = page if page is not None else list(keys)
+        
+        live_ids = [row['id'] for row in rows if not row['archived']]
+        archived_ids = [row['id'] for row in rows if row['archived']]
+        context = self.get_serializer_context()
+        serialized = {}
+        for item in IncidentListSerializer(
+            self.get_queryset().filter(pk__in=live_ids),
+            many=True, context=context
+        ).data:
+            serialized[(item['id'], False)] = item
+        for item in ArchivedIncidentListSerializer(
+            ArchivedIncident.objects.filter(pk__in=archived_ids).select_related(
+                'facility', 'department'
+            ),
+            many=True, context=context
+        ).data:
+            serialized[(item['id'], True)] = item
+        results = [serialized[(str(row['id']), row['archived'])] for row in rows]
+        
+        if page is not None:
+            return self.get_paginated_response(results)
+        return Response({
+            'count': len(results),
+            'results': results
+        })
+    
+    @idempotent
     def create(self, request, *args, **kwargs):
         """
         POST /api/incidents/
-        Create a new incident
+        Create a new incident (retries with the same Idempotency-Key replay the response).
+        possible_duplicates lists existing incidents with a very similar text.
         """
         serializer = self.get_serializer(data=request.data)
         
@@ -102,7 +191,8 @@ class IncidentViewSet(viewsets.ModelViewSet):
         return Response(
             {
                 'message': 'Incident created successfully',
-                'incident': detail_serializer.data
+                'incident': detail_serializer.data,
+                'possible_duplicates': self.similar_data(duplicates.similar_to(incident))
             },
             status=status.HTTP_201_CREATED
         )
@@ -110,12 +200,60 @@ class IncidentViewSet(viewsets.ModelViewSet):
     def retrieve(self, request, *args, **kwargs):
         """
         GET /api/incidents/{id}/
-        Get detailed incident information
+        Get detailed incident information (archived incidents included).
+        Live incidents are served from detail_cache until they change.
         """
-        instance = self.get_object()
+        live = self.live_version(kwargs[self.lookup_field]) if detail_cache.is_enabled() else None
+        if live is not None:
+            incident_id, updated_at = live
+            return Response(detail_cache.get_detail(
+                incident_id, updated_at,
+                # Cached without the request: detail_cache makes file URLs absolute
+                lambda: IncidentDetailSerializer(self.get_object(), context={'view': self}).data,
+                request
+            ))
+        
+        try:
+            instance = self.get_object()
+        except Http404:
+            archived = get_object_or_404(
+                ArchivedIncident.objects.select_related('facility', 'department', 'site'),
+                pk=kwargs[self.lookup_field]
+            )
+            serializer = ArchivedIncidentDetailSerializer(
+                archived, context=self.get_serializer_context()
+            )
+            return Response(serializer.data)
         serializer = self.get_serializer(instance)
         return Response(serializer.data)
     
+    def live_version(self, pk):
+        """(id, updated_at) of a live incident, or None"""
+        try:
+            return self.filter_queryset(Incident.objects.filter(pk=pk)).values_list('pk', 'updated_at').first()
+        except (TypeError, ValueError, DjangoValidationError):
+            return None
+    
+    @action(detail=False, methods=['get'], url_path=r'by-number/(?P<number>[^/]+)')
+    def by_number(self, request, number=None):
+        """
+        GET /api/incidents/by-number/{incident_number}/
+        Look up an incident by the number printed on reports (archived included)
+        """
+        lookup = incident_number_lookup(number)
+        instance = self.get_queryset().filter(**lookup).first()
+        if instance is None:
+            archived = get_object_or_404(
+                ArchivedIncident.objects.select_related('facility', 'department', 'site'),
+                **lookup
+            )
+            serializer = ArchivedIncidentDetailSerializer(
+                archived, context=self.get_serializer_context()
+            )
+            return Response(serializer.data)
+        serializer = IncidentDetailSerializer(instance, context=self.get_serializer_context())
+        return Response(serializer.data)
+    
     def update(self, request, *args, **kwargs):
         """
         PUT /api/incidents/{id}/
@@ -163,11 +301,56 @@ class IncidentViewSet(viewsets.ModelViewSet):
             'message': 'Incident deleted successfully'
         }, status=status.HTTP_204_NO_CONTENT)  # 204 is standard for delete
     
+    @action(detail=False, methods=['patch', 'delete'])
+    @idempotent
+    def bulk(self, request):
+        """
+        PATCH /api/incidents/bulk/   {"ids": [...] | "filter": {...}, "changes": {...}}
+        DELETE /api/incidents/bulk/  {"ids": [...] | "filter": {...}}
+        Update or delete many incidents at once; the result is a status per id
+        (updated / deleted / not_found). Honours Idempotency-Key.
+        """
+        serializer_class = BulkUpdateSerializer if request.method == 'PATCH' else BulkSelectionSerializer
+        params = serializer_class(data=request.data)
+        params.is_valid(raise_exception=True)
+        query = params.validated_data
+        
+        ids = bulk.select(ids=query.get('ids'), filter=query.get('filter'))
+        if request.method == 'PATCH':
+            done, outcome = bulk.update(ids, query['changes']), bulk.UPDATED
+        else:
+            done, outcome = bulk.delete(ids), bulk.DELETED
+        
+        return Response({
+            'count': len(done),
+            'results': bulk.outcomes(ids, done, outcome)
+        })
+    
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """
+        GET /api/incidents/{id}/similar/
+        Likely duplicates of an incident, most similar first (?limit=, default 5)
+        """
+        query = SimilarQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        limit = query.validated_data.get('limit')
+        incident = get_object_or_404(Incident.objects.only('incident_title', 'description'), pk=pk)
+        return Response({'results': self.similar_data(duplicates.similar_to(incident, limit=limit))})
+    
+    def similar_data(self, matches):
+        for incident, similarity in matches:
+            incident.similarity = similarity
+        return SimilarIncidentSerializer(
+            [incident for incident, _ in matches], many=True, context=self.get_serializer_context()
+        ).data
+    
     @action(detail=True, methods=['post'], parser_classes=[MultiPartParser, FormParser])
+    @idempotent
     def upload_attachment(self, request, pk=None):
         """
         POST /api/incidents/{id}/upload_attachment/
-        Upload attachment to specific incident
+        Upload attachment to specific incident (honours Idempotency-Key)
         """
         incident = self.get_object()
         serializer = AttachmentUploadSerializer(
@@ -204,96 +387,75 @@ class IncidentViewSet(viewsets.ModelViewSet):
         })
     
     @action(detail=False, methods=['get'])
-    def dashboard_stats(self, request):
+    def changes(self, request):
         """
-        GET /api/incidents/dashboard_stats/
-        Get dashboard statistics and summary
+        GET /api/incidents/changes/?token=<next_token>&limit=500
+        Incidents created or updated, and ids deleted, since the sync token.
+        Without a token, pages through every incident (a full sync).
         """
-        now = timezone.now()
-        today = now.date()
-        current_month_start = today.replace(day=1)
-        current_week_start = today - timedelta(days=today.weekday())
-        
-        # Basic counts
-        total_incidents = Incident.objects.filter(is_active=True).count()
-        incidents_this_month = Incident.objects.filter(
-            is_active=True,
-            date_of_incident__gte=current_month_start
-        ).count()
-        incidents_this_week = Incident.objects.filter(
-            is_active=True,
-            date_of_incident__gte=current_week_start
-        ).count()
-        active_incidents = Incident.objects.filter(is_active=True).count()
-        
-        # By Category
-        by_category = {}
-        for choice in Incident.CATEGORY_CHOICES:
-            by_category[choice[0]] = Incident.objects.filter(
-                is_active=True,
-                category=choice[0]
-            ).count()
-        
-        # By Injury Type
-        by_injury_type = {}
-        for choice in Incident.INJURY_DAMAGE_CHOICES:
-            by_injury_type[choice[0]] = Incident.objects.filter(
-                is_active=True,
-                injury_damage_type=choice[0]
-            ).count()
-        
-        # By Facility
-        by_facility = dict(
-            Incident.objects.filter(is_active=True)
-            .values('facility')
-            .annotate(count=Count('facility'))
-            .values_list('facility', 'count')
-        )
+        try:
+            limit = max(int(request.query_params.get('limit', 0)), 0) or None
+        except ValueError:
+            raise serializers.ValidationError({'limit': 'A valid integer is required.'})
+        try:
+            changed_ids, deleted_ids, next_token, has_more = sync.changes(
+                request.query_params.get('token'), limit=limit
+            )
+        except sync.InvalidToken as e:
+            raise serializers.ValidationError({'token': str(e)})
+        except sync.TokenExpired as e:
+            return Response({'detail': str(e)}, status=status.HTTP_410_GONE)
         
-        # Recent incidents (last 10)
-        recent_incidents = Incident.objects.filter(is_active=True)[:10]
-        recent_serializer = IncidentListSerializer(
-            recent_incidents, many=True, context={'request': request}
+        incidents = self.get_queryset().filter(pk__in=changed_ids).order_by('updated_at', 'id')
+        serializer = IncidentListSerializer(
+            incidents, many=True, context=self.get_serializer_context()
         )
+        return Response({
+            'results': serializer.data,
+            'deleted': deleted_ids,
+            'next_token': next_token,
+            'has_more': has_more
+        })
+    
+    @action(detail=False, methods=['get'])
+    def analytics(self, request):
+        """
+        GET /api/incidents/analytics/?date_from=&date_to=&bucket=month&group_by=category,facility
+        Incident counts per time bucket and up to two dimensions, in one
+        query, returned as column arrays. The list filters apply as well.
+        """
+        params = AnalyticsQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        query = params.validated_data
         
-        # Monthly trend (last 12 months)
-        monthly_trend = []
-        for i in range(12):
-            month_date = today.replace(day=1) - timedelta(days=i*30)
-            month_start = month_date.replace(day=1)
-            if month_date.month == 12:
-                month_end = month_date.replace(year=month_date.year+1, month=1, day=1) - timedelta(days=1)
-            else:
-                month_end = month_date.replace(month=month_date.month+1, day=1) - timedelta(days=1)
-            
-            month_count = Incident.objects.filter(
-                is_active=True,
-                date_of_incident__gte=month_start,
-                date_of_incident__lte=month_end
-            ).count()
-            
-            monthly_trend.append({
-                'month': calendar.month_name[month_date.month],
-                'year': month_date.year,
-                'count': month_count,
-                'date': month_start.isoformat()
-            })
-        
-        monthly_trend.reverse()  # Show oldest to newest
-        
-        stats_data = {
-            'total_incidents': total_incidents,
-            'incidents_this_month': incidents_this_month,
-            'incidents_this_week': incidents_this_week,
-            'active_incidents': active_incidents,
-            'by_category': by_category,
-            'by_injury_type': by_injury_type,
-            'by_facility': by_facility,
-            'recent_incidents': recent_serializer.data,
-            'monthly_trend': monthly_trend,
-        }
+        def compute():
+            columns = analytics.aggregate(
+                self.filter_queryset(Incident.objects.all()),
+                query['date_from'], query['date_to'], query['bucket'], query['group_by']
+            )
+            return {
+                'date_from': query['date_from'],
+                'date_to': query['date_to'],
+                'bucket': query['bucket'],
+                'group_by': query['group_by'],
+                'buckets': analytics.buckets(query['date_from'], query['date_to'], query['bucket']),
+                'columns': columns
+            }
         
-        return Response(stats_data)
+        # Same parameters in any order (and the defaulted range) -> same computation
+        filters = {name: sorted(values) for name, values in request.query_params.lists() if any(values)}
+        key = make_key('analytics', {'query': query, 'filters': filters})
+        return Response(analytics.flight.get(key, compute))
+    
+    @action(detail=False, methods=['get'])
+    def dashboard_stats(self, request):
+        """
+        GET /api/incidents/dashboard_stats/
+        Get dashboard statistics and summary. Concurrent requests share one
+        computation, and a recent result is served while it is refreshed
+        (see apps.common.single_flight).
+        """
+        return Response(stats.shared_dashboard())
     
     @action(detail=False, methods=['get'])
     def choices(self, request):
@@ -321,6 +483,7 @@ class AttachmentViewSet(viewsets.ModelViewSet):
     serializer_class = IncidentAttachmentSerializer
     permission_classes = [AllowAny]
     parser_classes = [MultiPartParser, FormParser]
+    throttle_scopes = {'create': throttling.UPLOAD, 'update': throttling.UPLOAD, 'partial_update': throttling.UPLOAD}
 
     def get_queryset(self):
         incident_id = self.kwargs.get("incident_id")
@@ -337,13 +500,8 @@ class AttachmentViewSet(viewsets.ModelViewSet):
         """
         instance = self.get_object()
         
-        # Delete the actual file
-        if instance.file:
-            try:
-                instance.file.delete(save=False)
-            except:
-                pass  # File might not exist
-        
+        # The file itself is removed from storage by a background task
+        # (signals.attachment_deleted)
         instance.delete()
         
         return Response({
@@ -0,0 +1,242 @@
+"""
+Load benchmark: async read endpoints under ASGI vs. the sync viewset under WSGI.
+
+Starts the project twice, one server at a time, pinned to the same CPU set:
+
+  * WSGI: gunicorn gthread workers (the production `--workers 4 --threads 4`
+    setup from docker/dev/django/start) serving /incidents/...
+  * ASGI: gunicorn with uvicorn workers serving /async/incidents/...
+
+For each concurrency level it drives keep-alive HTTP/1.1 connections at the
+chosen endpoint for a fixed duration and records throughput, latency
+percentiles, errors and the peak RSS of the whole server process tree.
+
+Usage (from the project root, against a migrated and seeded database):
+
+    python benchmarks/asgi_vs_wsgi.py --cpus 0-1 --concurrency 8 32 128 \
+        --endpoint dashboard_stats --output asgi_vs_wsgi.json
+
+Only the standard library is used on the client side so the numbers are not
+skewed by an HTTP client library.
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+API_PREFIX = "/api/v1/incident_reporting"
+
+ENDPOINTS = {
+    "list": ("incidents/", "async/incidents/"),
+    "list_filtered": ("incidents/?category=INCIDENT", "async/incidents/?category=INCIDENT"),
+    "dashboard_stats": ("incidents/dashboard_stats/", "async/incidents/dashboard_stats/"),
+}
+
+
+def server_command(mode, port, workers, threads):
+    bind = f"127.0.0.1:{port}"
+    if mode == "wsgi":
+        return [
+            "gunicorn", "coreAPI.wsgi:application", "--bind", bind,
+            "--workers", str(workers), "--threads", str(threads),
+            "--worker-class", "gthread", "--log-level", "warning",
+        ]
+    return [
+        "gunicorn", "coreAPI.asgi:application", "--bind", bind,
+        "--workers", str(workers), "--worker-class", "uvicorn.workers.UvicornWorker",
+        "--log-level", "warning",
+    ]
+
+
+def start_server(mode, args):
+    command = server_command(mode, args.port, args.workers, args.threads)
+    if args.cpus and shutil.which("taskset"):
+        command = ["taskset", "--cpu-list", args.cpus] + command
+    return subprocess.Popen(command, cwd=BASE_DIR, start_new_session=True)
+
+
+def wait_until_ready(port, path, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=2):
+                return
+        except Exception:
+            time.sleep(0.25)
+    raise RuntimeError(f"server on port {port} did not become ready")
+
+
+def _children(pid):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+def process_tree_rss_kb(pid):
+    """Sum VmRSS over a process and all of its descendants"""
+    total = 0
+    stack = [pid]
+    while stack:
+        current = stack.pop()
+        try:
+            with open(f"/proc/{current}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        total += int(line.split()[1])
+                        break
+        except OSError:
+            continue
+        stack.extend(_children(current))
+    return total
+
+
+async def _worker(port, path, deadline, latencies, errors):
+    request = (
+        f"GET {path} HTTP/1.1\r\nHost: 127.0.0.1:{port}\r\n"
+        "Connection: keep-alive\r\n\r\n"
+    ).encode()
+    reader = writer = None
+    while time.monotonic() < deadline:
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            started = time.perf_counter()
+            writer.write(request)
+            await writer.drain()
+            status_line = await reader.readline()
+            length = 0
+            close = False
+            while True:
+                line = await reader.readline()
+                if line in (b"\r\n", b""):
+                    break
+                name, _, value = line.decode("latin-1").partition(":")
+                name = name.strip().lower()
+                if name == "content-length":
+                    length = int(value.strip())
+                elif name == "connection" and value.strip().lower() == "close":
+                    close = True
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - started)
+            if not status_line.startswith(b"HTTP/1.1 200"):
+                errors.append(status_line.decode("latin-1").strip())
+            if close:
+                writer.close()
+                reader = writer = None
+        except (OSError, asyncio.IncompleteReadError, ValueError) as exc:
+            errors.append(type(exc).__name__)
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def _sample_rss(pid, stop, samples):
+    while not stop.is_set():
+        samples.append(process_tree_rss_kb(pid))
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=0.5)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_level(pid, port, path, concurrency, duration):
+    latencies, errors, rss = [], [], []
+    stop = asyncio.Event()
+    sampler = asyncio.create_task(_sample_rss(pid, stop, rss))
+    deadline = time.monotonic() + duration
+    started = time.monotonic()
+    await asyncio.gather(*[
+        _worker(port, path, deadline, latencies, errors) for _ in range(concurrency)
+    ])
+    elapsed = time.monotonic() - started
+    stop.set()
+    await sampler
+
+    latencies.sort()
+
+    def percentile(p):
+        if not latencies:
+            return None
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 2)
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": percentile(0.50),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "peak_rss_mb": round(max(rss or [0]) / 1024, 1),
+    }
+
+
+def benchmark(mode, args):
+    sync_path, async_path = ENDPOINTS[args.endpoint]
+    path = f"{API_PREFIX}/{sync_path if mode == 'wsgi' else async_path}"
+    server = start_server(mode, args)
+    try:
+        wait_until_ready(args.port, path)
+        idle_rss = process_tree_rss_kb(server.pid)
+        levels = [
+            asyncio.run(run_level(server.pid, args.port, path, level, args.duration))
+            for level in args.concurrency
+        ]
+    finally:
+        os.killpg(server.pid, signal.SIGTERM)
+        server.wait(timeout=30)
+    return {"mode": mode, "path": path, "idle_rss_mb": round(idle_rss / 1024, 1), "levels": levels}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--endpoint", choices=sorted(ENDPOINTS), default="list")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds per level")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--threads", type=int, default=4, help="WSGI threads per worker")
+    parser.add_argument("--cpus", default="0-1", help="taskset CPU list shared by both servers")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--modes", nargs="+", choices=["wsgi", "asgi"], default=["wsgi", "asgi"])
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+
+    results = {
+        "endpoint": args.endpoint,
+        "cpus": args.cpus,
+        "workers": args.workers,
+        "threads": args.threads,
+        "duration": args.duration,
+        "runs": [benchmark(mode, args) for mode in args.modes],
+    }
+
+    for run in results["runs"]:
+        print(f"\n{run['mode'].upper()}  {run['path']}  idle RSS {run['idle_rss_mb']} MB")
+        print(f"{'conc':>6} {'rps':>9} {'p50':>9} {'p95':>9} {'p99':>9} {'err':>6} {'rss MB':>8}")
+        for level in run["levels"]:
+            print(
+                f"{level['concurrency']:>6} {level['rps']:>9} {level['p50_ms']!s:>9} "
+                f"{level['p95_ms']!s:>9} {level['p99_ms']!s:>9} {level['errors']:>6} "
+                f"{level['peak_rss_mb']:>8}"
+            )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+"""
+Latency of incident retrieve with and without the detail cache.
+
+Times GET /incidents/{id}/ through the Django test client on a throwaway
+test database seeded with incidents that have a few attachments each, in
+three variants:
+
+* uncached - INCIDENT_DETAIL_CACHE['ENABLED'] off, the serializer runs every time
+* shared   - the LRU is emptied before each request, so hits come from the
+             shared tier (Redis when REDIS_URL is set, else local memory)
+* lru      - warm in-process LRU
+
+Rounds are interleaved so machine noise affects every variant equally; the
+LRU hit ratio and memory use are printed at the end.
+
+Usage (from the project root):
+
+    python benchmarks/detail_cache.py --incidents 200 --attachments 3 --requests 600
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, time as dtime, timedelta
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "coreAPI.settings.development")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import Client, override_settings  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+
+from apps.common.metrics import CACHE_REQUESTS  # noqa: E402
+from apps.incident_reporting.detail_cache import detail_cache  # noqa: E402
+from apps.incident_reporting.models import Incident, IncidentAttachment, Facility  # noqa: E402
+
+API = "/api/v1/incident_reporting/incidents/"
+
+
+def seed(count, attachments):
+    today = date.today()
+    facilities = Facility.objects.for_names([f"Facility {i}" for i in range(7)])
+    incidents = Incident.objects.bulk_create([
+        Incident(
+            incident_title=f"Incident {i}",
+            date_of_incident=today - timedelta(days=i % 400),
+            time_of_incident=dtime(8 + i % 10, 0),
+            facility=facilities[f"Facility {i % 7}"],
+            category=Incident.CATEGORY_CHOICES[i % 4][0],
+            description="Benchmark incident " * 20,
+            persons_involved_type="EMPLOYEE",
+            injury_damage_type=Incident.INJURY_DAMAGE_CHOICES[i % 7][0],
+            reported_by_type="EMPLOYEE",
+            reported_by_name="Benchmark",
+        )
+        for i in range(count)
+    ])
+    IncidentAttachment.objects.bulk_create([
+        IncidentAttachment(
+            incident=incident, file=f"incidents/{incident.id}/attachments/photo-{n}.jpg",
+            filename=f"photo-{n}.jpg", file_size=250_000, attachment_type="PHOTO",
+        )
+        for incident in incidents
+        for n in range(attachments)
+    ])
+    return [str(incident.pk) for incident in incidents]
+
+
+def timed(client, paths, before=None):
+    samples = []
+    for path in paths:
+        if before:
+            before()
+        started = time.perf_counter()
+        response = client.get(path)
+        samples.append(time.perf_counter() - started)
+        assert response.status_code == 200, (path, response.status_code)
+    return samples
+
+
+def lru_hits():
+    return {
+        result: int(CACHE_REQUESTS.labels(detail_cache.name, "local", result)._value.get())
+        for result in ("hit", "miss")
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--incidents", type=int, default=200)
+    parser.add_argument("--attachments", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=600)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        ids = seed(args.incidents, args.attachments)
+        client = Client()
+        rng = random.Random(0)
+        per_round = max(1, args.requests // args.rounds)
+        disabled = override_settings(INCIDENT_DETAIL_CACHE={**settings.INCIDENT_DETAIL_CACHE, "ENABLED": False})
+
+        # Warm both tiers
+        timed(client, [API + f"{pk}/" for pk in ids])
+        before = lru_hits()
+
+        samples = {"uncached": [], "shared": [], "lru": []}
+        for _ in range(args.rounds):
+            paths = [API + f"{rng.choice(ids)}/" for _ in range(per_round)]
+            with disabled:
+                samples["uncached"] += timed(client, paths)
+            samples["shared"] += timed(client, paths, before=detail_cache.clear)
+            timed(client, paths)  # refill the LRU emptied by the shared variant
+            samples["lru"] += timed(client, paths)
+
+        uncached_ms = statistics.median(samples["uncached"]) * 1000
+        print(f"{'variant':<10} {'median ms':>10} {'p95 ms':>8} {'vs uncached':>12}")
+        for name, values in samples.items():
+            median_ms = statistics.median(values) * 1000
+            p95_ms = statistics.quantiles(values, n=20)[-1] * 1000
+            change = (median_ms - uncached_ms) / uncached_ms * 100
+            print(f"{name:<10} {median_ms:>10.3f} {p95_ms:>8.3f} {change:>11.1f}%")
+
+        after = lru_hits()
+        hits, misses = after["hit"] - before["hit"], after["miss"] - before["miss"]
+        stats = detail_cache.stats()
+        print(
+            f"\nLRU hit ratio {hits / max(hits + misses, 1):.1%} ({hits} hits, {misses} misses), "
+            f"{stats['entries']} entries, {stats['bytes'] / 1024:.1f} KiB"
+        )
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
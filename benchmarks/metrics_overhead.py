@@ -0,0 +1,110 @@
+"""
+Overhead of RequestMetricsMiddleware.
+
+Runs the same requests through the Django test client with and without the
+metrics middleware, on a throwaway test database seeded with incidents, and
+reports the relative difference in median request time per endpoint.
+Rounds are interleaved so machine noise affects both variants equally.
+
+Usage (from the project root):
+
+    python benchmarks/metrics_overhead.py --incidents 200 --requests 300
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import date, time as dtime, timedelta
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "coreAPI.settings.development")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import Client, override_settings  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+
+from apps.incident_reporting.models import Incident, Facility  # noqa: E402
+
+METRICS_MIDDLEWARE = "apps.common.middleware.RequestMetricsMiddleware"
+PATHS = [
+    "/api/v1/incident_reporting/incidents/",
+    "/api/v1/incident_reporting/incidents/?category=INCIDENT&search=Incident",
+    "/api/v1/incident_reporting/incidents/dashboard_stats/",
+]
+
+
+def seed(count):
+    today = date.today()
+    facilities = Facility.objects.for_names([f"Facility {i}" for i in range(7)])
+    Incident.objects.bulk_create([
+        Incident(
+            incident_title=f"Incident {i}",
+            date_of_incident=today - timedelta(days=i % 400),
+            time_of_incident=dtime(8 + i % 10, 0),
+            facility=facilities[f"Facility {i % 7}"],
+            category=Incident.CATEGORY_CHOICES[i % 4][0],
+            description="Benchmark incident",
+            persons_involved_type="EMPLOYEE",
+            injury_damage_type=Incident.INJURY_DAMAGE_CHOICES[i % 7][0],
+            reported_by_type="EMPLOYEE",
+            reported_by_name="Benchmark",
+        )
+        for i in range(count)
+    ])
+
+
+def timed(client, path, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get(path)
+        samples.append(time.perf_counter() - started)
+        assert response.status_code == 200, (path, response.status_code)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--incidents", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        seed(args.incidents)
+        # The test client builds its middleware chain on the first request,
+        # so each variant gets its own client warmed up under its settings.
+        without_metrics = [m for m in settings.MIDDLEWARE if m != METRICS_MIDDLEWARE]
+        base_client, metrics_client = Client(), Client()
+        with override_settings(MIDDLEWARE=without_metrics):
+            timed(base_client, PATHS[0], 1)
+        timed(metrics_client, PATHS[0], 1)
+        per_round = max(1, args.requests // args.rounds)
+
+        print(f"{'endpoint':<75} {'base ms':>8} {'metrics ms':>10} {'overhead':>9}")
+        for path in PATHS:
+            base, instrumented = [], []
+            for _ in range(args.rounds):
+                base += timed(base_client, path, per_round)
+                instrumented += timed(metrics_client, path, per_round)
+            base_ms = statistics.median(base) * 1000
+            metrics_ms = statistics.median(instrumented) * 1000
+            overhead = (metrics_ms - base_ms) / base_ms * 100
+            print(f"{path:<75} {base_ms:>8.3f} {metrics_ms:>10.3f} {overhead:>8.1f}%")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
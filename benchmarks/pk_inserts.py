@@ -0,0 +1,119 @@
+"""
+Insert throughput and index size: uuid4 vs time-ordered uuid7 keys.
+
+Bulk-inserts the same number of rows into two identical tables on a
+throwaway test database - one keyed by random uuid4, one by uuid7 - each
+with a UUID primary key and an indexed foreign-key-like column (as on
+IncidentAttachment.incident). Reports rows/s overall and for the last batch
+(when the indexes are largest) plus the on-disk size of both indexes.
+Index sizes need PostgreSQL (or SQLite built with the dbstat table).
+
+Usage (from the project root):
+
+    python benchmarks/pk_inserts.py --rows 500000 --batch-size 5000
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BASE_DIR))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "coreAPI.settings.development")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.db import connection, transaction  # noqa: E402
+from django.test.utils import setup_test_environment  # noqa: E402
+
+from apps.common.ids import uuid7  # noqa: E402
+
+GENERATORS = {"uuid4": uuid.uuid4, "uuid7": uuid7}
+
+
+def create_table(cursor, name):
+    column = "uuid" if connection.vendor == "postgresql" else "char(32)"
+    cursor.execute(
+        f"CREATE TABLE {name} (id {column} PRIMARY KEY, parent_id {column} NOT NULL, payload text)"
+    )
+    cursor.execute(f"CREATE INDEX {name}_parent ON {name} (parent_id)")
+
+
+def to_db(value):
+    return value if connection.vendor == "postgresql" else value.hex
+
+
+def index_sizes(cursor, name):
+    if connection.vendor == "postgresql":
+        cursor.execute(
+            "SELECT pg_relation_size(%s), pg_relation_size(%s)", [f"{name}_pkey", f"{name}_parent"]
+        )
+        return cursor.fetchone()
+    try:
+        cursor.execute(
+            "SELECT sum(CASE WHEN name LIKE 'sqlite_autoindex%%' THEN pgsize END), "
+            "sum(CASE WHEN name = %s THEN pgsize END) FROM dbstat WHERE name IN "
+            "(SELECT name FROM sqlite_master WHERE tbl_name = %s AND type = 'index')",
+            [f"{name}_parent", name],
+        )
+        return cursor.fetchone()
+    except Exception:
+        return None, None
+
+
+def run(name, generator, rows, batch_size):
+    table = f"pk_bench_{name}"
+    with connection.cursor() as cursor:
+        create_table(cursor, table)
+
+    parents = [generator() for _ in range(max(1, rows // 3))]
+    inserted = 0
+    last_rate = 0.0
+    started = time.perf_counter()
+    while inserted < rows:
+        size = min(batch_size, rows - inserted)
+        batch = [
+            (to_db(generator()), to_db(parents[(inserted + i) * len(parents) // rows]), "x" * 40)
+            for i in range(size)
+        ]
+        batch_started = time.perf_counter()
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.executemany(f"INSERT INTO {table} (id, parent_id, payload) VALUES (%s, %s, %s)", batch)
+        last_rate = size / (time.perf_counter() - batch_started)
+        inserted += size
+    elapsed = time.perf_counter() - started
+
+    with connection.cursor() as cursor:
+        pk_size, fk_size = index_sizes(cursor, table)
+    return rows / elapsed, last_rate, pk_size, fk_size
+
+
+def mb(size):
+    return "n/a" if size is None else f"{size / 1024 / 1024:.1f} MB"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        print(f"{connection.vendor}, {args.rows} rows")
+        print(f"{'key':<6} {'rows/s':>10} {'last batch':>11} {'pk index':>10} {'fk index':>10}")
+        for name, generator in GENERATORS.items():
+            rate, last_rate, pk_size, fk_size = run(name, generator, args.rows, args.batch_size)
+            print(f"{name:<6} {rate:>10,.0f} {last_rate:>11,.0f} {mb(pk_size):>10} {mb(fk_size):>10}")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
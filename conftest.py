@@ -0,0 +1,30 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def strict_query_inspector(settings):
+    """Fail any test whose request repeats a query shape (possible N+1)"""
+    settings.QUERY_INSPECTOR = {
+        **settings.QUERY_INSPECTOR,
+        "ENABLED": True,
+        "RAISE": True,
+    }
+
+
+@pytest.fixture(autouse=True)
+def fresh_throttle_buckets():
+    """Start every test with full token buckets"""
+    from apps.common.throttling import get_buckets
+
+    get_buckets.cache_clear()
+    yield
+    get_buckets.cache_clear()
+
+
+@pytest.fixture(autouse=True)
+def empty_cache():
+    """Results cached by an earlier test (e.g. dashboard stats) don't leak into the next"""
+    from django.core.cache import cache
+
+    cache.clear()
+    yield
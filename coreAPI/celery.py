@@ -1,7 +1,7 @@
 from __future__ import absolute_import
 import os
 
-from celery import Celery
+from celery import Celery, signals
 from celery.schedules import crontab
 
 from coreAPI.settings import base
@@ -19,11 +19,28 @@ app.conf.enable_utc = True
 
 
 app.conf.beat_schedule = {
-    # Executes every Monday morning at 7:30 a.m.
-    "delete-expired-reset-token-at-evry-midnight": {
-        "task": "accounts.tasks.delete_expired_password_reset_token_and_user_signup_token",
-        "schedule": crontab(hour=0, minute=0),
-    }
+    # Keep the upcoming incident partitions created ahead of time
+    "create-incident-partitions-daily": {
+        "task": "apps.incident_reporting.tasks.ensure_incident_partitions",
+        "schedule": crontab(hour=1, minute=15),
+    },
+    "archive-incidents-nightly": {
+        "task": "apps.incident_reporting.tasks.archive_incidents",
+        "schedule": crontab(hour=2, minute=0),
+    },
+    "compact-incident-tombstones-daily": {
+        "task": "apps.incident_reporting.tasks.compact_incident_tombstones",
+        "schedule": crontab(hour=3, minute=0),
+    },
+    "purge-idempotency-records-daily": {
+        "task": "apps.common.tasks.purge_idempotency_records",
+        "schedule": crontab(hour=3, minute=30),
+    },
+    # Picks up severe incident notifications whose scheduled run was lost
+    "send-incident-notifications": {
+        "task": "apps.incident_reporting.tasks.send_incident_notifications",
+        "schedule": crontab(minute="*/5"),
+    },
 }
 
 # Using a string here means the worker doesn't have to serialize
@@ -40,6 +57,22 @@ app.autodiscover_tasks(lambda: base.INSTALLED_APPS)
 
 
 
+@signals.celeryd_init.connect
+def configure_queue_worker(conf=None, options=None, **kwargs):
+    """Size a worker started with -Q <queue> from settings.TASK_QUEUES"""
+    from django.conf import settings
+
+    queues = options.get("queues") or []
+    if isinstance(queues, str):
+        queues = queues.split(",")
+    # A worker consuming several queues is sized for the first configured one
+    for queue in queues:
+        if queue in settings.TASK_QUEUES:
+            conf.worker_concurrency = settings.TASK_QUEUES[queue]["CONCURRENCY"]
+            conf.worker_prefetch_multiplier = settings.TASK_QUEUES[queue]["PREFETCH_MULTIPLIER"]
+            return queue
+
+
 @app.task(bind=True)
 def debug_task(self):
     print(f"Request: {self.request!r}")
\ No newline at end of file
@@ -73,6 +73,8 @@ LOCAL_APPS = [
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
+    "apps.common.middleware.RequestMetricsMiddleware",
+    "apps.common.middleware.DuplicateQueryMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "corsheaders.middleware.CorsMiddleware",
@@ -328,10 +330,36 @@ REST_FRAMEWORK = {
         "rest_framework.renderers.JSONRenderer",
     ),
 
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'apps.common.pagination.EstimatedCountPagination',
     'PAGE_SIZE': 20,
+
+    # Token buckets per client and scope, see THROTTLE below
+    'DEFAULT_THROTTLE_CLASSES': [
+        'apps.common.throttling.TokenBucketThrottle',
+    ],
+    # Proxies (nginx) in front of the app: with N > 0 the client IP is taken
+    # from X-Forwarded-For. Only set it where every request comes through the
+    # proxy (docker-compose.yml); a client reaching the app directly could
+    # otherwise send any address there and get a fresh throttle bucket.
+    'NUM_PROXIES': env("NUM_PROXIES", cast=int, default=0),
+}
+
+# Token-bucket throttling (apps.common.throttling). Each client (user, or IP
+# without authentication) can burst N requests per scope, refilled at N per period.
+THROTTLE = {
+    "ENABLED": env("THROTTLE_ENABLED", cast=bool, default=True),
+    "RATES": {
+        "read": env("THROTTLE_READ_RATE", default="600/min"),
+        "write": env("THROTTLE_WRITE_RATE", default="60/min"),
+        "upload": env("THROTTLE_UPLOAD_RATE", default="30/min"),
+        "bulk": env("THROTTLE_BULK_RATE", default="10/min"),
+    },
 }
 
+# List pages report the planner's row estimate instead of running COUNT(*)
+# when it is at least this large (PostgreSQL only, see apps.common.pagination)
+ESTIMATED_COUNT_THRESHOLD = env("ESTIMATED_COUNT_THRESHOLD", cast=int, default=10000)
+
 
 # SIMPLE_JWT = {
 #     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=30),
@@ -438,9 +466,196 @@ CELERY_RESULT_SERIALIZER = "json"
 CELERY_TASK_SERIALIZER = "json"
 # CELERY_BEAT_SCHEDULER = env("CELERY_BEAT_SCHEDULER")
 
+# Incident workloads are routed to their own queues so that slow media and
+# maintenance work never sits in front of notifications. Run one worker per
+# queue (docker/dev/django/celery/worker/start, CELERY_QUEUES), so each is
+# sized by its own TASK_QUEUES entry; tasks not listed here go to the
+# "default" queue. Dashboard and analytics aggregates have no queue: they are
+# computed per request and shared through apps.common.single_flight.
+CELERY_TASK_DEFAULT_QUEUE = "default"
+CELERY_TASK_ROUTES = {
+    "apps.incident_reporting.tasks.delete_attachment_files": {"queue": "media"},
+    "apps.incident_reporting.tasks.send_incident_notifications": {"queue": "notifications"},
+    "apps.incident_reporting.tasks.ensure_incident_partitions": {"queue": "maintenance"},
+    "apps.incident_reporting.tasks.archive_incidents": {"queue": "maintenance"},
+    "apps.incident_reporting.tasks.compact_incident_tombstones": {"queue": "maintenance"},
+    "apps.common.tasks.purge_idempotency_records": {"queue": "maintenance"},
+    "apps.common.tasks.run_admin_job": {"queue": "bulk"},
+}
+
+# Worker pool size and prefetch per queue, applied when a worker starts with
+# -Q <queue> (coreAPI.celery.configure_queue_worker; -c / --prefetch-multiplier
+# still win). Long tasks prefetch one message so they can't hold others back.
+TASK_QUEUES = {
+    "default": {"CONCURRENCY": 2, "PREFETCH_MULTIPLIER": 4},
+    "notifications": {"CONCURRENCY": 4, "PREFETCH_MULTIPLIER": 4},
+    "media": {"CONCURRENCY": 2, "PREFETCH_MULTIPLIER": 1},
+    "maintenance": {"CONCURRENCY": 1, "PREFETCH_MULTIPLIER": 1},
+    "bulk": {"CONCURRENCY": 2, "PREFETCH_MULTIPLIER": 1},
+}
+
 EXECUTE_JOB = 60 * 60 * 24 * 1  # 1 day
 
 
+# Redis used for cross-process coordination (live feed pub/sub, ...).
+# Leave empty to fall back to in-process implementations.
+REDIS_URL = env("REDIS_URL", default="")
+
+# Short-lived computed results (facet counts, ...), shared between
+# processes through Redis when it is configured
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": REDIS_URL,
+    } if REDIS_URL else {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+
+
+# Idempotency-Key handling of write endpoints (apps.common.idempotency).
+# Stored in Redis when REDIS_URL is set, otherwise in the database.
+IDEMPOTENCY = {
+    # How long a key's response is replayed
+    "TTL_SECONDS": env("IDEMPOTENCY_TTL_SECONDS", cast=int, default=60 * 60 * 24),
+    # Lock of a running request; expires in case its process dies
+    "LOCK_TIMEOUT_SECONDS": env("IDEMPOTENCY_LOCK_TIMEOUT_SECONDS", cast=int, default=60),
+    # How long a duplicate waits for the original request before a 409
+    "WAIT_SECONDS": env("IDEMPOTENCY_WAIT_SECONDS", cast=int, default=15),
+    "POLL_INTERVAL_SECONDS": 0.05,
+}
+
+
+# Bulk admin actions run by Celery (apps.common.admin_jobs)
+ADMIN_JOBS = {
+    # Objects processed per transaction / progress update
+    "CHUNK_SIZE": env("ADMIN_JOBS_CHUNK_SIZE", cast=int, default=500),
+}
+
+
+# Per-request Prometheus metrics (exposed at /metrics)
+METRICS = {
+    "EXCLUDED_PATHS": ["/metrics"],
+    # Networks Prometheus may scrape from, space separated. Checked against
+    # the connecting address (REMOTE_ADDR), never X-Forwarded-For; anyone
+    # else gets 403.
+    "ALLOWED_NETWORKS": env(
+        "METRICS_ALLOWED_NETWORKS",
+        default="127.0.0.0/8 ::1/128 10.0.0.0/8 172.16.0.0/12 192.168.0.0/16"
+    ).split(" "),
+}
+
+
+# N+1 / duplicate query detection (apps.common.query_inspector).
+# Enabled with DEBUG by default; set QUERY_INSPECTOR_ENABLED=True on staging
+# to log a structured warning per offending request. Tests switch RAISE on.
+QUERY_INSPECTOR = {
+    "ENABLED": env("QUERY_INSPECTOR_ENABLED", cast=bool, default=DEBUG),
+    "THRESHOLD": env("QUERY_INSPECTOR_THRESHOLD", cast=int, default=5),
+    "RAISE": False,
+}
+
+
+# Server-Sent Events live incident feed
+LIVE_FEED = {
+    "CHANNEL": env("LIVE_FEED_CHANNEL", default="incident-events"),
+    # How often the per-process publisher re-checks dashboard counts
+    "STATS_INTERVAL_SECONDS": env("LIVE_FEED_STATS_INTERVAL_SECONDS", cast=int, default=10),
+    "HEARTBEAT_SECONDS": env("LIVE_FEED_HEARTBEAT_SECONDS", cast=int, default=15),
+    # Events buffered per viewer before a slow client is disconnected
+    "MAX_QUEUED_EVENTS": env("LIVE_FEED_MAX_QUEUED_EVENTS", cast=int, default=100),
+}
+
+# Range partitioning of the incident table by date_of_incident (PostgreSQL).
+# Convert once with `manage.py partition_incidents`; Celery beat then keeps
+# PREMAKE future partitions created ahead of time.
+INCIDENT_PARTITIONING = {
+    "GRANULARITY": env("INCIDENT_PARTITION_GRANULARITY", default="month"),  # month | year
+    "PREMAKE": env("INCIDENT_PARTITION_PREMAKE", cast=int, default=3),
+}
+
+# Retention policy of the nightly archival job (apps.incident_reporting.archive)
+INCIDENT_ARCHIVE = {
+    # Incidents that happened longer ago than this are archived
+    "AFTER_DAYS": env("INCIDENT_ARCHIVE_AFTER_DAYS", cast=int, default=365 * 3),
+    # Deactivated incidents are archived once untouched for this long
+    "INACTIVE_AFTER_DAYS": env("INCIDENT_ARCHIVE_INACTIVE_AFTER_DAYS", cast=int, default=90),
+    # Incidents moved per transaction
+    "CHUNK_SIZE": env("INCIDENT_ARCHIVE_CHUNK_SIZE", cast=int, default=500),
+}
+
+# Delta sync of the incident list (apps.incident_reporting.sync)
+INCIDENT_SYNC = {
+    "PAGE_SIZE": 500,
+    "MAX_PAGE_SIZE": 2000,
+    # Changes younger than this are held back for the next sync, so rows
+    # saved by transactions that haven't committed yet are not skipped
+    "SETTLE_SECONDS": env("INCIDENT_SYNC_SETTLE_SECONDS", cast=int, default=5),
+    # Tombstones are compacted after this; older sync tokens must resync
+    "TOMBSTONE_DAYS": env("INCIDENT_SYNC_TOMBSTONE_DAYS", cast=int, default=30),
+}
+
+# Single-flight results of the aggregate endpoints (apps.common.single_flight)
+AGGREGATE_CACHE = {
+    # Served as they are for this long after being computed
+    "FRESH_SECONDS": env("AGGREGATE_CACHE_FRESH_SECONDS", cast=int, default=10),
+    # Then still served while one request recomputes them
+    "STALE_SECONDS": env("AGGREGATE_CACHE_STALE_SECONDS", cast=int, default=300),
+    # Cross-process lock of a computation, in case its process dies
+    "LOCK_TIMEOUT_SECONDS": 60,
+    # How long other processes wait for a result before computing it themselves
+    "WAIT_SECONDS": 30,
+}
+
+# Per-value counts of the incident list filters (apps.incident_reporting.facets)
+INCIDENT_FACETS = {
+    "CACHE_SECONDS": env("INCIDENT_FACETS_CACHE_SECONDS", cast=int, default=30),
+}
+
+# Bulk PATCH / DELETE of incidents (apps.incident_reporting.bulk)
+INCIDENT_BULK = {
+    # Incidents one request may select, by ids or by filter
+    "MAX_OBJECTS": env("INCIDENT_BULK_MAX_OBJECTS", cast=int, default=5000),
+    # Incidents updated or deleted per transaction
+    "CHUNK_SIZE": env("INCIDENT_BULK_CHUNK_SIZE", cast=int, default=500),
+}
+
+# Serialized incident detail, cached per process and in Redis (apps.incident_reporting.detail_cache)
+INCIDENT_DETAIL_CACHE = {
+    "ENABLED": env("INCIDENT_DETAIL_CACHE_ENABLED", cast=bool, default=True),
+    # Payloads kept in each process's LRU tier
+    "MAX_ENTRIES": env("INCIDENT_DETAIL_CACHE_MAX_ENTRIES", cast=int, default=2000),
+    # Lifetime of the shared entries; bounds how long renamed locations take to show
+    "TIMEOUT": env("INCIDENT_DETAIL_CACHE_TIMEOUT", cast=int, default=60 * 60 * 24),
+}
+
+# Near-duplicate detection of new reports (apps.incident_reporting.duplicates).
+# Changing SHINGLE_SIZE, BANDS or ROWS requires `manage.py index_incident_duplicates`.
+INCIDENT_DUPLICATES = {
+    # Characters per shingle of the normalized title and description
+    "SHINGLE_SIZE": 5,
+    # MinHash signature of BANDS x ROWS values, hashed per band into LSH buckets
+    "BANDS": 20,
+    "ROWS": 3,
+    # Jaccard similarity of the shingles from which a report is a likely duplicate
+    "THRESHOLD": env("INCIDENT_DUPLICATES_THRESHOLD", cast=float, default=0.5),
+    # Candidates sharing the most buckets that are compared exactly
+    "MAX_CANDIDATES": 100,
+    # Duplicates returned by create and the similar action
+    "LIMIT": 5,
+}
+
+# E-mails to SafetyContacts about severe incidents (apps.incident_reporting.notifications)
+INCIDENT_NOTIFICATIONS = {
+    "SEVERE_INJURY_TYPES": ["FATALITY", "MAJOR_INJURY"],
+    # Severe incidents reported within this many seconds of the first one
+    # go out together, as one digest per facility
+    "DIGEST_WINDOW": env("INCIDENT_NOTIFICATION_DIGEST_WINDOW", cast=int, default=60),
+    # Notifications sent per transaction / SMTP connection
+    "BATCH_SIZE": env("INCIDENT_NOTIFICATION_BATCH_SIZE", cast=int, default=200),
+}
+
+
 
 # twiilio sms sending API
 SMS = {
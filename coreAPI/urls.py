@@ -27,6 +27,8 @@ from rest_framework import permissions
 #                                             TokenRefreshView, TokenVerifyView)
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
+from apps.common.metrics import metrics_view
+
 
 def trigger_error(request):
     division_by_zero = 1 / 0
@@ -41,6 +43,9 @@ urlpatterns = [
 
     path('api/v1/common/', include('apps.common.urls')),
     path('api/v1/incident_reporting/', include('apps.incident_reporting.urls')),
+
+    # Prometheus scrape endpoint
+    path("metrics", metrics_view, name="metrics"),
 ]
 
 
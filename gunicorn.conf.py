@@ -0,0 +1,23 @@
+"""
+Gunicorn hooks, loaded automatically when gunicorn starts from the project root.
+
+Prometheus metrics are kept per worker process; pointing every worker at a
+shared PROMETHEUS_MULTIPROC_DIR lets /metrics aggregate all of them.
+"""
+import os
+import shutil
+
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", "/tmp/prometheus_multiproc")
+
+
+def on_starting(server):
+    # Stale files from a previous run would be added to the new totals
+    path = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    shutil.rmtree(path, ignore_errors=True)
+    os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)